@@ -0,0 +1,74 @@
+"""Full-frame vs tiled channel packing on synthetic mask layer stacks.
+
+Every case runs in its own process so peak RSS is measured per case:
+
+    python benchmarks/bench_channel_packing.py
+    python benchmarks/bench_channel_packing.py --sizes 2048 4096
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "krita_exporter", "pykrita", "texture_exporter"))
+
+from channel_packing import MASK_LAYOUT, pack_channels, pack_tiles
+from tga import write_tga, write_tga_tiles
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def synthetic_rows(key, width, rows):
+    # a different repeating row per group, materialized like projectionPixelData would be
+    seed = sum(map(ord, key))
+    row = bytes((seed + i) & 255 for i in range(width * 4))
+    return row * rows
+
+def run_case(mode, size, path):
+    start = time.perf_counter()
+
+    if mode == "full":
+        sources = {key: synthetic_rows(key, size, size) for key, _ in MASK_LAYOUT}
+        packed = pack_channels(size * size, MASK_LAYOUT, sources)
+        write_tga(path, size, size, packed, True)
+    else:
+        def read_rect(key, x, y, w, h):
+            return synthetic_rows(key, w, h)
+        write_tga_tiles(path, size, size, pack_tiles(size, size, MASK_LAYOUT, read_rect), True)
+
+    seconds = time.perf_counter() - start
+    os.remove(path)
+    return {"mode": mode, "size": size, "seconds": seconds, "peak_rss_mb": peak_rss_mb()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 4096, 8192])
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        path = os.path.join(tempfile.gettempdir(), "bench_channel_packing_{}.tga".format(os.getpid()))
+        print(json.dumps(run_case(args.run[0], int(args.run[1]), path)))
+        return
+
+    print("{:>6} {:>6} {:>10} {:>14}".format("SIZE", "MODE", "SECONDS", "PEAK RSS (MB)"))
+    for size in args.sizes:
+        for mode in ("full", "tiled"):
+            output = subprocess.check_output([sys.executable, __file__, "--run", mode, str(size)])
+            result = json.loads(output)
+            print("{:>6} {:>6} {:>10.3f} {:>14.1f}".format(size, mode, result["seconds"], result["peak_rss_mb"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Headless benchmarks of the FBX and texture exporters against fake bpy, krita, PyQt5 and P4.
+
+Every case runs in its own process and reports wall time, peak RSS and the number of calls per
+host API. The results are compared with benchmarks/baseline.json: a case that makes more host
+calls or uses more memory than its baseline fails the run. Wall time depends on the machine and
+its load, it is only checked with --check-time, scaled by a calibration loop run with every case.
+
+    python benchmarks/bench_exporters.py
+    python benchmarks/bench_exporters.py --check-time           # on a quiet machine
+    python benchmarks/bench_exporters.py --full                 # up to 100k objects and 4K textures
+    python benchmarks/bench_exporters.py --cases fbx_export_all --sizes 10000 --calls
+    python benchmarks/bench_exporters.py --save-baseline        # after an intended change
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from collections import OrderedDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+import fakes
+fakes.install()
+
+from fakes import bpy as fake_bpy
+from fakes import krita as fake_krita
+from fakes import qt as fake_qt
+
+P4CONFIG = "P4PORT=ssl:perforce:1666\nP4USER=builder\nP4CLIENT=builder_ws\n"
+
+TIME_SLACK      = 0.02
+MEMORY_SLACK_MB = 4.0
+CALIBRATION_RUNS = 5
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# -------------------- CASES
+CASES = OrderedDict()
+
+def case(sizes, full_sizes=None):
+    """Register a case. The function does the setup and returns the call that is measured."""
+    def register(function):
+        CASES[function.__name__] = (function, sizes, full_sizes or sizes)
+        return function
+    return register
+
+FBX_SIZES           = [1000, 10000]
+FBX_FULL_SIZES      = [1000, 10000, 100000]
+TEXTURE_SIZES       = [1024, 2048]
+TEXTURE_FULL_SIZES  = [1024, 2048, 4096]
+CHECKOUT_SIZES      = [10, 100]
+
+
+def load_fbx_exporter(object_count):
+    sys.path.insert(0, ROOT)
+    import fbx_exporter
+    fbx_exporter.register()
+
+    scene = fake_bpy.build_scene(object_count)
+    for n in range(fake_bpy.EXPORT_FOLDERS):
+        os.makedirs(os.path.dirname(fbx_exporter.get_export_path(scene.export_nodes[n])), exist_ok=True)
+    return fbx_exporter, scene
+
+def load_texture_exporter():
+    sys.path.insert(0, os.path.join(ROOT, "krita_exporter", "pykrita"))
+    import texture_exporter
+
+    dock = texture_exporter.TextureExporterDock()
+    dock.exportPathGlobal = os.path.abspath("maps")
+    os.makedirs(dock.exportPathGlobal, exist_ok=True)
+    return dock
+
+def drain(action):
+    # the temp document pipeline continues from the Qt event loop
+    def run():
+        action()
+        fake_qt.run_event_loop()
+    return run
+
+@case(FBX_SIZES, FBX_FULL_SIZES)
+def fbx_export_operator(size):
+    exporter, scene = load_fbx_exporter(size)
+    fake_bpy.select([scene.export_nodes[0]], scene.export_nodes[0])
+    return lambda: exporter.ExportOperator().execute(fake_bpy.context)
+
+@case(FBX_SIZES, FBX_FULL_SIZES)
+def fbx_export_operator_unchanged(size):
+    exporter, scene = load_fbx_exporter(size)
+    fake_bpy.select([scene.export_nodes[0]], scene.export_nodes[0])
+    exporter.ExportOperator().execute(fake_bpy.context)
+    return lambda: exporter.ExportOperator().execute(fake_bpy.context)
+
+@case(FBX_SIZES, FBX_FULL_SIZES)
+def fbx_export_to_fbx(size):
+    exporter, scene = load_fbx_exporter(size)
+    node = scene.export_nodes[0]
+    objects = exporter.get_subtree(node, exporter.build_children_index(scene.objects))
+    fake_bpy.select(objects, node)
+    return lambda: exporter.export_to_fbx(node, objects, True)
+
+@case(FBX_SIZES, FBX_FULL_SIZES)
+def fbx_export_to_fbx_dynamic(size):
+    # like fbx_export_to_fbx, for a node without isStatic: no mesh buffers kept, no batching sidecar
+    exporter, scene = load_fbx_exporter(size)
+    node = scene.export_nodes[1]
+    objects = exporter.get_subtree(node, exporter.build_children_index(scene.objects))
+    fake_bpy.select(objects, node)
+    return lambda: exporter.export_to_fbx(node, objects, True)
+
+@case(CHECKOUT_SIZES)
+def fbx_check_out(size):
+    exporter, scene = load_fbx_exporter(fake_bpy.EXPORT_NODES)
+    folders = [os.path.dirname(exporter.get_export_path(node)) for node in scene.export_nodes[:fake_bpy.EXPORT_FOLDERS]]
+    paths = []
+    for i in range(size):
+        path = os.path.join(folders[i % len(folders)], "asset_{}.fbx".format(i))
+        if i % 2 == 0:
+            open(path, "w").close()
+        paths.append(path)
+
+    def check_out():
+        for path in paths:
+            # one file at a time, like the export operator before batching
+            exporter.check_out_exported_files([path])
+    return check_out
+
+@case(FBX_SIZES, FBX_FULL_SIZES)
+def fbx_export_all(size):
+    exporter, scene = load_fbx_exporter(size)
+    return lambda: exporter.export_all_nodes(True)
+
+@case(FBX_SIZES, FBX_FULL_SIZES)
+def fbx_export_all_identical(size):
+    # forced re-export of an unchanged scene, every file is verified and reverted
+    exporter, scene = load_fbx_exporter(size)
+    exporter.export_all_nodes()
+    return lambda: exporter.export_all_nodes(True)
+
+@case(FBX_SIZES, FBX_FULL_SIZES)
+def fbx_export_all_unchanged(size):
+    exporter, scene = load_fbx_exporter(size)
+    exporter.export_all_nodes()
+    return lambda: exporter.export_all_nodes()
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_prepare_mask(size):
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.MASK_ROLES)
+    return drain(dock.prepare_mask)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_prepare_mask_unchanged(size):
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.MASK_ROLES)
+    drain(dock.prepare_mask)()
+    return drain(dock.prepare_mask)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_prepare_detail_mask(size):
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.DETAIL_MASK_ROLES)
+    return drain(dock.prepare_detail_mask)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_prepare_diffuse(size):
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.DIFFUSE_ROLES)
+    return drain(dock.prepare_diffuse)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_prepare_mask_rle(size):
+    dock = load_texture_exporter()
+    dock.rleBox.setChecked(True)
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.MASK_ROLES)
+    return drain(dock.prepare_mask)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_prepare_mask_levels(size):
+    # the mask plus three smaller versions, e.g. 2K, 1K and 512 from a 4K document
+    dock = load_texture_exporter()
+    dock.sizesBox.setText("{}, {}, {}".format(size // 2, size // 4, size // 8))
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.MASK_ROLES)
+    return drain(dock.prepare_mask)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_prepare_diffuse_levels(size):
+    dock = load_texture_exporter()
+    dock.sizesBox.setText("{}, {}, {}".format(size // 2, size // 4, size // 8))
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.DIFFUSE_ROLES)
+    return drain(dock.prepare_diffuse)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_stepper_mask(size):
+    # 16 bit documents go through the temp document and the stepper chain
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.MASK_ROLES, "U16")
+    return drain(dock.prepare_mask)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_stepper_detail_mask(size):
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.DETAIL_MASK_ROLES, "U16")
+    return drain(dock.prepare_detail_mask)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_stepper_diffuse(size):
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.DIFFUSE_ROLES, "U16")
+    return drain(dock.prepare_diffuse)
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_create_mask_layers(size):
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, ())
+    return dock.create_mask_layers
+
+@case(TEXTURE_SIZES, TEXTURE_FULL_SIZES)
+def texture_create_mask_layers_existing(size):
+    # every group is there already, nothing is added
+    dock = load_texture_exporter()
+    fake_krita.build_document(os.path.abspath("rock.kra"), size, fake_krita.MASK_ROLES)
+    return dock.create_mask_layers
+
+
+# -------------------- RUNNING
+def calibrate():
+    """Seconds of a fixed amount of interpreter and hashing work, the fastest of a few runs."""
+    best = float("inf")
+    for _ in range(CALIBRATION_RUNS):
+        start = time.perf_counter()
+        total = 0
+        for i in range(200000):
+            total += i * i % 7
+        hashlib.sha256(bytes(4 * 1024 * 1024)).digest()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_case(name, size):
+    work_dir = tempfile.mkdtemp(prefix="bench_exporters_")
+    os.chdir(work_dir)
+    with open(".p4config", "w") as file:
+        file.write(P4CONFIG)
+    os.environ.pop("P4CONFIG", None)
+
+    try:
+        measured = CASES[name][0](size)
+        fakes.calls.clear()
+        start = time.perf_counter()
+        measured()
+        seconds = time.perf_counter() - start
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {"seconds": seconds, "calibration_seconds": calibrate(), "peak_rss_mb": peak_rss_mb(),
+            "calls": dict(sorted(fakes.calls.items()))}
+
+def compare(result, baseline, time_tolerance, memory_tolerance, check_time=False):
+    regressions = []
+    if check_time and "calibration_seconds" in baseline:
+        # the baseline time as it would be on this machine
+        scale = result["calibration_seconds"] / baseline["calibration_seconds"]
+        expected = baseline["seconds"] * scale
+        if result["seconds"] > expected * (1.0 + time_tolerance) + TIME_SLACK * scale:
+            regressions.append("time {:.3f} s, baseline {:.3f} s here".format(result["seconds"], expected))
+    if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1.0 + memory_tolerance) + MEMORY_SLACK_MB:
+        regressions.append("peak RSS {:.1f} MB, baseline {:.1f} MB".format(result["peak_rss_mb"], baseline["peak_rss_mb"]))
+    # host calls are deterministic, any extra call is a regression
+    for api, calls in result["calls"].items():
+        if calls > baseline["calls"].get(api, 0):
+            regressions.append("{} called {} times, baseline {}".format(api, calls, baseline["calls"].get(api, 0)))
+    return regressions
+
+def load_baseline():
+    if not os.path.isfile(BASELINE):
+        return {}
+    with open(BASELINE, "r") as file:
+        return json.load(file)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--sizes", type=int, nargs="+", help="override the sizes of every selected case")
+    parser.add_argument("--full", action="store_true", help="include the largest scenes and textures")
+    parser.add_argument("--calls", action="store_true", help="print the host API call counts")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--check-time", action="store_true", help="also fail cases slower than their baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.3)
+    parser.add_argument("--memory-tolerance", type=float, default=0.2)
+    parser.add_argument("--run", nargs=2, metavar=("CASE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_case(args.run[0], int(args.run[1]))))
+        return
+
+    baseline = load_baseline()
+    results = {}
+    failed = False
+
+    print("{:<32} {:>7} {:>9} {:>9} {:>8}  {}".format("CASE", "SIZE", "SECONDS", "RSS (MB)", "CALLS", "BASELINE"))
+    for name in args.cases:
+        _, sizes, full_sizes = CASES[name]
+        for size in args.sizes or (full_sizes if args.full else sizes):
+            key = "{}/{}".format(name, size)
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--run", name, str(size)])
+            result = results[key] = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+            if key not in baseline:
+                status = "none"
+            else:
+                regressions = compare(result, baseline[key], args.time_tolerance, args.memory_tolerance, args.check_time)
+                status = "REGRESSED: " + "; ".join(regressions) if regressions else "ok"
+                failed = failed or bool(regressions)
+
+            print("{:<32} {:>7} {:>9.3f} {:>9.1f} {:>8}  {}".format(
+                name, size, result["seconds"], result["peak_rss_mb"], sum(result["calls"].values()), status))
+            if args.calls:
+                for api, calls in result["calls"].items():
+                    print("    {:<44} {:>8}".format(api, calls))
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE, "w") as file:
+            json.dump(baseline, file, indent=1, sort_keys=True)
+        print("baseline saved to " + BASELINE)
+    elif failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Time to import and register the FBX exporter add-on against a stub bpy.
+
+Every run is a fresh process, so module caches do not hide import cost. Besides the time, each
+run reports whether P4Python got imported and which non-code files were opened, both should be
+none until the first export:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODE_EXTENSIONS = (".py", ".pyc", ".so", ".pyd")
+
+
+def install_stub_bpy():
+    bpy = types.ModuleType("bpy")
+
+    class Struct:
+        pass
+
+    bpy.types = types.SimpleNamespace(Panel=Struct, Operator=Struct, Object=Struct, Scene=Struct)
+    bpy.props = types.SimpleNamespace(
+        StringProperty=lambda **kwargs: ("StringProperty", kwargs),
+        BoolProperty=lambda **kwargs: ("BoolProperty", kwargs),
+        IntProperty=lambda **kwargs: ("IntProperty", kwargs),
+    )
+    bpy.utils = types.SimpleNamespace(register_class=lambda cls: None, unregister_class=lambda cls: None)
+    bpy.path = types.SimpleNamespace(relpath=lambda path: path)
+    bpy.app = types.SimpleNamespace(binary_path=sys.executable)
+    bpy.data = types.SimpleNamespace(filepath="")
+    bpy.context = types.SimpleNamespace()
+    sys.modules["bpy"] = bpy
+
+def run_once():
+    install_stub_bpy()
+    sys.path.insert(0, ROOT)
+
+    opened = []
+    def audit(event, args):
+        if event == "open" and isinstance(args[0], str) and not args[0].endswith(CODE_EXTENSIONS):
+            if not os.path.isdir(args[0]):
+                opened.append(args[0])
+    sys.addaudithook(audit)
+
+    start = time.perf_counter()
+    import fbx_exporter
+    imported = time.perf_counter()
+    fbx_exporter.register()
+    registered = time.perf_counter()
+
+    return {
+        "import_ms": (imported - start) * 1000,
+        "register_ms": (registered - imported) * 1000,
+        "p4_imported": "P4" in sys.modules,
+        "opened": opened,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_once()))
+        return
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.check_output([sys.executable, __file__, "--run"])
+        results.append(json.loads(output))
+
+    for key in ("import_ms", "register_ms"):
+        values = [r[key] for r in results]
+        print("{:<12} median {:8.2f} ms   max {:8.2f} ms".format(key, statistics.median(values), max(values)))
+    print("P4 imported  {}".format(any(r["p4_imported"] for r in results)))
+    opened = sorted({path for r in results for path in r["opened"]})
+    print("files opened {}".format(", ".join(opened) if opened else "none"))
+
+    if opened or any(r["p4_imported"] for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""TGA writer throughput and file size, uncompressed and RLE, against Krita's TGA exporter.
+
+Synthetic 8 bit BGRA textures are streamed band by band through TgaWriter like an export does:
+a flat color (an unused mask), painted blocks (a typical mask), a gradient and noise. The Krita
+columns are only filled when the script runs inside Krita (Tools > Scripts > Scripter), there
+the same pixels are set on a new document and written with exportImage:
+
+    python benchmarks/bench_tga.py
+    python benchmarks/bench_tga.py --sizes 1024 4096 --patterns mask noise
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "krita_exporter", "pykrita", "texture_exporter"))
+
+from channel_packing import tile_rows
+from tga import TgaWriter
+
+BLOCK = 64
+
+
+# -------------------- PATTERNS
+def flat(size):
+    return bytes((40, 80, 120, 255)) * (size * size)
+
+def mask(size):
+    # blocks of one value per channel, like painted metalness / occlusion / smoothness areas
+    rng = random.Random(size)
+    rows = []
+    for _ in range(0, size, BLOCK):
+        row = b"".join(bytes((rng.choice((0, 128, 255)), rng.randrange(256), 0, 255)) * BLOCK for _ in range(0, size, BLOCK))
+        rows.append(row * BLOCK)
+    return b"".join(rows)[:size * size * 4]
+
+def gradient(size):
+    row = b"".join(bytes((x * 255 // size, 128, 255 - x * 255 // size, 255)) for x in range(size))
+    return row * size
+
+def noise(size):
+    return os.urandom(size * size * 4)
+
+PATTERNS = {"flat": flat, "mask": mask, "gradient": gradient, "noise": noise}
+
+
+# -------------------- WRITERS
+def write_ours(path, size, pixels, rle):
+    rows = tile_rows(size)
+    band_bytes = rows * size * 4
+    start = time.perf_counter()
+    with TgaWriter(path, size, size, True, rle) as writer:
+        for offset in range(0, len(pixels), band_bytes):
+            writer.write(pixels[offset:offset + band_bytes])
+    return time.perf_counter() - start
+
+def krita_writer():
+    """exportImage of a document holding the pixels, or None outside Krita."""
+    try:
+        from krita import Krita, InfoObject
+        from PyQt5.QtCore import QByteArray
+    except ImportError:
+        return None
+    if not hasattr(Krita, "instance") or Krita.instance() is None:
+        return None
+
+    def write(path, size, pixels, rle):
+        app = Krita.instance()
+        doc = app.createDocument(size, size, "bench_tga", "RGBA", "U8", "", 72.0)
+        try:
+            doc.setBatchmode(True)
+            doc.rootNode().childNodes()[0].setPixelData(QByteArray(pixels), 0, 0, size, size)
+            doc.refreshProjection()
+            doc.waitForDone()
+            info = InfoObject()
+            info.setProperty("alpha", True)
+            info.setProperty("compression", 1 if rle else 0)
+            start = time.perf_counter()
+            doc.exportImage(path, info)
+            doc.waitForDone()
+            return time.perf_counter() - start
+        finally:
+            doc.close()
+    return write
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048, 4096])
+    parser.add_argument("--patterns", nargs="+", choices=list(PATTERNS), default=list(PATTERNS))
+    args = parser.parse_args(argv)
+
+    writers = [("tga.py", write_ours)]
+    krita = krita_writer()
+    if krita is not None:
+        writers.append(("krita", krita))
+
+    path = os.path.join(tempfile.gettempdir(), "bench_tga_{}.tga".format(os.getpid()))
+    print("{:<9} {:>6} {:<7} {:<4} {:>9} {:>9} {:>11} {:>7}".format(
+        "PATTERN", "SIZE", "WRITER", "RLE", "SECONDS", "MB/S", "SIZE (KB)", "RATIO"))
+    for pattern in args.patterns:
+        for size in args.sizes:
+            pixels = PATTERNS[pattern](size)
+            for name, write in writers:
+                for rle in (False, True):
+                    seconds = write(path, size, pixels, rle)
+                    written = os.path.getsize(path)
+                    print("{:<9} {:>6} {:<7} {:<4} {:>9.3f} {:>9.1f} {:>11.0f} {:>7.3f}".format(
+                        pattern, size, name, "yes" if rle else "no", seconds, len(pixels) / seconds / 1e6,
+                        written / 1024.0, written / float(len(pixels))))
+                    os.remove(path)
+    if krita is None:
+        print("krita is not available, run this script from Krita's Scripter to compare with exportImage")
+
+if __name__ == "__main__":
+    main([] if "krita" in sys.modules else None)
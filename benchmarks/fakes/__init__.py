@@ -0,0 +1,33 @@
+"""Stand-ins for Blender, Krita, PyQt5 and P4Python, just enough to run both exporters headless.
+
+Every call into a fake host API is counted in `calls`, so a benchmark can report how often the
+exporters talk to their host. `install()` has to run before the exporters are imported.
+"""
+
+import sys
+from collections import Counter
+
+calls = Counter()
+
+
+def count(name):
+    calls[name] += 1
+
+def host_api(name):
+    def decorate(function):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def install():
+    from . import bpy, krita, p4, qt
+
+    sys.modules["bpy"] = bpy
+    sys.modules["krita"] = krita
+    sys.modules["P4"] = p4
+    sys.modules["PyQt5"] = qt.PyQt5
+    sys.modules["PyQt5.QtCore"] = qt.QtCore
+    sys.modules["PyQt5.QtGui"] = qt.QtGui
+    sys.modules["PyQt5.QtWidgets"] = qt.QtWidgets
@@ -0,0 +1,281 @@
+"""Fake bpy with synthetic scenes: export nodes over trees of small meshes.
+
+build_scene(n) makes a scene of n objects split over EXPORT_NODES export nodes. Every subtree is a
+tree of cubes four children wide. Every object has its own mesh datablock, but only MESH_VARIANTS
+of them differ, like props copied around a level. Every tenth object carries a modifier. Every
+export node writes to one of three folders under juniper_game_dev/Assets/Models.
+"""
+
+import os
+import time
+import itertools
+from array import array
+from types import SimpleNamespace
+
+from . import count, host_api
+
+
+EXPORT_NODES    = 10
+EXPORT_FOLDERS  = 3
+BRANCHING       = 4
+MESH_VARIANTS   = 97
+
+CUBE_CO         = [x for corner in range(8) for x in ((corner & 1) * 1.0, (corner >> 1 & 1) * 1.0, (corner >> 2 & 1) * 1.0)]
+CUBE_LOOPS      = [0, 1, 3, 2, 4, 6, 7, 5, 0, 4, 5, 1, 2, 3, 7, 6, 0, 2, 6, 4, 1, 5, 7, 3]
+CUBE_EDGES      = [0, 1, 2, 3, 4, 5, 6, 7, 0, 2, 1, 3, 4, 6, 5, 7, 0, 4, 1, 5, 2, 6, 3, 7]
+
+
+# -------------------- TYPES
+class Panel:
+    pass
+
+class Operator:
+    @host_api("Operator.report")
+    def report(self, level, message):
+        pass
+
+class Scene:
+    def __init__(self):
+        self.objects = []
+        self.export_nodes = []
+        self.fbx_export_force = False
+        self.fbx_export_workers = 2
+
+class Object:
+    def __init__(self, name, type, parent=None, data=None, location=(0.0, 0.0, 0.0), collection=None):
+        self.name = name
+        self.type = type
+        self.parent = parent
+        self.data = data
+        self.matrix_world = ((1.0, 0.0, 0.0, location[0]), (0.0, 1.0, 0.0, location[1]),
+                             (0.0, 0.0, 1.0, location[2]), (0.0, 0.0, 0.0, 1.0))
+        self.modifiers = []
+        self.vertex_groups = []
+        self.animation_data = None
+        self.users_collection = [collection] if collection is not None else []
+        self.properties = {}
+        self.hidden = False
+        self.selected = False
+
+    def keys(self):
+        return self.properties.keys()
+
+    def get(self, key, default=None):
+        return self.properties.get(key, default)
+
+    def __getitem__(self, key):
+        return self.properties[key]
+
+    @host_api("Object.__setitem__")
+    def __setitem__(self, key, value):
+        self.properties[key] = value
+
+    @host_api("Object.evaluated_get")
+    def evaluated_get(self, depsgraph):
+        return self
+
+    @host_api("Object.to_mesh")
+    def to_mesh(self):
+        return self.data
+
+    def to_mesh_clear(self):
+        pass
+
+    @host_api("Object.hide_get")
+    def hide_get(self, view_layer=None):
+        return self.hidden
+
+    @host_api("Object.hide_set")
+    def hide_set(self, state, view_layer=None):
+        self.hidden = state
+
+    @host_api("Object.select_get")
+    def select_get(self, view_layer=None):
+        return self.selected
+
+    @host_api("Object.select_set")
+    def select_set(self, state, view_layer=None):
+        self.selected = state
+
+types = SimpleNamespace(Panel=Panel, Operator=Operator, Object=Object, Scene=Scene)
+
+
+# -------------------- MESH DATA
+class MeshData:
+    """A mesh element collection, values are read with foreach_get like in Blender."""
+
+    def __init__(self, length, **attributes):
+        self.length = length
+        self.attributes = attributes
+
+    def __len__(self):
+        return self.length
+
+    def foreach_get(self, attribute, buffer):
+        count("foreach_get")
+        buffer[:] = self.attributes[attribute]
+
+LOOPS       = MeshData(24, vertex_index=array("i", CUBE_LOOPS))
+EDGES       = MeshData(12, vertices=array("i", CUBE_EDGES), use_edge_sharp=array("b", [0] * 12))
+POLYGONS    = MeshData(6, loop_total=array("i", [4] * 6), material_index=array("i", [0] * 6), use_smooth=array("b", [0] * 6))
+UV_LAYER    = SimpleNamespace(name="UVMap", data=MeshData(24, uv=array("f", [0.5] * 48)))
+MATERIAL    = SimpleNamespace(name="M_default")
+
+_mesh_names = itertools.count()
+
+class Mesh:
+    def __init__(self, seed):
+        self.name = "Cube.{:06d}".format(next(_mesh_names))
+        self.shape_keys = None
+        self.vertices = MeshData(8, co=array("f", [x + seed for x in CUBE_CO]))
+        self.edges = EDGES
+        self.loops = LOOPS
+        self.has_custom_normals = False
+        self.polygons = POLYGONS
+        self.uv_layers = [UV_LAYER]
+        self.vertex_colors = []
+        self.attributes = []
+        self.materials = [MATERIAL]
+
+class Modifier:
+    bl_rna = SimpleNamespace(properties=[SimpleNamespace(identifier=name) for name in
+                                         ("rna_type", "name", "type", "levels", "show_expanded")])
+
+    def __init__(self, name):
+        self.rna_type = None
+        self.name = name
+        self.type = "SUBSURF"
+        self.levels = 1
+        self.show_expanded = True
+
+
+# -------------------- VIEW LAYER
+class LayerCollection:
+    def __init__(self, collection, children=()):
+        self.collection = collection
+        self.children = list(children)
+        self.hide_viewport = False
+
+class ViewLayerObjects:
+    def __init__(self, scene):
+        self.scene = scene
+        self.active = None
+
+    @property
+    def selected(self):
+        count("ViewLayer.objects.selected")
+        return [o for o in self.scene.objects if o.selected]
+
+class ViewLayer:
+    def __init__(self, scene, collection):
+        self.objects = ViewLayerObjects(scene)
+        self.layer_collection = LayerCollection(SimpleNamespace(name="Scene Collection"), [LayerCollection(collection)])
+
+class Context:
+    def __init__(self):
+        self.scene = Scene()
+        self.view_layer = ViewLayer(self.scene, SimpleNamespace(name="Collection"))
+
+    @property
+    def selected_objects(self):
+        count("context.selected_objects")
+        return [o for o in self.scene.objects if o.selected]
+
+    @host_api("context.evaluated_depsgraph_get")
+    def evaluated_depsgraph_get(self):
+        return SimpleNamespace()
+
+context = Context()
+data = SimpleNamespace(filepath="", is_dirty=False, objects={})
+
+
+# -------------------- OPERATORS
+@host_api("ops.export_scene.fbx")
+def export_fbx(filepath, **options):
+    # like the real exporter, a mesh datablock used by several objects is written once
+    selected = context.selected_objects
+    with open(filepath, "w") as file:
+        file.write("; FBX 7.4.0 project file\n")
+        # the header changes on every export, like Blender's
+        now = time.localtime()
+        file.write("FBXHeaderExtension:  {\n\tCreationTimeStamp:  {\n\t\tSecond: %d\n\t\tMillisecond: %d\n\t}\n}\n"
+                   % (now.tm_sec, int(time.time() * 1000) % 1000))
+        file.write("CreationTime: \"%s\"\n" % time.strftime("%Y-%m-%d %H:%M:%S"))
+        written = set()
+        for o in selected:
+            if o.type == 'MESH' and o.data.name not in written:
+                written.add(o.data.name)
+                file.write("Geometry: \"{}\", {} vertices\n".format(o.data.name, len(o.data.vertices)))
+        for o in selected:
+            file.write("Model: \"{}\", \"{}\"\n".format(o.name, o.type))
+
+@host_api("ops.wm.save_as_mainfile")
+def save_as_mainfile(filepath, copy=False):
+    with open(filepath, "w") as file:
+        file.write("BLENDER")
+
+@host_api("ops.object.empty_add")
+def empty_add(**kwargs):
+    pass
+
+ops = SimpleNamespace(
+    export_scene=SimpleNamespace(fbx=export_fbx),
+    wm=SimpleNamespace(save_as_mainfile=save_as_mainfile),
+    object=SimpleNamespace(empty_add=empty_add),
+)
+
+
+# -------------------- EVERYTHING ELSE
+def _property(kind):
+    return lambda **kwargs: (kind, kwargs)
+
+props = SimpleNamespace(StringProperty=_property("StringProperty"), BoolProperty=_property("BoolProperty"),
+                        IntProperty=_property("IntProperty"))
+
+utils = SimpleNamespace(register_class=lambda cls: None, unregister_class=lambda cls: None)
+
+@host_api("path.relpath")
+def _relpath(path):
+    return path
+
+path = SimpleNamespace(relpath=_relpath)
+app = SimpleNamespace(binary_path="blender")
+
+
+def export_folder(index):
+    return os.path.join("juniper_game_dev", "Assets", "Models", "group_{}".format(index % EXPORT_FOLDERS))
+
+def build_scene(object_count):
+    """Replace the scene with `object_count` objects spread over EXPORT_NODES export nodes."""
+    global context
+    context = Context()
+    scene = context.scene
+    collection = context.view_layer.layer_collection.children[0].collection
+
+    per_node = max(1, (object_count - EXPORT_NODES) // EXPORT_NODES)
+    for n in range(EXPORT_NODES):
+        node = Object("export_node_{}".format(n), 'EMPTY', collection=collection, location=(n * 10.0, 0.0, 0.0))
+        node.fbx_export_name = "asset_{}".format(n)
+        node.fbx_export_path = "//" + export_folder(n) + "/"
+        node.fbx_export_isStatic = n % 2 == 0
+        scene.objects.append(node)
+        scene.export_nodes.append(node)
+
+        subtree = [node]
+        for i in range(per_node):
+            parent = subtree[i // BRANCHING]
+            o = Object("mesh_{}_{}".format(n, i), 'MESH', parent, Mesh(float(i % MESH_VARIANTS)), (float(i), 0.0, 0.0), collection)
+            if i % 10 == 0:
+                o.modifiers.append(Modifier("Subdivision"))
+            scene.objects.append(o)
+            subtree.append(o)
+
+    data.objects = {o.name: o for o in scene.objects}
+    return scene
+
+def select(objects, active=None):
+    for o in context.scene.objects:
+        o.selected = False
+    for o in objects:
+        o.selected = True
+    context.view_layer.objects.active = active
@@ -0,0 +1,357 @@
+"""Fake Krita with synthetic layer stacks.
+
+build_document(path, size, roles) makes a square document with one group per role, each holding two
+paint layers, plus EXTRA_GROUPS unrelated nested groups. Pixels are generated per node, a repeating
+row scaled to the requested rectangle. Saves, fills and conversions keep the document busy for
+JOB_POLLS polls of tryBarrierLock, like running image jobs.
+"""
+
+import os
+import itertools
+
+from . import count, host_api
+from .qt import Widget
+
+
+__all__ = ["Krita", "Application", "DockWidget", "DockWidgetFactory", "DockWidgetFactoryBase", "InfoObject", "ManagedColor", "Selection"]
+
+JOB_POLLS       = 3
+EXTRA_GROUPS    = 20
+EXTRA_LAYERS    = 5
+
+MASK_ROLES          = ("_METALNESS", "_OCCLUSION", "_EMISSION_MASK", "_SMOOTHNESS")
+DETAIL_MASK_ROLES   = ("_ALBEDO", "_SMOOTHNESS", "_NORMAL_DETAIL_MASK")
+DIFFUSE_ROLES       = ("_DIFFUSE", "_ALPHA")
+
+_ids = itertools.count(1)
+_rows = {}
+
+
+def _pixels(seed, w, h):
+    row = _rows.get((seed, w))
+    if row is None:
+        row = _rows[(seed, w)] = bytes((seed + i) & 255 for i in range(w * 4))
+    return row * h
+
+
+class Uuid:
+    def __init__(self, value):
+        self.value = value
+
+    def toString(self):
+        return self.value
+
+
+class Node:
+    def __init__(self, doc, name, type="paintlayer", children=()):
+        self.doc = doc
+        self._name = name
+        self._type = type
+        self.children = list(children)
+        self.id = "{{{:08d}}}".format(next(_ids))
+        self.seed = sum(map(ord, name))
+        self.blending = "normal"
+        self._visible = True
+
+    def name(self):
+        return self._name
+
+    def type(self):
+        return self._type
+
+    @host_api("Node.childNodes")
+    def childNodes(self):
+        return list(self.children)
+
+    def uniqueId(self):
+        return Uuid(self.id)
+
+    def blendingMode(self):
+        return self.blending
+
+    @host_api("Node.setBlendingMode")
+    def setBlendingMode(self, mode):
+        self.blending = mode
+
+    def opacity(self):
+        return 255
+
+    def visible(self):
+        return self._visible
+
+    @host_api("Node.setVisible")
+    def setVisible(self, visible):
+        self._visible = visible
+
+    @host_api("Node.projectionPixelData")
+    def projectionPixelData(self, x, y, w, h):
+        return _pixels(self.seed, w, h)
+
+    @host_api("Node.addChildNode")
+    def addChildNode(self, child, above):
+        index = self.children.index(above) + 1 if above in self.children else len(self.children)
+        self.children.insert(index, child)
+
+    @host_api("Node.setChildNodes")
+    def setChildNodes(self, children):
+        self.children = list(children)
+
+    @host_api("Node.remove")
+    def remove(self):
+        stack = [self.doc.root]
+        while stack:
+            node = stack.pop()
+            if self in node.children:
+                node.children.remove(self)
+                return True
+            stack.extend(node.children)
+        return False
+
+    def clone(self, doc):
+        copy = Node(doc, self._name, self._type, [child.clone(doc) for child in self.children])
+        copy.blending = self.blending
+        copy._visible = self._visible
+        return copy
+
+
+class Document:
+    def __init__(self, fileName, width, height, colorModel="RGBA", colorDepth="U8"):
+        self._fileName = fileName
+        self._width = width
+        self._height = height
+        self._colorModel = colorModel
+        self._colorDepth = colorDepth
+        self.root = Node(self, "root", "grouplayer")
+        self.active = None
+        self.busy = 0
+
+    def fileName(self):
+        return self._fileName
+
+    def setFileName(self, fileName):
+        self._fileName = fileName
+
+    def modified(self):
+        return False
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def colorModel(self):
+        return self._colorModel
+
+    def colorDepth(self):
+        return self._colorDepth
+
+    @host_api("Document.setColorSpace")
+    def setColorSpace(self, colorModel, colorDepth, colorProfile):
+        self._colorModel = colorModel
+        self._colorDepth = colorDepth
+        self.start_job()
+        return True
+
+    def start_job(self):
+        self.busy = JOB_POLLS
+
+    @host_api("Document.pixelData")
+    def pixelData(self, x, y, w, h):
+        return _pixels(0, w, h)
+
+    @host_api("Document.topLevelNodes")
+    def topLevelNodes(self):
+        return list(self.root.children)
+
+    def rootNode(self):
+        return self.root
+
+    @host_api("Document.nodeByName")
+    def nodeByName(self, name):
+        stack = list(self.root.children)
+        while stack:
+            node = stack.pop()
+            if node.name() == name:
+                return node
+            stack.extend(node.children)
+        return None
+
+    @host_api("Document.createNode")
+    def createNode(self, name, type):
+        return Node(self, name, type)
+
+    @host_api("Document.createFillLayer")
+    def createFillLayer(self, name, generator, configuration, selection):
+        return Node(self, name, "filllayer")
+
+    def setActiveNode(self, node):
+        self.active = node
+
+    @host_api("Document.refreshProjection")
+    def refreshProjection(self):
+        self.start_job()
+
+    @host_api("Document.waitForDone")
+    def waitForDone(self):
+        self.busy = 0
+
+    @host_api("Document.tryBarrierLock")
+    def tryBarrierLock(self):
+        if self.busy:
+            self.busy -= 1
+            return False
+        return True
+
+    def unlock(self):
+        pass
+
+    @host_api("Document.save")
+    def save(self):
+        with open(self._fileName, "wb") as file:
+            file.write(b"KRA")
+        self.start_job()
+
+    @host_api("Document.clone")
+    def clone(self):
+        copy = Document(self._fileName, self._width, self._height, self._colorModel, self._colorDepth)
+        copy.root = self.root.clone(copy)
+        Application.docs.append(copy)
+        return copy
+
+    @host_api("Document.close")
+    def close(self):
+        if self in Application.docs:
+            Application.docs.remove(self)
+
+    @host_api("Document.exportImage")
+    def exportImage(self, path, info):
+        # a file of the real size, without spending the time to fill it
+        channels = 4 if info.properties.get("alpha") else 3
+        with open(path, "wb") as file:
+            file.truncate(18 + self._width * self._height * channels)
+        self.start_job()
+
+
+class Action:
+    def __init__(self, app, name):
+        self.app = app
+        self.name = name
+
+    def trigger(self):
+        count("action " + self.name)
+        if self.app.active is not None:
+            self.app.active.start_job()
+
+
+class View:
+    @host_api("View.setForeGroundColor")
+    def setForeGroundColor(self, color):
+        pass
+
+
+class Window:
+    def __init__(self, app):
+        self.app = app
+        self.view = View()
+
+    @host_api("Window.addView")
+    def addView(self, doc):
+        self.app.active = doc
+
+    def activeView(self):
+        return self.view
+
+
+class Krita:
+    def __init__(self):
+        self.docs = []
+        self.files = {}
+        self.active = None
+        self.window = Window(self)
+
+    @staticmethod
+    def instance():
+        return Application
+
+    @host_api("Krita.activeDocument")
+    def activeDocument(self):
+        return self.active
+
+    def documents(self):
+        return list(self.docs)
+
+    def setBatchmode(self, batchmode):
+        pass
+
+    def activeWindow(self):
+        return self.window
+
+    def action(self, name):
+        return Action(self, name)
+
+    @host_api("Krita.openDocument")
+    def openDocument(self, path):
+        doc = self.files.get(path)
+        if doc is not None:
+            self.docs.append(doc)
+        return doc
+
+    def addDockWidgetFactory(self, factory):
+        pass
+
+Application = Krita()
+
+
+class DockWidget(Widget):
+    pass
+
+class DockWidgetFactoryBase:
+    DockRight = 2
+
+class DockWidgetFactory:
+    def __init__(self, id, area, cls):
+        self.cls = cls
+
+class InfoObject:
+    def __init__(self):
+        self.properties = {}
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+class ManagedColor:
+    def __init__(self, model, depth, profile):
+        self._components = [0.0, 0.0, 0.0, 0.0]
+
+    def components(self):
+        return list(self._components)
+
+    def setComponents(self, components):
+        self._components = list(components)
+
+    def toXML(self):
+        b, g, r, _ = self._components
+        return '<!DOCTYPE color><color channeldepth="U8"><RGB r="{}" g="{}" b="{}" space=""/></color>'.format(r, g, b)
+
+class Selection:
+    def select(self, x, y, w, h, value):
+        pass
+
+
+def build_document(path, size, roles, colorDepth="U8", prefix="Rock"):
+    """A document with a group per role and some unrelated groups, made the active document."""
+    doc = Document(path, size, size, "RGBA", colorDepth)
+    for role in roles:
+        group = Node(doc, prefix + role, "grouplayer", [Node(doc, prefix + role + " base"), Node(doc, prefix + role + " detail")])
+        doc.root.children.append(group)
+    for g in range(EXTRA_GROUPS):
+        layers = [Node(doc, "paint {}.{}".format(g, i)) for i in range(EXTRA_LAYERS)]
+        doc.root.children.append(Node(doc, "group {}".format(g), "grouplayer", [Node(doc, "nested {}".format(g), "grouplayer", layers)]))
+
+    with open(path, "wb") as file:
+        file.write(b"KRA")
+    Application.docs.append(doc)
+    Application.files[os.path.abspath(path)] = doc
+    Application.active = doc
+    return doc
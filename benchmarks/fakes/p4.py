@@ -0,0 +1,49 @@
+"""Fake P4Python: a server that accepts every command, each call counts as one round trip."""
+
+from . import count
+
+
+class P4Exception(Exception):
+    pass
+
+
+class P4:
+    def __init__(self):
+        self.port = ""
+        self.user = ""
+        self.client = ""
+        self.exception_level = 2
+        self.warnings = []
+        self.errors = []
+        self.changes = 0
+        self._connected = False
+
+    def connected(self):
+        return self._connected
+
+    def connect(self):
+        count("p4 connect")
+        self._connected = True
+
+    def disconnect(self):
+        self._connected = False
+
+    def fetch_change(self):
+        count("p4 change -o")
+        return {"Change": "new", "Description": "", "Files": []}
+
+    def save_change(self, spec):
+        count("p4 change -i")
+        self.changes += 1
+        return ["Change {} created.".format(self.changes)]
+
+    def run(self, *args):
+        count("p4 " + args[0])
+        if args[0] == "describe":
+            return [{"status": "pending"}]
+        if args[0] == "print":
+            # the workspace is synced, the have revision of an open file is not known here
+            self.warnings = ["{} - no file(s) at that revision.".format(args[-1])]
+            return []
+        files = args[-1] if isinstance(args[-1], list) else [args[-1]]
+        return [{"depotFile": path, "clientFile": path, "action": args[0]} for path in files]
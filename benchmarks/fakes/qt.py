@@ -0,0 +1,98 @@
+"""Fake PyQt5: widgets that accept everything, and a QTimer whose callbacks run from run_event_loop()."""
+
+import types
+from collections import deque
+
+from . import count
+
+
+events = deque()
+messages = []
+
+
+def run_event_loop():
+    """Run scheduled callbacks, and the ones they schedule, until none are left."""
+    while events:
+        events.popleft()()
+
+
+class Anything:
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __getattr__(self, name):
+        return self
+
+
+class Widget:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return Anything()
+
+
+class QTimer:
+    @staticmethod
+    def singleShot(msec, callback):
+        count("QTimer.singleShot")
+        events.append(callback)
+
+
+class QMessageBox(Widget):
+    @staticmethod
+    def information(parent, title, text):
+        count("QMessageBox.information")
+        messages.append(text)
+
+    @staticmethod
+    def warning(parent, title, text):
+        count("QMessageBox.warning")
+        messages.append(text)
+
+
+class QFileDialog(Widget):
+    @staticmethod
+    def getExistingDirectory(parent, caption, directory):
+        count("QFileDialog.getExistingDirectory")
+        return ""
+
+
+class QWidget(Widget): pass
+class QGridLayout(Widget): pass
+class QLabel(Widget): pass
+class QPushButton(Widget): pass
+
+
+class QCheckBox(Widget):
+    def __init__(self, *args, **kwargs):
+        self.checked = False
+
+    def setChecked(self, checked):
+        self.checked = checked
+
+    def isChecked(self):
+        return self.checked
+
+
+class QLineEdit(Widget):
+    def __init__(self, *args, **kwargs):
+        self.value = ""
+
+    def setText(self, text):
+        self.value = text
+
+    def text(self):
+        return self.value
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+QtCore = _module("PyQt5.QtCore", QTimer=QTimer)
+QtGui = _module("PyQt5.QtGui")
+QtWidgets = _module("PyQt5.QtWidgets", QWidget=QWidget, QGridLayout=QGridLayout, QLabel=QLabel, QLineEdit=QLineEdit,
+                    QCheckBox=QCheckBox, QPushButton=QPushButton, QFileDialog=QFileDialog, QMessageBox=QMessageBox)
+PyQt5 = _module("PyQt5", QtCore=QtCore, QtGui=QtGui, QtWidgets=QtWidgets, __path__=[])
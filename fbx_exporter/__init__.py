@@ -0,0 +1,11 @@
+bl_info = {
+    "name": "FBX EXPORTER",
+    "category": "EXPORTER",
+    "author": "Michal Lopasovsky",
+    "version": (1, 0, 1),
+    "blender": (2, 90, 1),
+    "location": "VIEW_3D > Sidebar > EXPORTER",
+    "description": "Export all child objects under exporting node.",
+}
+
+from .fbx_exporter import *
@@ -0,0 +1,300 @@
+####################################################################################################
+## Change detection for export nodes.
+## Each export node is fingerprinted from everything that ends up in its FBX: the evaluated mesh
+## data (with custom normals, sharp edges and generic attributes), vertex group weights, shape keys, actions and NLA
+## strips, transforms, modifier stacks and custom properties of every object in the hierarchy, the
+## node's own export settings and the options passed to bpy.ops.export_scene.fbx.
+## Fingerprints are kept in a sidecar cache file in the export folder, so unchanged nodes can be
+## skipped without a P4 checkout or an FBX write.
+####################################################################################################
+
+import os
+import json
+import hashlib
+from array import array
+
+
+CACHE_FILE_NAME = ".fbx_export_cache.json"
+
+# modifier properties that only change the UI, not the exported data
+IGNORED_RNA_PROPS = {"rna_type", "show_expanded", "is_active", "is_override_data"}
+
+# foreach_get field, buffer type and size of the generic attribute types, others are hashed by name only
+ATTRIBUTE_FIELDS = {
+    "FLOAT":        ("value", "f", 1),
+    "INT":          ("value", "i", 1),
+    "INT8":         ("value", "i", 1),
+    "BOOLEAN":      ("value", "b", 1),
+    "FLOAT2":       ("vector", "f", 2),
+    "FLOAT_VECTOR": ("vector", "f", 3),
+    "FLOAT_COLOR":  ("color", "f", 4),
+    "BYTE_COLOR":   ("color", "f", 4),
+}
+
+
+# -------------------- FINGERPRINT
+class _Tee:
+    """Feeds the same bytes to several hashes, so buffers are read from Blender once."""
+
+    def __init__(self, *hashes):
+        self.hashes = hashes
+
+    def update(self, data):
+        for h in self.hashes:
+            h.update(data)
+
+def _hash_value(h, value):
+    h.update(repr(value).encode("utf-8"))
+
+def _hash_buffer(h, collection, attribute, typecode, size):
+    buffer = array(typecode, [0]) * (len(collection) * size)
+    collection.foreach_get(attribute, buffer)
+    h.update(buffer.tobytes())
+    return buffer
+
+def _rna_values(struct):
+    values = []
+    for prop in struct.bl_rna.properties:
+        if prop.identifier in IGNORED_RNA_PROPS:
+            continue
+        value = getattr(struct, prop.identifier, None)
+        if hasattr(value, "name"):
+            value = value.name
+        elif isinstance(value, (set, frozenset)):
+            # enum flags, set order changes with the hash seed of the process
+            value = tuple(sorted(value))
+        elif hasattr(value, "__len__") and not isinstance(value, str):
+            try:
+                value = tuple(value)
+            except TypeError:
+                continue
+        values.append((prop.identifier, value))
+    return values
+
+def _custom_props(obj):
+    return sorted((key, repr(obj[key])) for key in obj.keys() if not key.startswith("_"))
+
+def _hash_normals(h, mesh):
+    _hash_buffer(h, mesh.edges, "vertices", "i", 2)
+    _hash_buffer(h, mesh.edges, "use_edge_sharp", "b", 1)
+    if not mesh.has_custom_normals:
+        return
+    if hasattr(mesh, "corner_normals"):
+        _hash_buffer(h, mesh.corner_normals, "vector", "f", 3)
+    else:
+        # before Blender 4.1 split normals have to be computed first
+        mesh.calc_normals_split()
+        _hash_buffer(h, mesh.loops, "normal", "f", 3)
+
+def _hash_weights(h, obj, mesh):
+    _hash_value(h, [group.name for group in obj.vertex_groups])
+    counts = array("i")
+    groups = array("i")
+    weights = array("f")
+    for vertex in mesh.vertices:
+        vertex_groups = vertex.groups
+        counts.append(len(vertex_groups))
+        for group in vertex_groups:
+            groups.append(group.group)
+            weights.append(group.weight)
+    h.update(counts.tobytes())
+    h.update(groups.tobytes())
+    h.update(weights.tobytes())
+
+def _hash_shape_keys(h, shape_keys):
+    for block in shape_keys.key_blocks:
+        _hash_value(h, (block.name, block.relative_key.name, block.value, block.slider_min, block.slider_max,
+                        block.mute, block.vertex_group))
+        _hash_buffer(h, block.data, "co", "f", 3)
+    _hash_animation(h, shape_keys.animation_data)
+
+def _hash_action(h, action):
+    _hash_value(h, (action.name, tuple(action.frame_range)))
+    for fcurve in action.fcurves:
+        _hash_value(h, (fcurve.data_path, fcurve.array_index, fcurve.mute, [_rna_values(m) for m in fcurve.modifiers]))
+        points = fcurve.keyframe_points
+        _hash_buffer(h, points, "co", "f", 2)
+        _hash_buffer(h, points, "handle_left", "f", 2)
+        _hash_buffer(h, points, "handle_right", "f", 2)
+        _hash_value(h, [point.interpolation for point in points])
+
+def _hash_animation(h, animation_data):
+    """Hash the action and NLA strips baked into the FBX, returns whether there were any."""
+    if animation_data is None:
+        return False
+    actions = [animation_data.action] if animation_data.action is not None else []
+    for track in animation_data.nla_tracks:
+        _hash_value(h, (track.name, track.mute, track.is_solo))
+        for strip in track.strips:
+            _hash_value(h, _rna_values(strip))
+            if strip.action is not None:
+                actions.append(strip.action)
+    for action in actions:
+        _hash_action(h, action)
+    return bool(actions)
+
+def _hash_attributes(h, mesh):
+    # edge creases, color attributes and custom layers, internal ones like .select_vert are left out
+    for attribute in sorted(mesh.attributes, key=lambda a: a.name):
+        if attribute.name.startswith("."):
+            continue
+        _hash_value(h, (attribute.name, attribute.domain, attribute.data_type))
+        field = ATTRIBUTE_FIELDS.get(attribute.data_type)
+        if field is not None:
+            _hash_buffer(h, attribute.data, *field)
+
+def _hash_mesh(h, mesh):
+    """Returns the vertex positions, polygon sizes and material indices it read."""
+    co = _hash_buffer(h, mesh.vertices, "co", "f", 3)
+    _hash_buffer(h, mesh.loops, "vertex_index", "i", 1)
+    loop_total = _hash_buffer(h, mesh.polygons, "loop_total", "i", 1)
+    material_index = _hash_buffer(h, mesh.polygons, "material_index", "i", 1)
+    _hash_buffer(h, mesh.polygons, "use_smooth", "b", 1)
+    _hash_normals(h, mesh)
+    for uv_layer in mesh.uv_layers:
+        _hash_value(h, uv_layer.name)
+        _hash_buffer(h, uv_layer.data, "uv", "f", 2)
+    for color_layer in mesh.vertex_colors:
+        _hash_value(h, color_layer.name)
+        _hash_buffer(h, color_layer.data, "color", "f", 4)
+    _hash_attributes(h, mesh)
+    _hash_value(h, [m.name if m else None for m in mesh.materials])
+    return co, loop_total, material_index
+
+def mesh_digest(mesh):
+    """Hash of everything the FBX exporter writes for a mesh, equal digests mean equal geometry."""
+    h = hashlib.blake2b(digest_size=16)
+    _hash_mesh(h, mesh)
+    return h.digest()
+
+def fingerprint_node(node, objects, export_options, depsgraph, mesh_digests=None, mesh_buffers=None):
+    """Hash of the export node and the objects exported with it.
+
+    With a `mesh_digests` dict, the mesh_digest() of every evaluated mesh is stored in it by object name.
+    With a `mesh_buffers` dict, the vertex positions, polygon sizes, material indices and material
+    names of every evaluated mesh are stored in it by object name (see static_batching.py).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    _hash_value(h, json.dumps(export_options, sort_keys=True, default=sorted))
+    _hash_value(h, (node.fbx_export_name, node.fbx_export_path, node.fbx_export_isStatic))
+
+    animated = False
+    for obj in sorted(objects, key=lambda o: o.name):
+        _hash_value(h, (obj.name, obj.type, obj.parent.name if obj.parent else None))
+        _hash_value(h, [tuple(row) for row in obj.matrix_world])
+        _hash_value(h, _custom_props(obj))
+        for modifier in obj.modifiers:
+            _hash_value(h, _rna_values(modifier))
+        # bake_anim is on, actions end up in the FBX
+        animated = _hash_animation(h, obj.animation_data) or animated
+
+        if obj.type == 'MESH':
+            # modifiers are applied on export, so hash the evaluated mesh
+            evaluated = obj.evaluated_get(depsgraph)
+            mesh = evaluated.to_mesh()
+            try:
+                if mesh_digests is None:
+                    buffers = _hash_mesh(h, mesh)
+                else:
+                    mesh_hash = hashlib.blake2b(digest_size=16)
+                    buffers = _hash_mesh(_Tee(h, mesh_hash), mesh)
+                    mesh_digests[obj.name] = mesh_hash.digest()
+                if mesh_buffers is not None:
+                    mesh_buffers[obj.name] = buffers + ([m.name if m else "" for m in mesh.materials],)
+                if obj.vertex_groups:
+                    _hash_weights(h, obj, mesh)
+            finally:
+                evaluated.to_mesh_clear()
+            if obj.data.shape_keys is not None:
+                _hash_shape_keys(h, obj.data.shape_keys)
+                animated = animated or obj.data.shape_keys.animation_data is not None
+        elif obj.type == 'ARMATURE':
+            _hash_value(h, [(b.name, b.parent.name if b.parent else None, [tuple(r) for r in b.matrix_local])
+                            for b in obj.data.bones])
+
+    if animated:
+        # animation is baked over the scene's frame range
+        scene = depsgraph.scene
+        _hash_value(h, (scene.frame_start, scene.frame_end, scene.frame_step, scene.render.fps, scene.render.fps_base))
+    return h.hexdigest()
+
+
+# -------------------- SIDECAR CACHE
+class ExportCache:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, CACHE_FILE_NAME)
+        self.directory = directory
+        self.entries = {}
+        self.dirty = False
+
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r") as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def is_current(self, fbx_file, fingerprint):
+        entry = self.entries.get(fbx_file)
+        return (entry is not None
+                and entry["fingerprint"] == fingerprint
+                and os.path.isfile(os.path.join(self.directory, fbx_file)))
+
+    def update(self, fbx_file, fingerprint, source, node):
+        self.entries[fbx_file] = {"fingerprint": fingerprint, "source": source, "node": node}
+        self.dirty = True
+
+    def evict(self, source, live_outputs):
+        """Drop entries written from `source` by nodes that no longer export to that file.
+
+        `live_outputs` maps node name to the fbx file name it currently exports to.
+        """
+        evicted = []
+        for fbx_file, entry in list(self.entries.items()):
+            if entry["source"] != source:
+                continue
+            if live_outputs.get(entry["node"]) != fbx_file:
+                del self.entries[fbx_file]
+                evicted.append(fbx_file)
+        if evicted:
+            self.dirty = True
+        return evicted
+
+    def save(self):
+        if not self.dirty:
+            return
+        with open(self.path, "w") as file:
+            json.dump(self.entries, file, indent=1, sort_keys=True)
+        self.dirty = False
+
+
+class ExportCaches:
+    """One ExportCache per export folder, loaded on first use."""
+
+    def __init__(self):
+        self.caches = {}
+
+    def for_path(self, export_path):
+        directory = os.path.dirname(export_path)
+        if directory not in self.caches:
+            self.caches[directory] = ExportCache(directory)
+        return self.caches[directory]
+
+    def is_current(self, export_path, fingerprint):
+        return self.for_path(export_path).is_current(os.path.basename(export_path), fingerprint)
+
+    def update(self, export_path, fingerprint, source, node):
+        self.for_path(export_path).update(os.path.basename(export_path), fingerprint, source, node)
+
+    def evict(self, source, live_paths):
+        live_outputs = {node: os.path.basename(path) for node, path in live_paths.items()}
+        evicted = []
+        for cache in self.caches.values():
+            live = {node: name for node, name in live_outputs.items()
+                    if os.path.dirname(live_paths[node]) == cache.directory}
+            evicted += [os.path.join(cache.directory, f) for f in cache.evict(source, live)]
+        return evicted
+
+    def save(self):
+        for cache in self.caches.values():
+            cache.save()
@@ -1,83 +1,606 @@
-bl_info = {
-    "name": "FBX EXPORTER",
-    "category": "EXPORTER",
-    "author": "Michal Lopasovsky",
-    "version": (1, 0, 1),
-    "blender": (2, 90, 1),
-    "location": "VIEW_3D > Sidebar > EXPORTER",
-    "description": "Export all child objects under exporting node.",
-}
-
 import os
-import pathlib
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
 import bpy
 
-from P4 import P4, P4Exception
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from . import output_verify
+from . import tracing
+from .p4_config import config_name, find_p4config
+from .p4_session import P4Sessions
+from .export_cache import ExportCaches, fingerprint_node
+from .export_manifest import manifest_for
+from .hierarchy import ExposedSubtree, build_children_index, get_subtree
+from .instancing import SharedGeometry, format_sharing
+from .static_batching import sidecar_path, read_mesh_buffers, write_batching
+from .worker_pool import ExportWorkerPool, run_worker
 
 
 DEPOTROOT       = "D:\depots"
 DEPOT           = "juniper_game_dev"
-P4CONFIGFILE    = DEPOTROOT + "\\" + DEPOT + "\.p4config"
-
-p4 = P4()
-
-with open(P4CONFIGFILE, "r") as file:
-    P4_CONFIG = defaultdict(str)
-    for line in file:
-        data = line.strip().split('=')
-        P4_CONFIG[data[0].strip()] = data[1].strip()
 
-p4.port     = P4_CONFIG['P4PORT']
-p4.user     = P4_CONFIG['P4USER']
-p4.client   = P4_CONFIG['P4CLIENT']
-
-
-def check_out_exported_file(desc, fbx_file_to_export, cleaned_path):
+EXPORT_NODE_PREFIX = "export_node_"
+
+FBX_EXPORT_OPTIONS = dict(
+    use_selection=True,
+    apply_unit_scale=True,
+    apply_scale_options='FBX_SCALE_ALL',
+    use_custom_props=True,
+    bake_space_transform=True,
+    use_mesh_modifiers=True,
+    add_leaf_bones=True,
+    object_types={'MESH', 'EMPTY', 'ARMATURE', 'OTHER'},
+)
+
+# stands for the options in the export manifest
+FBX_OPTIONS_DIGEST = hashlib.blake2b(json.dumps(FBX_EXPORT_OPTIONS, sort_keys=True, default=sorted).encode("utf-8"),
+                                     digest_size=8).hexdigest()
+
+# P4Python and the .p4config are only loaded by the first checkout
+p4_sessions = P4Sessions()
+
+tracing.start_from_env("fbx_export")
+
+
+def _normalized(path):
+    return os.path.normcase(os.path.normpath(str(path)))
+
+def group_by_p4config(paths):
+    # files can live in different workspaces, every one is handled with its own config
+    configs = {}
+    by_config = defaultdict(list)
+    for path in paths:
+        directory = os.path.dirname(str(path))
+        if directory not in configs:
+            configs[directory] = find_p4config(directory)
+        if configs[directory] is None:
+            print("No {} found above {}, not checked out".format(config_name(), path))
+            continue
+        by_config[configs[directory]].append(path)
+    return by_config
+
+def print_p4_errors(session):
+    print("----- P4 Related errors START ----")
+    for e in session.p4.errors:
+        print(e)
+    print("----- P4 Related errors END ----")
+    tracing.event("p4 errors", errors=list(session.p4.errors))
+
+def check_out_exported_files(cleaned_paths, new=False):
+    """Open the files for edit or add, returns the (normalized) paths this call opened for edit.
+
+    With `new` they are all opened for add, see P4Session.check_out().
+    """
+    opened = set()
+    if not cleaned_paths:
+        return opened
     try:
-        p4.connect()
-        result = p4.fetch_change()
-
-        if os.path.isfile(str(cleaned_path)):
-            p4.run("edit", cleaned_path)
-        else:
-            result['Description'] = "Exported from Blender"
-            result['Files'] = []
-            change_list = p4.save_change(result)[0].split()[1]
-            output = p4.run_add("-c", change_list, cleaned_path)
-        p4.disconnect()
-
-    except P4Exception:
-        print("----- P4 Related errors START ----")
-        for e in p4.errors:
-            print(e)
-        print("----- P4 Related errors END ----")
-
-def get_children():
-    return bpy.ops.object.select_grouped(type='CHILDREN_RECURSIVE')
-
-def export_to_fbx(context):
-    relatpath = bpy.path.relpath(context.fbx_export_path)
-    fbx_file_to_export = context.fbx_export_name + ".fbx"
+        from P4 import P4Exception
+    except ImportError:
+        print("P4Python is not installed, exported files are not checked out")
+        return opened
+
+    for config_path, paths in group_by_p4config(cleaned_paths).items():
+        with tracing.span("p4 check out", config=config_path, files=len(paths)):
+            session = p4_sessions.for_config(config_path)
+            try:
+                for r in session.check_out(paths, new):
+                    # files that were open already only give a warning
+                    if isinstance(r, dict) and r.get('action') == 'edit' and 'clientFile' in r:
+                        opened.add(_normalized(r['clientFile']))
+                for w in session.p4.warnings:
+                    print(w)
+                if session.p4.warnings:
+                    tracing.event("p4 warnings", warnings=list(session.p4.warnings))
+
+            except P4Exception:
+                print_p4_errors(session)
+    return opened
+
+def revert_unchanged_files(before, opened, written):
+    """Revert the written files that are identical to the revision the workspace has.
+
+    `before` holds output_verify.snapshot() of the files taken before they were written, that is the
+    have revision for the files this run opened for edit (`opened`). Files that were open already
+    are compared with `p4 print` of their have revision instead. Returns the kept and reverted paths.
+    """
+    candidates = [path for path in written if path in before]
+    if not candidates:
+        return list(written), []
+    try:
+        from P4 import P4Exception
+    except ImportError:
+        return list(written), []
+
+    reverted = []
+    with tracing.span("verify outputs", files=len(candidates)):
+        for config_path, paths in group_by_p4config(candidates).items():
+            session = p4_sessions.for_config(config_path)
+            try:
+                have = dict(before)
+                for path in paths:
+                    if _normalized(path) in opened:
+                        continue
+                    target = os.path.join(tempfile.gettempdir(), "fbx_have_{}_{}".format(os.getpid(), os.path.basename(path)))
+                    try:
+                        session.print_have(path, target)
+                        have[path] = output_verify.content_digest(target) if os.path.isfile(target) else None
+                    finally:
+                        if os.path.isfile(target):
+                            os.remove(target)
+
+                unchanged = output_verify.same_as_before(have, paths)
+                if unchanged:
+                    session.revert(unchanged)
+                    reverted += unchanged
+            except P4Exception:
+                print_p4_errors(session)
+    kept = [path for path in written if path not in reverted]
+    tracing.count("files reverted", len(reverted))
+    return kept, reverted
+
+def format_verification(kept, reverted):
+    lines = ["reverted, identical to the have revision: " + path for path in reverted]
+    lines.append("{} exported files kept, {} reverted".format(len(kept), len(reverted)))
+    return "\n".join(lines)
+
+def get_export_path(node):
+    relatpath = bpy.path.relpath(node.fbx_export_path)
+    fbx_file_to_export = node.fbx_export_name + ".fbx"
     cleaned_path = DEPOTROOT + "\\" + relatpath[relatpath.find(DEPOT):] + fbx_file_to_export
-    export_path = os.path.normpath(cleaned_path)
+    return os.path.normpath(cleaned_path)
+
+def write_fbx(export_path):
+    with tracing.span("export_scene.fbx", path=str(export_path)):
+        bpy.ops.export_scene.fbx(filepath=str(export_path), **FBX_EXPORT_OPTIONS)
+    if tracing.enabled:
+        tracing.count("bytes written", os.path.getsize(export_path))
+
+def tag_static(node, objects):
+    # only write the property when it changes, so unchanged objects are not dirtied
+    is_static = 1 if node.fbx_export_isStatic else 0
+    for o in objects:
+        if o.get('isStatic') != is_static:
+            o['isStatic'] = is_static
+
+def node_files(node, export_path):
+    """The files an export node writes: its FBX, and the batching sidecar when the node is static."""
+    if node.fbx_export_isStatic:
+        return [export_path, sidecar_path(export_path)]
+    if os.path.isfile(sidecar_path(export_path)):
+        print("{} is not static anymore, delete {} from the depot".format(node.name, sidecar_path(export_path)))
+    return [export_path]
+
+def record_outputs(written, source, unsaved):
+    """Add the files written by export nodes, (node name, is static, paths), to the export manifest.
+
+    `source` is the .blend they were exported from, `unsaved` whether it had unsaved changes then.
+    """
+    manifests = {}
+    with tracing.span("record manifest", nodes=len(written)):
+        for node_name, is_static, paths in written:
+            settings = {"options": FBX_OPTIONS_DIGEST, "static": bool(is_static)}
+            for path in paths:
+                manifest = manifest_for(path)
+                manifest.record(str(path), source, node_name, "blender", settings, unsaved)
+                manifests[manifest.path] = manifest
+        for manifest in manifests.values():
+            manifest.save()
+
+def is_current(caches, node, export_path, fingerprint):
+    if node.fbx_export_isStatic and not os.path.isfile(sidecar_path(export_path)):
+        return False
+    return caches.is_current(export_path, fingerprint)
+
+def export_to_fbx(context, objects, force=False):
+    export_path = get_export_path(context)
+
+    # skip the checkout and the write when nothing under the node changed
+    caches = ExportCaches()
+    mesh_digests = {}
+    mesh_buffers = {} if context.fbx_export_isStatic else None
+    with tracing.span("fingerprint", node=context.name, objects=len(objects)):
+        fingerprint = fingerprint_node(context, objects, FBX_EXPORT_OPTIONS, bpy.context.evaluated_depsgraph_get(),
+                                       mesh_digests, mesh_buffers)
+    if not force and is_current(caches, context, export_path, fingerprint):
+        return False
 
     # P4 checkout fbx file first
-    desc = "Saved from Blender"
-    check_out_exported_file(desc, fbx_file_to_export, export_path)
-
-    # Finally export to fbx
-    bpy.ops.export_scene.fbx(
-        filepath=str(export_path),
-        use_selection=True,
-        apply_unit_scale=True,
-        apply_scale_options='FBX_SCALE_ALL',
-        use_custom_props=True,
-        bake_space_transform=True,
-        use_mesh_modifiers=True,
-        add_leaf_bones=True,
-        object_types={'MESH', 'EMPTY', 'ARMATURE', 'OTHER'},
-    )
+    files = node_files(context, export_path)
+    before = output_verify.snapshot(files)
+    opened = check_out_exported_files(files)
+
+    # Finally export to fbx, repeated meshes are written once
+    with SharedGeometry(objects, mesh_digests) as shared:
+        write_fbx(export_path)
+    write_batching(context, objects, mesh_buffers, export_path, mesh_digests)
+    tracing.count("objects exported", len(objects))
+    print(format_sharing(context.name, shared.report))
+
+    # the same content as the have revision does not belong in the changelist
+    kept, reverted = revert_unchanged_files(before, opened, files)
+    print(format_verification(kept, reverted))
+    record_outputs([(context.name, context.fbx_export_isStatic, files)], bpy.data.filepath, bpy.data.is_dirty)
+
+    caches.update(export_path, fingerprint, bpy.data.filepath, context.name)
+    caches.save()
+    return export_path not in reverted
+
+# -------------------- EXPORT ALL NODES
+ExportResult = namedtuple("ExportResult", ["node", "path", "status", "seconds", "saved"], defaults=(0,))
+# name, files and is_static are taken when the node is planned, the node itself can be gone by the time it is written
+PendingExport = namedtuple("PendingExport", ["node", "objects", "path", "fingerprint", "seconds", "mesh_digests", "mesh_buffers",
+                                             "name", "files", "is_static"])
+ExportPlan = namedtuple("ExportPlan", ["results", "changed", "caches", "live_paths"])
+
+def get_export_nodes():
+    return [o for o in bpy.context.scene.objects if o.type == 'EMPTY' and o.name.startswith(EXPORT_NODE_PREFIX)]
+
+def plan_export_steps(force=False, read_meshes=True):
+    """plan_export_all() one export node at a time, returns the ExportPlan when done.
+
+    Yields (nodes fingerprinted, node count) after every node. Sending True on the next step looks
+    up the scene again, for a caller that lets the user edit the scene between steps. Without
+    `read_meshes` the mesh digests and buffers are not kept, for nodes written by another process.
+    """
+    results = []
+
+    # group nodes by output folder, nodes without a name or path are reported and left out
+    groups = defaultdict(list)
+    seen_paths = set()
+    for node in get_export_nodes():
+        if not node.fbx_export_name or not node.fbx_export_path:
+            results.append(ExportResult(node.name, "", "skipped: missing name or path", 0.0))
+            continue
+        export_path = get_export_path(node)
+        if export_path in seen_paths:
+            results.append(ExportResult(node.name, export_path, "skipped: duplicate export path", 0.0))
+            continue
+        seen_paths.add(export_path)
+        groups[os.path.dirname(export_path)].append((node.name, export_path))
+
+    # fingerprint every node first so unchanged ones are neither checked out nor written
+    caches = ExportCaches()
+    live_paths = {}
+    changed = []
+    total = sum(len(group) for group in groups.values())
+    planned = 0
+    index = None
+    for directory in sorted(groups):
+        for node_name, export_path in groups[directory]:
+            if index is None:
+                depsgraph = bpy.context.evaluated_depsgraph_get()
+                index = build_children_index(bpy.context.scene.objects)
+            start = time.perf_counter()
+            live_paths[node_name] = export_path
+            node = bpy.data.objects.get(node_name)
+            if node is None:
+                results.append(ExportResult(node_name, export_path, "skipped: removed while planning", 0.0))
+            else:
+                objects = get_subtree(node, index)
+                tag_static(node, objects)
+                mesh_digests = {} if read_meshes else None
+                # static nodes keep the mesh buffers for their batching sidecar
+                mesh_buffers = {} if read_meshes and node.fbx_export_isStatic else None
+                with tracing.span("fingerprint", node=node_name, objects=len(objects)):
+                    fingerprint = fingerprint_node(node, objects, FBX_EXPORT_OPTIONS, depsgraph, mesh_digests, mesh_buffers)
+                if not force and is_current(caches, node, export_path, fingerprint):
+                    results.append(ExportResult(node_name, export_path, "unchanged", time.perf_counter() - start))
+                else:
+                    changed.append(PendingExport(node, objects, export_path, fingerprint, time.perf_counter() - start,
+                                                 mesh_digests, mesh_buffers, node_name, node_files(node, export_path),
+                                                 bool(node.fbx_export_isStatic)))
+            planned += 1
+            if (yield planned, total):
+                index = None
+
+    return ExportPlan(results, changed, caches, live_paths)
+
+def plan_export_all(force=False):
+    steps = plan_export_steps(force)
+    while True:
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+
+def finish_export_all(plan, source):
+    plan.caches.evict(source, plan.live_paths)
+    plan.caches.save()
+
+def export_all_nodes(force=False):
+    with tracing.span("export all", force=force) as span:
+        results = _export_all_nodes(force)
+        span.set(nodes=len(results))
+    return results
+
+def _export_all_nodes(force):
+    plan = plan_export_all(force)
+    results = plan.results
+
+    # existing files have to be writable first, new ones are added once written, like in the background
+    edited = sorted({f for pending in plan.changed for f in pending.files if os.path.isfile(f)})
+    before = output_verify.snapshot(edited)
+    opened = check_out_exported_files(edited)
+
+    sidecars = []
+    written = []
+    unwritten = []
+    for pending in plan.changed:
+        start = time.perf_counter()
+        saved = 0
+        try:
+            with ExposedSubtree(bpy.context.view_layer, pending.objects, pending.node), SharedGeometry(pending.objects, pending.mesh_digests) as shared:
+                write_fbx(pending.path)
+            written.append(pending.path)
+            sidecar = write_batching(pending.node, pending.objects, pending.mesh_buffers, pending.path, pending.mesh_digests)
+            if sidecar is not None:
+                sidecars.append(sidecar)
+                written.append(sidecar)
+            tracing.count("objects exported", len(pending.objects))
+            plan.caches.update(pending.path, pending.fingerprint, bpy.data.filepath, pending.name)
+            status = "exported"
+            saved = shared.report.bytes_saved
+        except Exception as e:
+            status = "failed: " + str(e)
+            unwritten += pending.files
+        results.append(ExportResult(pending.name, pending.path, status, pending.seconds + time.perf_counter() - start, saved))
+
+    settle_checkouts(written, unwritten, set(edited), opened)
+    results = verify_results(results, before, opened, sidecars)
+    record_written(plan.changed, results, bpy.data.filepath, bpy.data.is_dirty)
+    finish_export_all(plan, bpy.data.filepath)
+    return results
+
+def record_written(changed, results, source, unsaved):
+    written = {r.node for r in results if r.status == "exported" or r.status.startswith("identical")}
+    record_outputs([(p.name, p.is_static, p.files) for p in changed if p.name in written], source, unsaved)
+
+def settle_checkouts(written, unwritten, edited, opened):
+    """Open the new files that were written for add, revert the `edited` files of nodes not written."""
+    added = [f for f in written if f not in edited]
+    if added:
+        check_out_exported_files(added, new=True)
+    # cancelled and failed nodes leave their files as they were
+    revert_unwritten(unwritten, opened)
+
+def revert_unwritten(paths, opened):
+    """Revert the files this run opened for edit (`opened`) but did not write, e.g. for cancelled nodes."""
+    paths = [path for path in paths if _normalized(path) in opened]
+    if not paths:
+        return []
+    try:
+        from P4 import P4Exception
+    except ImportError:
+        return []
+    for config_path, group in group_by_p4config(paths).items():
+        session = p4_sessions.for_config(config_path)
+        try:
+            session.revert(group)
+        except P4Exception:
+            print_p4_errors(session)
+    return paths
+
+def verify_results(results, before, opened, sidecars=()):
+    """Revert exported files identical to their have revision and mark their results."""
+    written = [r.path for r in results if r.status == "exported"] + list(sidecars)
+    kept, reverted = revert_unchanged_files(before, opened, written)
+    print(format_verification(kept, reverted))
+    reverted = set(reverted)
+    return [r._replace(status="identical, reverted") if r.path in reverted and r.status == "exported" else r
+            for r in results]
+
+def format_export_summary(results):
+    lines = ["{:<32} {:>8} {:>10}  {:<10} {}".format("NODE", "SECONDS", "SAVED (KB)", "STATUS", "PATH")]
+    for r in results:
+        lines.append("{:<32} {:>8.2f} {:>10.1f}  {:<10} {}".format(r.node, r.seconds, r.saved / 1024.0, r.status, r.path))
+
+    exported = sum(1 for r in results if r.status == "exported")
+    identical = sum(1 for r in results if r.status.startswith("identical"))
+    lines.append("{} of {} export nodes exported ({} identical and reverted) in {:.2f} s, ~{:.1f} KB saved by shared geometry".format(
+        exported, len(results), identical, sum(r.seconds for r in results), sum(r.saved for r in results) / 1024.0))
+    return "\n".join(lines)
+
+def export_report(results):
+    """Report level and message of an Export All, only the nodes written count as exported."""
+    counts = defaultdict(int)
+    for r in results:
+        counts[r.status.split(":")[0].split(",")[0]] += 1
+    other = len(results) - sum(counts[status] for status in ("exported", "identical", "unchanged", "skipped"))
+    parts = ["Exported {} export nodes".format(counts["exported"])]
+    parts += ["{} {}".format(n, label) for n, label in ((counts["identical"], "identical and reverted"),
+                                                        (counts["unchanged"], "unchanged"), (counts["skipped"], "skipped"),
+                                                        (other, "failed, see console")) if n]
+    return ({'WARNING'} if other or counts["skipped"] else {'INFO'}), ", ".join(parts)
+
+def export_all_headless():
+    # blender --background level.blend --python-expr "import fbx_exporter; fbx_exporter.export_all_headless()"
+    if not hasattr(bpy.types.Object, 'fbx_export_name'):
+        register()
+
+    results = export_all_nodes(force="--force" in sys.argv)
+    print(format_export_summary(results))
+
+    if any(r.status.startswith("failed") for r in results):
+        sys.exit(1)
+
+# -------------------- BACKGROUND EXPORT
+background_export = None
+
+# UI time the background export spends per timer event, and the timer interval
+STEP_SECONDS    = 0.05
+TIMER_SECONDS   = 0.1
+
+def export_worker():
+    # started by BackgroundExport inside: blender --background <copy of the scene> --python-expr ...
+    if not hasattr(bpy.types.Object, 'fbx_export_name'):
+        register()
+
+    index = build_children_index(bpy.context.scene.objects)
+
+    def export_job(node_name, export_path):
+        node = bpy.data.objects[node_name]
+        objects = get_subtree(node, index)
+        with ExposedSubtree(bpy.context.view_layer, objects, node), SharedGeometry(objects) as shared:
+            write_fbx(export_path)
+        sidecar = None
+        if node.fbx_export_isStatic:
+            mesh_buffers = read_mesh_buffers(objects, bpy.context.evaluated_depsgraph_get())
+            sidecar = write_batching(node, objects, mesh_buffers, export_path)
+        tracing.count("objects exported", len(objects))
+        return {"saved": shared.report.bytes_saved, "sidecar": sidecar}
+
+    run_worker(export_job)
+
+def worker_command(blend_copy):
+    return [
+        bpy.app.binary_path, "--background", blend_copy,
+        "--python-expr", "import {0}; {0}.export_worker()".format(__package__),
+    ]
+
+class BackgroundExport:
+    """Export all nodes in background Blender processes, advanced by step() on every timer event.
+
+    Only the fingerprints and the copy of the scene are made on the UI thread, a few nodes per step.
+    P4 checkouts, verification and the manifest run on a helper thread.
+    """
+
+    def __init__(self, force, workers):
+        self.force = force
+        self.workers = workers
+        self.start = time.perf_counter()
+        self.status = "Planning"
+        self.results = []
+        self.pending = {}
+        self.pool = None
+        self.temp_dir = None
+        self.cancelled = False
+        self.new_step = False
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.steps = self._run()
+
+    def step(self):
+        """Work until STEP_SECONDS have passed or the next part runs elsewhere, returns True once done."""
+        deadline = time.perf_counter() + STEP_SECONDS
+        self.new_step = True
+        for more in self.steps:
+            self.new_step = False
+            if not more or time.perf_counter() >= deadline:
+                return False
+        return True
+
+    def progress(self):
+        if self.status == "Exporting":
+            return "Exporting {} / {}".format(self.pool.done, self.pool.total)
+        return self.status
+
+    def cancel(self):
+        self.cancelled = True
+        if self.pool is not None:
+            self.pool.cancel()
+
+    def close(self):
+        """Stop what is left of the export and remove the copy of the scene, also after an error."""
+        self.steps.close()
+        if self.pool is not None and not self.pool.finished:
+            self.pool.cancel()
+        self.executor.shutdown(wait=False)
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _in_thread(self, function, *args):
+        future = self.executor.submit(function, *args)
+        while not future.done():
+            yield False
+        return future.result()
+
+    def _plan(self):
+        steps = plan_export_steps(self.force, read_meshes=False)
+        try:
+            planned, total = next(steps)
+            while not self.cancelled:
+                self.status = "Fingerprinting {} / {}".format(planned, total)
+                yield True
+                # the scene may have been edited since the last step
+                planned, total = steps.send(self.new_step)
+        except StopIteration as done:
+            return done.value
+        return None
+
+    def _run(self):
+        plan = yield from self._plan()
+        tracing.complete("plan background export", self.start, time.perf_counter() - self.start, force=self.force)
+        if plan is None:
+            return
+        self.results = list(plan.results)
+        self.pending = {pending.name: pending for pending in plan.changed}
+        source = bpy.data.filepath
+        unsaved = bpy.data.is_dirty
+
+        if self.pending:
+            # workers export from a saved copy, so unsaved changes and isStatic tags are included
+            self.status = "Saving a copy of the scene"
+            yield False
+            self.temp_dir = tempfile.mkdtemp(prefix="fbx_export_")
+            blend_copy = os.path.join(self.temp_dir, "export.blend")
+            bpy.ops.wm.save_as_mainfile(filepath=blend_copy, copy=True)
+
+            # existing files have to be writable before the workers start, new ones are added once written
+            self.status = "Checking out"
+            edited = sorted({f for p in self.pending.values() for f in p.files if os.path.isfile(f)})
+            before, opened = yield from self._in_thread(self._check_out, edited)
+            if self.cancelled:
+                self.status = "Reverting"
+                yield from self._in_thread(revert_unwritten, edited, opened)
+                return
+
+            jobs = [{"node": p.name, "path": p.path} for p in self.pending.values()]
+            self.pool = ExportWorkerPool(worker_command(blend_copy), jobs, self.workers)
+            self.pool.start()
+            self.status = "Exporting"
+            while not self.pool.finished:
+                yield False
+            results = self.pool.wait()
+        else:
+            edited, before, opened, results = [], {}, set(), []
+
+        self.status = "Verifying"
+        self.results = yield from self._in_thread(self._finish, plan, results, set(edited), before, opened, source, unsaved)
+        tracing.complete("background export", self.start, time.perf_counter() - self.start, nodes=len(self.results))
+
+    def _check_out(self, paths):
+        before = output_verify.snapshot(paths)
+        return before, check_out_exported_files(paths)
+
+    def _finish(self, plan, pool_results, edited, before, opened, source, unsaved):
+        results = list(self.results)
+        written = []
+        sidecars = []
+        unwritten = []
+        for result in pool_results:
+            pending = self.pending[result["node"]]
+            if result["status"] == "exported":
+                plan.caches.update(pending.path, pending.fingerprint, source, pending.name)
+                written.append(pending.path)
+                if result.get("sidecar"):
+                    written.append(result["sidecar"])
+                    sidecars.append(result["sidecar"])
+            else:
+                unwritten += pending.files
+            results.append(ExportResult(result["node"], result["path"], result["status"], pending.seconds + result["seconds"],
+                                        result.get("saved", 0)))
+
+        settle_checkouts(written, unwritten, edited, opened)
+
+        results = verify_results(results, before, opened, sidecars)
+        record_written(plan.changed, results, source, unsaved)
+        finish_export_all(plan, source)
+        return results
 
 
 class ExporterPanel(bpy.types.Panel):
@@ -116,6 +639,29 @@ class ExporterPanel(bpy.types.Panel):
         row.scale_y = 1.0
         row.operator("export_mesh.create_new_node")
 
+        # export every export node in the scene
+        row = layout.row()
+        row.scale_y = 1.0
+        row.operator("export_mesh.fbx_export_all")
+
+        # export every export node in background Blender processes
+        if background_export is None:
+            row = layout.row()
+            row.operator("export_mesh.fbx_export_all_background")
+            row.prop(context.scene, 'fbx_export_workers')
+        else:
+            row = layout.row()
+            row.label(text=background_export.progress(), icon='TIME')
+            row.operator("export_mesh.fbx_export_cancel", text="", icon='CANCEL')
+
+        # re-export even when nothing changed since the last export
+        row = layout.row()
+        row.prop(context.scene, 'fbx_export_force')
+
+        if tracing.enabled:
+            row = layout.row()
+            row.operator("export_mesh.fbx_export_write_trace")
+
 class CreateExportNode(bpy.types.Operator):
     bl_idname       = "export_mesh.create_new_node"
     bl_label        = "Create a new export node"
@@ -128,7 +674,7 @@ class CreateExportNode(bpy.types.Operator):
             location = (bpy.context.selected_objects[0].location.x, bpy.context.selected_objects[0].location.y, bpy.context.selected_objects[0].location.z)
 
         bpy.ops.object.empty_add(type='PLAIN_AXES', align='WORLD', location=location, scale=(1, 1, 1))
-        bpy.context.selected_objects[0].name = "export_node_"
+        bpy.context.selected_objects[0].name = EXPORT_NODE_PREFIX
 
         return {'FINISHED'}
 
@@ -138,39 +684,123 @@ class ExportOperator(bpy.types.Operator):
     bl_name         = "FBX_EXPORTER"
     bl_description  = "Exports all objects linked under the export node."
 
+    @classmethod
+    def poll(cls, context):
+        # P4 and the export manifest are busy on the background export's thread
+        return background_export is None
+
     def execute(self, children):
+        with tracing.span("export node"):
+            return self.export_selected(children)
+
+    def export_selected(self, children):
         parent = bpy.context.selected_objects[0]
 
-        for col in bpy.context.scene.collection.children:
-            vlayer = bpy.context.scene.view_layers['View Layer']
-            current_col = vlayer.layer_collection.children[col.name].hide_viewport = False
+        index = build_children_index(bpy.context.scene.objects)
+        objects = get_subtree(parent, index)
+
+        # add isStatic custom property on the export node and its children
+        tag_static(parent, objects)
 
-        for o in bpy.context.scene.objects:
-            o.hide_set(False)
+        with ExposedSubtree(bpy.context.view_layer, objects, parent):
+            exported = export_to_fbx(parent, objects, children.scene.fbx_export_force)
+
+        if not exported:
+            self.report({'INFO'}, "Export node unchanged, skipped or reverted")
+
+        return {'FINISHED'}
+
+class ExportAllOperator(bpy.types.Operator):
+    bl_idname       = "export_mesh.fbx_export_all"
+    bl_label        = "Export All Nodes"
+    bl_description  = "Exports every export node in the scene."
+
+    @classmethod
+    def poll(cls, context):
+        return background_export is None
+
+    def execute(self, context):
+        results = export_all_nodes(context.scene.fbx_export_force)
+        print(format_export_summary(results))
+        self.report(*export_report(results))
+        return {'FINISHED'}
 
-        get_children()
-        bpy.data.objects[parent.name].select_set(True)
+class ExportAllBackgroundOperator(bpy.types.Operator):
+    bl_idname       = "export_mesh.fbx_export_all_background"
+    bl_label        = "Export All in Background"
+    bl_description  = "Exports every export node in background Blender processes, the scene stays editable."
 
-        # CHECK if export node has static bool set to true
-        if (bpy.context.object.fbx_export_isStatic == True):
-            for o in bpy.context.scene.objects: # add custom property on these child objects
-                o['isStatic'] = 1
+    def execute(self, context):
+        global background_export
+        if background_export is not None:
+            self.report({'WARNING'}, "A background export is already running")
+            return {'CANCELLED'}
+
+        background_export = BackgroundExport(context.scene.fbx_export_force, context.scene.fbx_export_workers)
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(TIMER_SECONDS, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        global background_export
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        for area in context.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+        # an error ends the export as well, the next one can start
+        done = True
+        try:
+            done = background_export.step()
+        finally:
+            if done:
+                context.window_manager.event_timer_remove(self._timer)
+                export, background_export = background_export, None
+                export.close()
+        if not done:
+            return {'PASS_THROUGH'}
+
+        results = export.results
+        print(format_export_summary(results))
+
+        if export.cancelled:
+            self.report({'INFO'}, "Background export cancelled")
         else:
-            for o in bpy.context.scene.objects: # add custom property on these child objects
-                o['isStatic'] = 0
+            self.report(*export_report(results))
+        return {'FINISHED'}
+
+class CancelBackgroundExportOperator(bpy.types.Operator):
+    bl_idname       = "export_mesh.fbx_export_cancel"
+    bl_label        = "Cancel background export"
+    bl_description  = "Stops the running background export."
 
-        export_to_fbx(children.object)
+    def execute(self, context):
+        if background_export is not None:
+            background_export.cancel()
+        return {'FINISHED'}
 
-        bpy.ops.object.select_all(action='INVERT')
-        for obj in bpy.context.selected_objects:
-            obj.hide_set(True)
+class WriteTraceOperator(bpy.types.Operator):
+    bl_idname       = "export_mesh.fbx_export_write_trace"
+    bl_label        = "Write Export Trace"
+    bl_description  = "Writes the recorded export timings as a Chrome trace file."
 
+    def execute(self, context):
+        path = tracing.write_chrome_trace()
+        self.report({'INFO'}, "Export trace written to " + path)
         return {'FINISHED'}
 
 # ---------- REGISTER/UNREGISTER CLASSES ---------- #
 custom_classes = [
     ExporterPanel,
     ExportOperator,
+    ExportAllOperator,
+    ExportAllBackgroundOperator,
+    CancelBackgroundExportOperator,
+    WriteTraceOperator,
     CreateExportNode
 ]
 
@@ -178,17 +808,21 @@ def register():
     bpy.types.Object.fbx_export_path = bpy.props.StringProperty(name='Path', subtype='FILE_PATH')
     bpy.types.Object.fbx_export_name = bpy.props.StringProperty(name='Name')
     bpy.types.Object.fbx_export_isStatic = bpy.props.BoolProperty(name="isStatic", default=False)
+    bpy.types.Scene.fbx_export_force = bpy.props.BoolProperty(name="Force export", default=False)
+    bpy.types.Scene.fbx_export_workers = bpy.props.IntProperty(name="Workers", default=2, min=1, max=32)
 
     for custom_class in custom_classes:
         bpy.utils.register_class(custom_class)
 
 def unregister():
-    del bpy.types.Object.export_path
-    del bpy.types.Object.fbx_export_name
-    del bpy.types.Object.fbx_export_isStatic
-
-    for custom_class in custom_classes:
-        bpy.utils.unregister_class(custom_class)
-
-if __name__ == "__main__":
-    register()
\ No newline at end of file
+    try:
+        p4_sessions.disconnect()
+    finally:
+        del bpy.types.Object.fbx_export_path
+        del bpy.types.Object.fbx_export_name
+        del bpy.types.Object.fbx_export_isStatic
+        del bpy.types.Scene.fbx_export_force
+        del bpy.types.Scene.fbx_export_workers
+
+        for custom_class in custom_classes:
+            bpy.utils.unregister_class(custom_class)
@@ -0,0 +1,91 @@
+####################################################################################################
+## Subtree helpers for export nodes.
+## The parent -> children index is built with one pass over the scene, after that every export
+## node's hierarchy is walked without touching unrelated objects.
+## ExposedSubtree makes only the exported objects visible and selected, and afterwards puts the
+## previous visibility, selection and active object back.
+####################################################################################################
+
+from collections import defaultdict
+
+from . import tracing
+
+
+def build_children_index(objects):
+    index = defaultdict(list)
+    for o in objects:
+        if o.parent is not None:
+            index[o.parent.name].append(o)
+    return index
+
+def get_subtree(node, index):
+    """The node followed by all of its descendants."""
+    subtree = [node]
+    stack = list(index.get(node.name, ()))
+    while stack:
+        o = stack.pop()
+        subtree.append(o)
+        stack.extend(index.get(o.name, ()))
+    return subtree
+
+def find_layer_collections(view_layer, objects):
+    """Layer collections holding any of `objects`, together with their parent layer collections."""
+    wanted = {c.name for o in objects for c in o.users_collection}
+    found = []
+
+    def walk(layer_collection, parents):
+        if layer_collection.collection.name in wanted:
+            found.extend(lc for lc in parents + [layer_collection] if lc not in found)
+        for child in layer_collection.children:
+            walk(child, parents + [layer_collection])
+
+    # the scene collection itself cannot be hidden, start from its children
+    for child in view_layer.layer_collection.children:
+        walk(child, [])
+    return found
+
+
+class ExposedSubtree:
+    def __init__(self, view_layer, objects, active):
+        self.view_layer = view_layer
+        self.objects = objects
+        self.active = active
+
+    def __enter__(self):
+        with tracing.span("show subtree", objects=len(self.objects)):
+            return self._expose()
+
+    def _expose(self):
+        self.selected = list(self.view_layer.objects.selected)
+        self.previous_active = self.view_layer.objects.active
+        self.layer_collections = [(lc, lc.hide_viewport) for lc in find_layer_collections(self.view_layer, self.objects)]
+        self.hidden = [(o, o.hide_get(view_layer=self.view_layer)) for o in self.objects]
+
+        for lc, _ in self.layer_collections:
+            lc.hide_viewport = False
+        for o in self.objects:
+            o.hide_set(False, view_layer=self.view_layer)
+
+        for o in self.selected:
+            o.select_set(False, view_layer=self.view_layer)
+        for o in self.objects:
+            o.select_set(True, view_layer=self.view_layer)
+        self.view_layer.objects.active = self.active
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with tracing.span("restore visibility", objects=len(self.objects)):
+            self._restore()
+        return False
+
+    def _restore(self):
+        for o in self.objects:
+            o.select_set(False, view_layer=self.view_layer)
+        for o in self.selected:
+            o.select_set(True, view_layer=self.view_layer)
+        self.view_layer.objects.active = self.previous_active
+
+        for o, hidden in self.hidden:
+            o.hide_set(hidden, view_layer=self.view_layer)
+        for lc, hidden in self.layer_collections:
+            lc.hide_viewport = hidden
@@ -0,0 +1,92 @@
+####################################################################################################
+## Shared geometry for repeated props.
+## Objects of an export node whose meshes hold identical data are pointed at one mesh while the FBX
+## is written. The FBX exporter then writes that geometry once and every copy as a model with its
+## own transform. Mesh data is compared by a hash of its vertex, index, edge, custom normal, UV,
+## color, attribute and material buffers read in bulk with foreach_get, every mesh datablock is
+## read once. Digests already taken while fingerprinting the node are reused, so a changed node's
+## meshes are not read twice.
+## Objects with modifiers, shape keys or vertex groups keep their own mesh, their exported geometry
+## differs per object. The original mesh of every object is put back afterwards.
+####################################################################################################
+
+from collections import namedtuple
+
+from .export_cache import mesh_digest
+from . import tracing
+
+
+SharingReport = namedtuple("SharingReport", ["objects", "meshes", "shared", "bytes_saved"])
+
+NO_SHARING = SharingReport(0, 0, 0, 0)
+
+
+def can_share_mesh(obj):
+    return (obj.type == 'MESH'
+            and len(obj.modifiers) == 0
+            and len(obj.vertex_groups) == 0
+            and obj.data.shape_keys is None)
+
+def fbx_geometry_bytes(mesh):
+    """Rough size of a mesh in a binary FBX: doubles for positions, normals and UVs, ints for indices."""
+    loops = len(mesh.loops)
+    size = len(mesh.vertices) * 3 * 8
+    size += loops * (4 + 3 * 8)
+    size += len(mesh.polygons) * 4
+    size += len(mesh.uv_layers) * loops * (2 * 8 + 4)
+    size += len(mesh.vertex_colors) * loops * (4 * 8 + 4)
+    return size
+
+
+class SharedGeometry:
+    def __init__(self, objects, mesh_digests=None):
+        self.objects = objects
+        self.mesh_digests = mesh_digests or {}
+        self.relinked = []
+        self.report = NO_SHARING
+
+    def __enter__(self):
+        with tracing.span("share geometry", objects=len(self.objects)):
+            self._share()
+        tracing.count("bytes saved", self.report.bytes_saved)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for obj, mesh in reversed(self.relinked):
+            obj.data = mesh
+        self.relinked = []
+        return False
+
+    def _share(self):
+        digests = {}
+        canonical = {}
+        counted = set()
+        candidates = 0
+        saved = 0
+
+        for obj in self.objects:
+            if not can_share_mesh(obj):
+                continue
+            candidates += 1
+            mesh = obj.data
+            # without modifiers the evaluated mesh digested by the fingerprint is the mesh itself
+            digest = digests.get(mesh.name) or self.mesh_digests.get(obj.name)
+            if digest is None:
+                digest = mesh_digest(mesh)
+            digests[mesh.name] = digest
+
+            shared = canonical.setdefault(digest, mesh)
+            if shared.name == mesh.name:
+                continue
+            # linked duplicates of one datablock are written once already, count the datablock once
+            if mesh.name not in counted:
+                counted.add(mesh.name)
+                saved += fbx_geometry_bytes(mesh)
+            self.relinked.append((obj, mesh))
+            obj.data = shared
+
+        self.report = SharingReport(candidates, len(canonical), len(self.relinked), saved)
+
+def format_sharing(node_name, report):
+    return "{}: {} of {} meshes written as shared geometry ({} unique), ~{:.1f} KB saved".format(
+        node_name, report.shared, report.objects, report.meshes, report.bytes_saved / 1024.0)
@@ -0,0 +1,83 @@
+####################################################################################################
+## Byte identity check of exported files.
+## Re-exporting a node that did not really change writes the same FBX apart from the creation time
+## Blender stores in its header, but the file is already open for edit, lands in the changelist and
+## every teammate's Unity imports it again. Files are hashed before and after an export, through
+## mmap in HASH_CHUNK windows so big files are not read into memory, leaving out the volatile
+## header fields. Files with the same hash are reverted afterwards (see fbx_exporter.py).
+####################################################################################################
+
+import os
+import re
+import mmap
+import struct
+import hashlib
+
+
+HASH_CHUNK          = 16 * 1024 * 1024
+HEADER_SCAN         = 64 * 1024
+
+FBX_BINARY_MAGIC    = b"Kaydara FBX Binary  \x00"
+FBX_LARGE_VERSION   = 7500
+
+# nodes whose content changes on every export, the property values are left out of the hash
+VOLATILE_NODES      = (b"CreationTimeStamp", b"CreationTime")
+
+_ASCII_VOLATILE     = re.compile(rb'CreationTimeStamp:\s*\{[^}]*\}|CreationTime:\s*"[^"]*"')
+
+
+def _binary_volatile_ranges(view):
+    version = struct.unpack_from("<I", view, 23)[0]
+    # node records start with end offset, property count and property list size, then the name
+    field, fields = ("<Q", 8) if version >= FBX_LARGE_VERSION else ("<I", 4)
+    ranges = []
+    header = bytes(view[:HEADER_SCAN])
+    for name in VOLATILE_NODES:
+        pattern = bytes((len(name),)) + name
+        position = header.find(pattern)
+        record = position - 3 * fields
+        if position < 0 or record < 0:
+            continue
+        end = struct.unpack_from(field, view, record)[0]
+        start = position + len(pattern)
+        if start <= end <= len(view):
+            ranges.append((start, end))
+    return ranges
+
+def volatile_ranges(view):
+    """Byte ranges of an FBX file that change on every export, sorted by start."""
+    if len(view) < 27:
+        return []
+    if bytes(view[:len(FBX_BINARY_MAGIC)]) == FBX_BINARY_MAGIC:
+        return sorted(_binary_volatile_ranges(view))
+    header = bytes(view[:HEADER_SCAN])
+    if b"FBXHeaderExtension" not in header:
+        return []
+    return [match.span() for match in _ASCII_VOLATILE.finditer(header)]
+
+def content_digest(path):
+    """Hash of a file without its volatile FBX header fields."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return h.hexdigest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                position = 0
+                for start, end in volatile_ranges(view) + [(len(view), len(view))]:
+                    for offset in range(position, start, HASH_CHUNK):
+                        h.update(view[offset:min(start, offset + HASH_CHUNK)])
+                    position = max(position, end)
+            finally:
+                view.release()
+    return h.hexdigest()
+
+def snapshot(paths):
+    """content_digest() of every path that exists, by path."""
+    return {path: content_digest(path) for path in paths if os.path.isfile(path)}
+
+def same_as_before(before, paths):
+    """The paths out of `paths` whose content did not change since `before` was taken."""
+    return [path for path in paths
+            if path in before and os.path.isfile(path) and content_digest(path) == before[path]]
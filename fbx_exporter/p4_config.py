@@ -0,0 +1,52 @@
+####################################################################################################
+## Perforce settings for the FBX exporter, read on the first checkout instead of at add-on load.
+## The config file is found the way p4 finds it: P4CONFIG names the file (".p4config" when unset)
+## and the first one found walking up from the exported file's folder wins. An absolute P4CONFIG
+## is used as is. A parsed file is reused until its mtime changes.
+####################################################################################################
+
+import os
+from collections import defaultdict
+
+
+DEFAULT_CONFIG_NAME = ".p4config"
+
+_parsed = {}
+
+
+def config_name():
+    return os.environ.get("P4CONFIG") or DEFAULT_CONFIG_NAME
+
+def find_p4config(directory):
+    """Path of the config file that applies to files in `directory`, or None."""
+    name = config_name()
+    if os.path.isabs(name):
+        return name if os.path.isfile(name) else None
+
+    directory = os.path.abspath(directory)
+    while True:
+        candidate = os.path.join(directory, name)
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+def read_p4config(path):
+    mtime = os.stat(path).st_mtime
+    cached = _parsed.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    config = defaultdict(str)
+    with open(path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            config[key.strip()] = value.strip()
+
+    _parsed[path] = (mtime, config)
+    return config
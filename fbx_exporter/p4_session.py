@@ -0,0 +1,119 @@
+####################################################################################################
+## Long-lived Perforce session used by the FBX exporter.
+## The connection is opened lazily on the first checkout and kept open for the rest of the
+## Blender session. A dropped connection is re-established once before the call is retried.
+## All files checked out during the session go into one "Exported from Blender" changelist,
+## and edit/add requests are sent as a single `p4 edit` / `p4 add` call per batch, like reverts of
+## files that turned out unchanged.
+## P4Sessions keeps one session per .p4config and only imports P4Python when the first one opens.
+####################################################################################################
+
+import os
+
+from .p4_config import read_p4config
+
+
+class P4Session:
+    CHANGE_DESCRIPTION = "Exported from Blender"
+
+    def __init__(self, p4, config):
+        self.p4 = p4
+        self.config = config
+        self.change = None
+
+        # report warnings (already opened, not in client view, ...) through p4.warnings
+        # instead of aborting the whole batch
+        self.p4.exception_level = 1
+
+    def connect(self):
+        if not self.p4.connected():
+            self.p4.port    = self.config['P4PORT']
+            self.p4.user    = self.config['P4USER']
+            self.p4.client  = self.config['P4CLIENT']
+            self.p4.connect()
+
+    def disconnect(self):
+        if self.p4.connected():
+            self.p4.disconnect()
+        self.change = None
+
+    def run(self, *args):
+        self.connect()
+        try:
+            return self.p4.run(*args)
+        except Exception:
+            if self.p4.connected():
+                raise
+            # server dropped the idle connection, try once more on a fresh one
+            self.connect()
+            return self.p4.run(*args)
+
+    def pending_change(self):
+        if self.change is None:
+            self.connect()
+            spec = self.p4.fetch_change()
+            spec['Description'] = self.CHANGE_DESCRIPTION
+            spec['Files'] = []
+            self.change = self.p4.save_change(spec)[0].split()[1]
+        return self.change
+
+    def change_is_pending(self):
+        if self.change is None:
+            return False
+        described = self.run("describe", "-s", self.change)
+        return len(described) > 0 and described[0].get('status') == 'pending'
+
+    def check_out(self, paths, new=False):
+        """Open existing files for edit and new files for add in the session changelist.
+
+        With `new` every file is opened for add, for files written since they were found missing.
+        """
+        paths = [str(path) for path in paths]
+        to_edit = [] if new else [path for path in paths if os.path.isfile(path)]
+        to_add = paths if new else [path for path in paths if not os.path.isfile(path)]
+
+        try:
+            return self._check_out(to_edit, to_add)
+        except Exception:
+            if self.change_is_pending():
+                raise
+            # changelist was submitted or deleted outside of Blender, start a new one
+            self.change = None
+            return self._check_out(to_edit, to_add)
+
+    def print_have(self, path, target):
+        """Write the revision the workspace has of `path` to the local file `target`."""
+        return self.run("print", "-q", "-o", str(target), str(path) + "#have")
+
+    def revert(self, paths):
+        return self.run("revert", [str(path) for path in paths])
+
+    def _check_out(self, to_edit, to_add):
+        result = []
+        if to_edit:
+            result += self.run("edit", "-c", self.pending_change(), to_edit)
+        if to_add:
+            result += self.run("add", "-c", self.pending_change(), to_add)
+        return result
+
+
+class P4Sessions:
+    def __init__(self):
+        self.sessions = {}
+
+    def for_config(self, config_path):
+        config = read_p4config(config_path)
+        session = self.sessions.get(config_path)
+        if session is None:
+            from P4 import P4
+            session = P4Session(P4(), config)
+            self.sessions[config_path] = session
+        elif session.config is not config:
+            # the config file was edited, reconnect with the new settings
+            session.disconnect()
+            session.config = config
+        return session
+
+    def disconnect(self):
+        for session in self.sessions.values():
+            session.disconnect()
@@ -0,0 +1,174 @@
+####################################################################################################
+## Static batching metadata for export nodes with isStatic set.
+## Next to <name>.fbx a compact <name>.batching.json lists, for the node and every mesh object in
+## it, the world space bounds, vertex and triangle counts and triangles per material, plus batch
+## groups: objects with the same materials, packed first fit decreasing so that no group goes over
+## MAX_BATCH_VERTICES. Unity's import step sets up static batching and culling from it without
+## scanning the meshes again.
+## Stats are taken from the evaluated meshes (modifiers applied, like the export). The buffers the
+## fingerprint read anyway are reused (fingerprint_node(mesh_buffers=...)), meshes are only read
+## again by the background workers, which do not fingerprint. Bounds are in Blender world space
+## (Z up): the box around the transformed local bounds, so the box of a rotated object is a
+## conservative one. Copies of a mesh share everything but that box, which is one pass over the
+## rows of the object's matrix.
+## The JSON is written with sorted keys and rounded floats, an unchanged node writes the same bytes.
+####################################################################################################
+
+import os
+import json
+from array import array
+from collections import defaultdict
+
+from . import tracing
+
+
+SIDECAR_SUFFIX      = ".batching.json"
+SIDECAR_VERSION     = 1
+SPACE               = "blender_world_z_up"
+
+# vertices of one static batch, the 16 bit index limit Unity batches under
+MAX_BATCH_VERTICES  = 64000
+DIGITS              = 5
+
+
+def sidecar_path(export_path):
+    return os.path.splitext(str(export_path))[0] + SIDECAR_SUFFIX
+
+def _read(collection, attribute, typecode, size):
+    buffer = array(typecode, [0]) * (len(collection) * size)
+    collection.foreach_get(attribute, buffer)
+    return buffer
+
+def local_bounds(co):
+    if not co:
+        return None
+    axes = (co[0::3], co[1::3], co[2::3])
+    return [min(a) for a in axes], [max(a) for a in axes]
+
+def world_bounds(bounds, matrix):
+    """The box around the transformed corners: the transformed center, the extents through |matrix|."""
+    low, high = bounds
+    cx, cy, cz = (low[0] + high[0]) * 0.5, (low[1] + high[1]) * 0.5, (low[2] + high[2]) * 0.5
+    ex, ey, ez = (high[0] - low[0]) * 0.5, (high[1] - low[1]) * 0.5, (high[2] - low[2]) * 0.5
+    world_low, world_high = [], []
+    for i in range(3):
+        m0, m1, m2, m3 = matrix[i]
+        center = m0 * cx + m1 * cy + m2 * cz + m3
+        extent = abs(m0) * ex + abs(m1) * ey + abs(m2) * ez
+        world_low.append(round(center - extent, DIGITS))
+        world_high.append(round(center + extent, DIGITS))
+    return world_low, world_high
+
+def merge_bounds(bounds):
+    bounds = [b for b in bounds if b is not None]
+    if not bounds:
+        return None
+    return ([min(b[0][i] for b in bounds) for i in range(3)],
+            [max(b[1][i] for b in bounds) for i in range(3)])
+
+def read_mesh_buffers(objects, depsgraph):
+    """The buffers fingerprint_node() collects with `mesh_buffers`, read without hashing."""
+    mesh_buffers = {}
+    for obj in objects:
+        if obj.type != 'MESH':
+            continue
+        evaluated = obj.evaluated_get(depsgraph)
+        mesh = evaluated.to_mesh()
+        try:
+            mesh_buffers[obj.name] = (_read(mesh.vertices, "co", "f", 3),
+                                      _read(mesh.polygons, "loop_total", "i", 1),
+                                      _read(mesh.polygons, "material_index", "i", 1),
+                                      [m.name if m else "" for m in mesh.materials])
+        finally:
+            evaluated.to_mesh_clear()
+    return mesh_buffers
+
+def local_stats(buffers):
+    """Vertex count, triangle count, triangles per material and local bounds of one mesh."""
+    co, loop_total, material_index, names = buffers
+    names = names or [""]
+
+    # a polygon of n corners is n - 2 triangles
+    triangles = defaultdict(int)
+    if len(names) == 1:
+        triangles[names[0]] = sum(loop_total) - 2 * len(loop_total)
+    else:
+        for index, total in zip(material_index, loop_total):
+            triangles[names[min(index, len(names) - 1)]] += total - 2
+
+    return len(co) // 3, sum(triangles.values()), dict(triangles), local_bounds(co)
+
+def mesh_stats(local, matrix):
+    # copies share the materials dict, it is only read from here on
+    vertices, triangle_count, triangles, bounds = local
+    return {
+        "vertices": vertices,
+        "triangles": triangle_count,
+        "materials": triangles,
+        "bounds": world_bounds(bounds, matrix) if bounds else None,
+    }
+
+def batch_groups(objects):
+    """Objects with the same materials packed into groups of at most MAX_BATCH_VERTICES vertices."""
+    by_materials = defaultdict(list)
+    for stats in objects:
+        by_materials[tuple(sorted(stats["materials"]))].append(stats)
+
+    groups = []
+    for materials in sorted(by_materials):
+        bins = []
+        for stats in sorted(by_materials[materials], key=lambda s: (-s["vertices"], s["name"])):
+            for group in bins:
+                if group["vertices"] + stats["vertices"] <= MAX_BATCH_VERTICES:
+                    break
+            else:
+                # a mesh over the limit gets a group of its own
+                group = {"materials": list(materials), "vertices": 0, "objects": []}
+                bins.append(group)
+            group["vertices"] += stats["vertices"]
+            group["objects"].append(stats["name"])
+        groups += bins
+    return groups
+
+def node_batching(node, objects, mesh_buffers, export_path, mesh_digests=None):
+    stats = []
+    # copies of a mesh (same mesh_digest()) share their local stats, only the bounds are per object
+    local = {}
+    mesh_digests = mesh_digests or {}
+    with tracing.span("batching stats", node=node.name, objects=len(objects)):
+        for obj in sorted(objects, key=lambda o: o.name):
+            if obj.name not in mesh_buffers:
+                continue
+            key = mesh_digests.get(obj.name, obj.name)
+            if key not in local:
+                local[key] = local_stats(mesh_buffers[obj.name])
+            entry = mesh_stats(local[key], obj.matrix_world)
+            entry["name"] = obj.name
+            stats.append(entry)
+
+    materials = defaultdict(int)
+    for entry in stats:
+        for name, triangles in entry["materials"].items():
+            materials[name] += triangles
+    return {
+        "version": SIDECAR_VERSION,
+        "space": SPACE,
+        "node": node.name,
+        "fbx": os.path.basename(str(export_path)),
+        "vertices": sum(s["vertices"] for s in stats),
+        "triangles": sum(s["triangles"] for s in stats),
+        "materials": dict(materials),
+        "bounds": merge_bounds(s["bounds"] for s in stats),
+        "objects": stats,
+        "batches": batch_groups(stats),
+    }
+
+def write_batching(node, objects, mesh_buffers, export_path, mesh_digests=None):
+    """Write the sidecar of a static node, returns its path or None for other nodes."""
+    if not node.fbx_export_isStatic:
+        return None
+    path = sidecar_path(export_path)
+    batching = node_batching(node, objects, mesh_buffers, export_path, mesh_digests)
+    with open(path, "w") as file:
+        file.write(json.dumps(batching, separators=(",", ":"), sort_keys=True))
+    return path
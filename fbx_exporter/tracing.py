@@ -0,0 +1,185 @@
+####################################################################################################
+## Timing spans and counters for the export pipelines.
+## Tracing is off unless the EXPORTER_TRACE environment variable names a folder, or start() is
+## called. While off, span() hands out one shared no-op object and count() returns at once.
+## While on, every finished span, counter and event is appended to a rolling JSONL log in that
+## folder (rotated at MAX_LOG_BYTES, one old file kept) and the last MAX_EVENTS of them are kept
+## in memory. write_chrome_trace() dumps those in the Chrome trace format, to be opened in
+## chrome://tracing or ui.perfetto.dev.
+## The FBX and the texture exporter are installed separately, each ships its own copy of this file.
+## tests/test_shared_modules.py fails when the copies differ, edit one and copy it over the other.
+####################################################################################################
+
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import deque
+
+
+TRACE_ENV       = "EXPORTER_TRACE"
+MAX_LOG_BYTES   = 4 * 1024 * 1024
+MAX_EVENTS      = 100000
+
+enabled = False
+
+_name = "export"
+_log_dir = None
+_log_file = None
+_log_size = 0
+_events = deque(maxlen=MAX_EVENTS)
+_totals = {}
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+
+
+# -------------------- SWITCHING
+def start(log_dir, name):
+    global enabled, _name, _log_dir
+    stop()
+    _name = name
+    _log_dir = log_dir
+    enabled = True
+
+def start_from_env(name):
+    # only reads the environment, the log file is created by the first event
+    log_dir = os.environ.get(TRACE_ENV)
+    if log_dir:
+        start(log_dir, name)
+
+def stop():
+    global enabled, _log_file
+    enabled = False
+    with _lock:
+        if _log_file is not None:
+            _log_file.close()
+            _log_file = None
+
+def log_path():
+    return os.path.join(_log_dir or tempfile.gettempdir(), _name + "_trace.jsonl")
+
+
+# -------------------- RECORDING
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        _stack().append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        _stack().pop()
+        if exc_type is not None:
+            self.args["error"] = repr(exc_value)
+        complete(self.name, self.start, seconds, **self.args)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+def span(name, **args):
+    """Time the body of a with block, nested spans show up inside their parent."""
+    if not enabled:
+        return NULL_SPAN
+    return _Span(name, args)
+
+def complete(name, start, seconds, **args):
+    """Record a span that was timed by the caller, from a time.perf_counter() start."""
+    if not enabled:
+        return
+    stack = _stack()
+    _record(
+        {"name": name, "ph": "X", "ts": _micros(start), "dur": seconds * 1e6, "pid": os.getpid(),
+         "tid": threading.get_ident(), "args": args},
+        {"type": "span", "name": name, "ms": round(seconds * 1000, 3), "parent": stack[-1] if stack else None,
+         "depth": len(stack), "args": args},
+    )
+
+def count(name, value=1):
+    """Add to a running total, e.g. bytes written or objects exported."""
+    if not enabled:
+        return
+    with _lock:
+        total = _totals[name] = _totals.get(name, 0) + value
+    _record(
+        {"name": name, "ph": "C", "ts": _micros(time.perf_counter()), "pid": os.getpid(), "args": {name: total}},
+        {"type": "counter", "name": name, "value": value, "total": total},
+    )
+
+def event(name, **args):
+    """Record something that happened at one point in time, e.g. a P4 error."""
+    if not enabled:
+        return
+    _record(
+        {"name": name, "ph": "i", "s": "t", "ts": _micros(time.perf_counter()), "pid": os.getpid(),
+         "tid": threading.get_ident(), "args": args},
+        {"type": "event", "name": name, "args": args},
+    )
+
+
+# -------------------- OUTPUT
+def write_chrome_trace(path=None):
+    """Write the kept events as a Chrome trace, returns the file path."""
+    if path is None:
+        path = os.path.join(_log_dir or tempfile.gettempdir(), "{}_trace_{}.json".format(_name, time.strftime("%Y%m%d_%H%M%S")))
+    with _lock:
+        events = list(_events)
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+    return path
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _micros(perf_time):
+    return (perf_time - _origin) * 1e6
+
+def _record(trace_event, log_entry):
+    log_entry["time"] = time.time()
+    log_entry["pid"] = os.getpid()
+    line = json.dumps(log_entry, default=str) + "\n"
+    with _lock:
+        _events.append(trace_event)
+        try:
+            _write_log(line)
+        except OSError:
+            pass
+
+def _write_log(line):
+    global _log_file, _log_size
+    path = log_path()
+    if _log_file is not None and _log_size > MAX_LOG_BYTES:
+        _log_file.close()
+        _log_file = None
+        os.replace(path, path + ".1")
+    if _log_file is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _log_file = open(path, "a", buffering=1)
+        _log_size = _log_file.tell()
+    _log_file.write(line)
+    _log_size += len(line)
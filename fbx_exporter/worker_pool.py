@@ -0,0 +1,168 @@
+####################################################################################################
+## Pool of background exporter processes.
+## Every worker is started with the same command line and speaks a line based JSON protocol:
+##    stdin  - one job per line  {"node": ..., "path": ...}, stdin is closed when no jobs are left
+##    stdout - one result per job, prefixed with RESULT_PREFIX
+##             {"node": ..., "path": ..., "status": ..., "seconds": ...}, plus the fields of the
+##             dict the export job returned, if any
+## Anything else printed by the worker is kept in its log. Jobs are handed out one at a time, so a
+## worker that finishes early picks up the next node. Nothing here depends on bpy, the command can
+## be `blender --background` or any stand-in executable that speaks the same protocol.
+####################################################################################################
+
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+
+
+RESULT_PREFIX = "FBX_EXPORT_RESULT "
+
+
+class ExportWorkerPool:
+    def __init__(self, command, jobs, workers=2):
+        self.command = list(command)
+        self.jobs = list(jobs)
+        self.workers = min(max(1, workers), len(self.jobs))
+
+        self.pending = queue.Queue()
+        for job in self.jobs:
+            self.pending.put(job)
+
+        self.results = []
+        self.logs = []
+        self.processes = []
+        self.threads = []
+        self.cancelled = False
+        self.alive = 0
+        self.lock = threading.Lock()
+
+    @property
+    def total(self):
+        return len(self.jobs)
+
+    @property
+    def done(self):
+        with self.lock:
+            return len(self.results)
+
+    @property
+    def finished(self):
+        return all(not t.is_alive() for t in self.threads)
+
+    def start(self):
+        self.alive = self.workers
+        for _ in range(self.workers):
+            process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+                bufsize=1,
+            )
+            log = []
+            thread = threading.Thread(target=self._drive, args=(process, log), daemon=True)
+            self.processes.append(process)
+            self.logs.append(log)
+            self.threads.append(thread)
+            thread.start()
+
+    def cancel(self):
+        self.cancelled = True
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+
+    def wait(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+        return self.results
+
+    def _next_job(self):
+        if self.cancelled:
+            return None
+        try:
+            return self.pending.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _add_result(self, job, status, seconds=0.0):
+        with self.lock:
+            self.results.append({"node": job["node"], "path": job["path"], "status": status, "seconds": seconds})
+
+    def _drive(self, process, log):
+        job = self._next_job()
+        try:
+            while job is not None:
+                process.stdin.write(json.dumps(job) + "\n")
+                process.stdin.flush()
+
+                result = None
+                for line in process.stdout:
+                    if line.startswith(RESULT_PREFIX):
+                        result = json.loads(line[len(RESULT_PREFIX):])
+                        break
+                    log.append(line.rstrip("\n"))
+
+                if result is None:
+                    status = "cancelled" if self.cancelled else "failed: worker exited"
+                    self._add_result(job, status)
+                    job = None
+                    break
+
+                with self.lock:
+                    self.results.append(result)
+                job = self._next_job()
+
+            process.stdin.close()
+            for line in process.stdout:
+                log.append(line.rstrip("\n"))
+        except (OSError, ValueError) as e:
+            if job is not None:
+                self._add_result(job, "cancelled" if self.cancelled else "failed: " + str(e))
+        finally:
+            # a worker still reading its stdin would never exit
+            _close(process.stdin)
+            process.wait()
+            _close(process.stdout)
+            with self.lock:
+                self.alive -= 1
+                last_worker = self.alive == 0
+
+        # jobs nobody picked up because of a cancel or because every worker died
+        if last_worker:
+            while True:
+                try:
+                    job = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                self._add_result(job, "cancelled" if self.cancelled else "failed: worker exited")
+
+
+def _close(stream):
+    try:
+        stream.close()
+    except OSError:
+        # broken pipe of a worker that died with input left
+        pass
+
+def run_worker(export_job):
+    """Worker side of the protocol: read jobs from stdin and print one result line per job."""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        start = time.perf_counter()
+        extra = None
+        try:
+            extra = export_job(job["node"], job["path"])
+            status = "exported"
+        except Exception as e:
+            status = "failed: " + str(e)
+        result = dict(extra or {})
+        result.update({"node": job["node"], "path": job["path"], "status": status, "seconds": time.perf_counter() - start})
+        sys.stdout.write(RESULT_PREFIX + json.dumps(result) + "\n")
+        sys.stdout.flush()
@@ -1 +1,7 @@
-from .texture_exporter import *
\ No newline at end of file
+try:
+    import krita
+except ImportError:
+    # outside Krita only the headless modules are used (python -m texture_exporter.kra_export)
+    pass
+else:
+    from .texture_exporter import *
@@ -0,0 +1,98 @@
+####################################################################################################
+## Export All: every texture of every open document, or of every .kra file in a folder.
+## Headless use on build machines:
+##    kritarunner -s texture_exporter.batch_export [--sizes=2048,1024,512] [--rle] <export dir> <file.kra | folder> ...
+## Without Krita, kra_export.py exports .kra files with the same export_document().
+####################################################################################################
+
+import os
+from collections import namedtuple
+
+from .document_export import can_pack_directly, detect_outputs, document_name, export_outputs, output_paths
+from .layer_roles import TEXTURE_ROLES, RoleIndex
+from .resolution_chain import parse_sizes
+from . import tracing
+
+
+ExportResult = namedtuple("ExportResult", ["document", "output", "path", "status"])
+
+
+def export_document(doc, export_dir, cache=None, sizes=(), rle=False):
+    with tracing.span("export document", document=document_name(doc)):
+        return _export_document(doc, export_dir, cache, sizes, rle)
+
+def _export_document(doc, export_dir, cache, sizes, rle):
+    name = document_name(doc)
+    if not can_pack_directly(doc):
+        return [ExportResult(name, "", "", "skipped: only 8 bit RGBA documents can be batch exported")]
+
+    # one walk over the layers per export, they may have changed since the last one
+    index = RoleIndex(doc)
+    problems = index.problems(TEXTURE_ROLES)
+    if problems:
+        return [ExportResult(name, "", "", "skipped: " + "; ".join(problems))]
+
+    outputs = detect_outputs(doc, index)
+    if not outputs:
+        return [ExportResult(name, "", "", "skipped: no texture groups")]
+
+    outputs_with_paths = output_paths(doc, export_dir, outputs)
+    try:
+        statuses = export_outputs(doc, outputs_with_paths, cache, sizes, rle)
+    except Exception as e:
+        statuses = {path: "failed: " + str(e) for _, path in outputs_with_paths}
+    return [ExportResult(name, output.name, path, statuses[path]) for output, path in outputs_with_paths]
+
+def export_documents(docs, export_dir, cache=None, sizes=(), rle=False):
+    results = []
+    for doc in docs:
+        results += export_document(doc, export_dir, cache, sizes, rle)
+    return results
+
+def find_kra_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(".kra"))
+        else:
+            files.append(path)
+    return files
+
+def export_files(paths, export_dir, sizes=(), rle=False):
+    from krita import Krita
+
+    app = Krita.instance()
+    results = []
+    for path in find_kra_files(paths):
+        with tracing.span("open document", path=path):
+            doc = app.openDocument(path)
+        if doc is None:
+            results.append(ExportResult(os.path.basename(path), "", "", "failed: could not open"))
+            continue
+        try:
+            doc.waitForDone()
+            results += export_document(doc, export_dir, sizes=sizes, rle=rle)
+        finally:
+            doc.close()
+    return results
+
+def format_summary(results):
+    lines = []
+    for r in results:
+        lines.append("{:<32} {:<12} {:<10} {}".format(r.document, r.output, r.status, r.path))
+    exported = sum(1 for r in results if r.status == "exported" or r.status.startswith("updated"))
+    unchanged = sum(1 for r in results if r.status == "unchanged")
+    lines.append("{} textures exported, {} unchanged".format(exported, unchanged))
+    return "\n".join(lines)
+
+def __main__(args):
+    sizes = [parse_sizes(a[len("--sizes="):]) for a in args if a.startswith("--sizes=")]
+    rle = "--rle" in args
+    args = [a for a in args if not a.startswith("--sizes=") and a != "--rle"]
+    if len(args) < 2:
+        print("usage: kritarunner -s texture_exporter.batch_export [--sizes=2048,1024,512] [--rle] <export dir> <file.kra | folder> ...")
+        return 1
+
+    results = export_files(args[1:], args[0], sizes[-1] if sizes else (), rle)
+    print(format_summary(results))
+    return 1 if any(r.status.startswith("failed") for r in results) else 0
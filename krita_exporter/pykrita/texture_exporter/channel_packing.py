@@ -0,0 +1,82 @@
+####################################################################################################
+## Channel packing without a temporary document.
+## Krita returns 8 bit RGBA pixel data in BGRA order, the same order TGA stores its pixels. Each
+## output channel is copied from one channel of one source group with a strided slice assignment
+## into a single preallocated buffer, so the copy runs in C without a per-pixel Python loop.
+## Large images are packed tile by tile (bands of full rows), so memory use depends on the tile size
+## and not on the image size.
+## Nothing in here depends on Krita.
+####################################################################################################
+
+# channel offsets inside BGRA pixel data
+BLUE    = 0
+GREEN   = 1
+RED     = 2
+ALPHA   = 3
+
+# output channels in R, G, B(, A) order: (layer dict key, channel read from that group)
+# alpha comes from a greyscale group, its red channel carries the value
+MASK_LAYOUT             = (("red", RED), ("green", GREEN), ("blue", BLUE), ("alpha", RED))
+DETAIL_MASK_LAYOUT      = (("red", RED), ("green", GREEN), ("blue", BLUE))
+DIFFUSE_LAYOUT          = (("diffuse", RED), ("diffuse", GREEN), ("diffuse", BLUE), ("alpha", RED))
+DIFFUSE_OPAQUE_LAYOUT   = (("diffuse", RED), ("diffuse", GREEN), ("diffuse", BLUE))
+# a flattened document written without its alpha
+IMAGE_OPAQUE_LAYOUT     = (("image", RED), ("image", GREEN), ("image", BLUE))
+
+# BGRA offset of each output channel, indexed by position in the layout
+OUTPUT_OFFSETS      = (RED, GREEN, BLUE, ALPHA)
+
+# value used when the group feeding a channel does not exist
+MISSING_COLOR       = 0
+MISSING_ALPHA       = 255
+
+# bytes read from one source group per tile, tiles are full rows so they can be streamed as scanlines
+TILE_BYTES          = 4 * 1024 * 1024
+
+
+def pack_channels(pixel_count, layout, sources, packed=None, keys=None):
+    """Pack the channels named by `layout` into one BGR or BGRA buffer.
+
+    `sources` maps the layer dict keys used in `layout` to BGRA pixel data of `pixel_count` pixels.
+    When an already packed buffer is passed in, only the channels fed by `keys` are repacked.
+    """
+    stride = 4 if len(layout) == 4 else 3
+    if packed is None:
+        packed = bytearray(pixel_count * stride)
+
+    for position, (key, channel) in enumerate(layout):
+        if keys is not None and key not in keys:
+            continue
+        offset = OUTPUT_OFFSETS[position]
+        pixels = sources.get(key)
+        if pixels is None:
+            value = MISSING_ALPHA if offset == ALPHA else MISSING_COLOR
+            if value:
+                packed[offset::stride] = bytes((value,)) * pixel_count
+            continue
+
+        if len(pixels) != pixel_count * 4:
+            raise ValueError("'{}' has {} bytes of pixel data, expected {}".format(key, len(pixels), pixel_count * 4))
+        packed[offset::stride] = pixels[channel::4]
+
+    return packed
+
+
+def tile_rows(width, tile_bytes=TILE_BYTES):
+    return max(1, tile_bytes // (width * 4))
+
+def pack_tiles(width, height, layout, read_rect, rows=None):
+    """Yield the packed image as bands of full rows, top to bottom.
+
+    `read_rect(key, x, y, w, h)` returns BGRA pixel data of that rectangle of the group stored
+    under `key`, or None when the group does not exist.
+    """
+    rows = rows or tile_rows(width)
+    for y in range(0, height, rows):
+        band = min(rows, height - y)
+        sources = {}
+        for key, _ in layout:
+            pixels = read_rect(key, 0, y, width, band)
+            if pixels is not None:
+                sources[key] = pixels
+        yield pack_channels(width * band, layout, sources)
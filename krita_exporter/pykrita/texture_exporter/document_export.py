@@ -0,0 +1,291 @@
+####################################################################################################
+## Direct (no temp document) export of every texture a document can produce.
+## The role groups a document contains decide its outputs: Diffuse, Mask and Detail Mask. All
+## outputs are written in one pass over the image. For every band of rows each group is read once,
+## even when it feeds several outputs (_SMOOTHNESS feeds Mask alpha and Detail Mask green).
+## With a TextureExportCache, unchanged outputs are skipped and changed ones patched in place.
+## With resolution chain sizes, every output also gets smaller versions (see resolution_chain.py)
+## built from the same packed bands.
+## RLE compressed outputs cannot be patched. When the cache has one they are written to a temp file
+## and only replace the old file when a band changed. Any other output written over an existing file
+## goes through a temp file too, and is dropped when it has the same bytes as the old file.
+## write_document() writes a whole flattened document, for the temp document exports.
+## Every output and level written is recorded in the export manifest (see export_manifest.py).
+####################################################################################################
+
+import os
+from collections import namedtuple
+
+from .layer_roles import create_mask_layer_dict, create_detail_mask_layer_dict, create_diffuse_layer_dict, RoleIndex
+from .layer_roles import MASK_RED, MASK_GREEN, MASK_BLUE, LAYER_MASK_RED, LAYER_MASK_BLUE, LAYER_DIFFUSE, LAYER_DIFFUSE_ALPHA
+from .channel_packing import MASK_LAYOUT, DETAIL_MASK_LAYOUT, DIFFUSE_LAYOUT, DIFFUSE_OPAQUE_LAYOUT, IMAGE_OPAQUE_LAYOUT
+from .channel_packing import pack_channels, tile_rows
+from .tga import TgaWriter, TgaPatcher
+from .export_cache import band_digest, node_meta, replace_if_changed
+from .export_manifest import manifest_for
+from .resolution_chain import ResolutionChain, band_rows_multiple, chain_levels, level_path, levels_exist, srgb_offsets
+from . import tracing
+
+
+TextureOutput = namedtuple("TextureOutput", ["name", "suffix", "layout", "layerDict", "hide"])
+
+SRGB_PROFILE    = "sRGB-elle-V2-srgbtrc.icc"
+
+
+class DocumentProjection:
+    """Reads the flattened document the same way a group node is read."""
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    def projectionPixelData(self, x, y, w, h):
+        return self.doc.pixelData(x, y, w, h)
+
+
+def source_key(node):
+    # every topLevelNodes() call returns new wrappers, so compare the Krita node ids
+    if isinstance(node, DocumentProjection):
+        return "projection"
+    return node.uniqueId().toString()
+
+def can_pack_directly(doc):
+    # groups are read as 8 bit BGRA, other color spaces go through the temp document
+    return doc.colorModel() == "RGBA" and doc.colorDepth() == "U8"
+
+def convert_to_8_bit(doc):
+    """Start converting a document to 8 bit sRGB RGBA, the only pixel data write_document reads."""
+    if not can_pack_directly(doc):
+        doc.setColorSpace("RGBA", "U8", SRGB_PROFILE)
+
+def write_document(doc, path, alpha, rle=False, digests=None):
+    """Write the flattened image of an 8 bit RGBA document, with or without its alpha.
+
+    Returns False when the file already held exactly these bytes and was left alone. With a
+    `digests` dict, the hash of the file is stored in it by path.
+    """
+    width = doc.width()
+    height = doc.height()
+    rows = tile_rows(width)
+    temp_path = path + ".tmp"
+    try:
+        with TgaWriter(temp_path, width, height, alpha, rle) as writer:
+            for y in range(0, height, rows):
+                band = min(rows, height - y)
+                pixels = bytes(doc.pixelData(0, y, width, band))
+                writer.write(pixels if alpha else pack_channels(width * band, IMAGE_OPAQUE_LAYOUT, {"image": pixels}))
+    except Exception:
+        os.remove(temp_path)
+        raise
+    if digests is not None:
+        digests[path] = writer.digest()
+    return replace_if_changed(temp_path, path)
+
+def diffuse_output(doc, index=None):
+    layerDict = create_diffuse_layer_dict(doc, index)
+    # the diffuse is the flattened image minus the _ALPHA group, like the temp document export, so
+    # paint outside the _DIFFUSE group is kept
+    layerDict["diffuse"] = DocumentProjection(doc)
+    hide = tuple(node for key, node in layerDict.items() if key == "alpha")
+    layout = DIFFUSE_LAYOUT if "alpha" in layerDict else DIFFUSE_OPAQUE_LAYOUT
+    return TextureOutput("Diffuse", "_diffuse", layout, layerDict, hide)
+
+def mask_output(doc, index=None):
+    return TextureOutput("Mask", "_mask", MASK_LAYOUT, create_mask_layer_dict(doc, index), ())
+
+def detail_mask_output(doc, index=None):
+    return TextureOutput("Detail Mask", "_detail_mask", DETAIL_MASK_LAYOUT, create_detail_mask_layer_dict(doc, index), ())
+
+def detect_outputs(doc, index=None):
+    index = index or RoleIndex(doc)
+    outputs = []
+
+    if index.has(LAYER_DIFFUSE) or index.has(LAYER_DIFFUSE_ALPHA):
+        outputs.append(diffuse_output(doc, index))
+
+    # _SMOOTHNESS alone is ambiguous, the other groups tell Mask and Detail Mask apart
+    if index.has(MASK_RED) or index.has(MASK_GREEN) or index.has(MASK_BLUE):
+        outputs.append(mask_output(doc, index))
+
+    if index.has(LAYER_MASK_RED) or index.has(LAYER_MASK_BLUE):
+        outputs.append(detail_mask_output(doc, index))
+
+    return outputs
+
+def document_name(doc):
+    return os.path.splitext(os.path.basename(str(doc.fileName())))[0].strip()
+
+def output_paths(doc, export_dir, outputs):
+    """Pair every output with its file, a suffix is only added when a document has several outputs."""
+    name = document_name(doc)
+    if len(outputs) == 1:
+        return [(outputs[0], os.path.join(export_dir, name + ".tga"))]
+    return [(output, os.path.join(export_dir, name + output.suffix + ".tga")) for output in outputs]
+
+def output_sources(output):
+    return {key: source_key(node) for key, node in output.layerDict.items()
+            if node is not None and any(key == k for k, _ in output.layout)}
+
+def export_outputs(doc, outputs_with_paths, cache=None, sizes=(), rle=False):
+    """Write every output, returns a status per path.
+
+    With a cache, outputs that are still as we left them are patched in place and only where the
+    groups feeding them changed. `sizes` lists the smaller versions to write next to each output.
+    """
+    with tracing.span("export outputs", document=document_name(doc), outputs=len(outputs_with_paths)):
+        digests = {}
+        statuses = _export_outputs(doc, outputs_with_paths, cache, sizes, rle, digests)
+    if tracing.enabled:
+        for path, status in statuses.items():
+            if status != "unchanged":
+                tracing.count("textures exported")
+                tracing.count("bytes written", os.path.getsize(path))
+
+    width, height = doc.width(), doc.height()
+    written = []
+    for output, path in outputs_with_paths:
+        written.append((path, {"output": output.name, "rle": rle, "size": max(width, height)}))
+        for _, _, _, size in chain_levels(width, height, sizes):
+            written.append((level_path(path, size), {"output": output.name, "rle": False, "size": size}))
+    record_manifest(str(doc.fileName()), document_name(doc), written, doc.modified(), digests)
+    return statuses
+
+def record_manifest(source, name, written, unsaved=False, digests=None):
+    """Add the (path, settings) pairs written from one document to the export manifest.
+
+    `digests` holds the hashes of the files TgaWriter wrote, the others are read to hash them.
+    """
+    digests = digests or {}
+    manifests = {}
+    with tracing.span("record manifest", document=name, outputs=len(written)):
+        for path, settings in written:
+            manifest = manifest_for(path)
+            manifest.record(path, source, name, "krita", settings, unsaved, digests.get(path))
+            manifests[manifest.path] = manifest
+        for manifest in manifests.values():
+            manifest.save()
+
+def _export_outputs(doc, outputs_with_paths, cache, sizes, rle, digests):
+    width = doc.width()
+    height = doc.height()
+    multiple = band_rows_multiple(width, height, sizes)
+    rows = max(multiple, tile_rows(width) // multiple * multiple)
+    entry = cache.document(str(doc.fileName()), (width, height, rows)) if cache is not None else None
+
+    hidden = [node for output, _ in outputs_with_paths for node in output.hide]
+    with tracing.span("hide layers", layers=len(hidden)):
+        for node in hidden:
+            node.setVisible(False)
+        doc.refreshProjection()
+        doc.waitForDone()
+
+    targets = []
+    new_bands = {}
+    finished = False
+    try:
+        for output, path in outputs_with_paths:
+            sources = output_sources(output)
+            stride = 4 if len(output.layout) == 4 else 3
+            srgb = srgb_offsets(output.layout)
+            current = (entry is not None and entry.output_is_current(path, output.layout, sources, rle)
+                       and levels_exist(path, width, height, stride, sizes))
+            if current and not rle:
+                targets.append([output, path, sources, TgaPatcher(path, width, stride), set(),
+                                ResolutionChain(path, width, height, stride, srgb, sizes, patch=True)])
+            elif current:
+                targets.append([output, path, sources, TgaWriter(path + ".tmp", width, height, stride == 4, rle), set(),
+                                ResolutionChain(path, width, height, stride, srgb, sizes, patch=True)])
+            else:
+                # a new file too, an interrupted export must not leave a half written texture behind
+                targets.append([output, path, sources, TgaWriter(path + ".tmp", width, height, stride == 4, rle), None,
+                                ResolutionChain(path, width, height, stride, srgb, sizes)])
+
+        for index, y in enumerate(range(0, height, rows)):
+            band = min(rows, height - y)
+            pixels = {}
+            with tracing.span("read band", y=y, rows=band):
+                for output, _, sources, _, _, _ in targets:
+                    for key, source in sources.items():
+                        if source in pixels:
+                            continue
+                        node = output.layerDict[key]
+                        pixels[source] = bytes(node.projectionPixelData(0, y, width, band))
+                        if entry is not None:
+                            new_bands.setdefault(source, []).append(band_digest(pixels[source], node_meta(node)))
+
+            with tracing.span("pack and write band", y=y, rows=band):
+                for output, path, sources, target, patched, chain in targets:
+                    band_sources = {key: pixels[source] for key, source in sources.items()}
+                    if patched is None:
+                        packed = pack_channels(width * band, output.layout, band_sources)
+                        target.write(packed)
+                        chain.submit(y, packed, band)
+                        continue
+                    keys = {key for key, source in sources.items()
+                            if not entry.band_matches(path, source, index, new_bands[source][index])}
+                    if isinstance(target, TgaWriter):
+                        packed = pack_channels(width * band, output.layout, band_sources)
+                        target.write(packed)
+                    elif keys:
+                        packed = target.read(y, band)
+                        pack_channels(width * band, output.layout, band_sources, packed, keys)
+                        target.write(y, packed)
+                    if keys:
+                        chain.submit(y, packed, band)
+                        patched.update(keys)
+        finished = True
+    finally:
+        for target in targets:
+            target[3].close()
+        # the levels of the last bands may still be on the thread pool
+        levels_written = False
+        try:
+            with tracing.span("wait for levels"):
+                for target in targets:
+                    target[5].close()
+            levels_written = True
+        finally:
+            # like the full size output, a level is only replaced when its bytes changed
+            for target in targets:
+                chain = target[5]
+                for written, level in zip(chain.written, chain.paths):
+                    if written == level:
+                        continue
+                    if finished and levels_written:
+                        replace_if_changed(written, level)
+                    elif os.path.isfile(written):
+                        os.remove(written)
+        for node in hidden:
+            node.setVisible(True)
+        if hidden:
+            doc.refreshProjection()
+
+        # an RLE output only replaces the old file when one of its bands changed, a whole new file
+        # when its bytes changed
+        identical = set()
+        for _, path, _, target, patched, _ in targets:
+            if not isinstance(target, TgaWriter):
+                continue
+            if not finished or patched is not None and not patched:
+                os.remove(target.path)
+                continue
+            elif patched is not None:
+                os.replace(target.path, path)
+            elif not replace_if_changed(target.path, path):
+                identical.add(path)
+            digests[path] = target.digest()
+
+    statuses = {}
+    for output, path, sources, _, patched, _ in targets:
+        if path in identical:
+            statuses[path] = "unchanged"
+        elif patched is None:
+            statuses[path] = "exported"
+        elif patched:
+            statuses[path] = "updated " + ", ".join(sorted(patched))
+        else:
+            statuses[path] = "unchanged"
+        if entry is not None and (statuses[path] != "unchanged" or path in identical):
+            entry.record_output(path, output.layout, sources, {source: new_bands.get(source, []) for source in sources.values()}, rle,
+                                digests.get(path))
+
+    return statuses
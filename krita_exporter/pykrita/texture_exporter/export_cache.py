@@ -0,0 +1,123 @@
+####################################################################################################
+## Dirty tracking for texture exports.
+## For every TGA written from a document the cache keeps its size, mtime and hash, and a hash per
+## band of rows of every group that fed it, mixed with the group's blend mode, opacity and
+## visibility. On the next export an output whose file is still the one we wrote is patched in
+## place: only bands whose source groups changed are rewritten, and only the channels fed by those
+## groups. An output with no changed band is not touched at all.
+## Documents are evicted least recently used first once the cache holds MAX_DOCUMENTS of them.
+## Outputs written whole over an existing file go to a temp file first, replace_if_changed() keeps
+## the old file (and its mtime, so Unity does not import it again) when the bytes are the same.
+####################################################################################################
+
+import os
+import mmap
+import hashlib
+from collections import OrderedDict
+
+
+MAX_DOCUMENTS   = 16
+HASH_CHUNK      = 1024 * 1024
+
+
+def band_digest(pixels, meta):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(meta.encode("utf-8"))
+    h.update(pixels)
+    return h.digest()
+
+def node_meta(node):
+    if not hasattr(node, "blendingMode"):
+        return ""
+    return "{}|{}|{}".format(node.blendingMode(), node.opacity(), node.visible())
+
+def file_digest(path):
+    # the same hash as TgaWriter.digest() and the export manifest
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def same_contents(path, other):
+    """Compare two files chunk by chunk through mmap, stops at the first difference."""
+    if os.path.getsize(path) != os.path.getsize(other):
+        return False
+    if os.path.getsize(path) == 0:
+        return True
+    with open(path, "rb") as a, open(other, "rb") as b:
+        with mmap.mmap(a.fileno(), 0, access=mmap.ACCESS_READ) as ma, mmap.mmap(b.fileno(), 0, access=mmap.ACCESS_READ) as mb:
+            for offset in range(0, len(ma), HASH_CHUNK):
+                if ma[offset:offset + HASH_CHUNK] != mb[offset:offset + HASH_CHUNK]:
+                    return False
+    return True
+
+def replace_if_changed(temp_path, path):
+    """Move a freshly written file over `path` unless both hold the same bytes, True if replaced."""
+    if os.path.isfile(path) and same_contents(temp_path, path):
+        os.remove(temp_path)
+        return False
+    os.replace(temp_path, path)
+    return True
+
+
+class DocumentCache:
+    def __init__(self):
+        self.geometry = None
+        self.outputs = {}
+
+    def reset(self, geometry):
+        self.geometry = geometry
+        self.outputs = {}
+
+    def band_matches(self, path, source, index, digest):
+        bands = self.outputs[path]["bands"].get(source)
+        return bands is not None and index < len(bands) and bands[index] == digest
+
+    def output_is_current(self, path, layout, sources, rle=False):
+        record = self.outputs.get(path)
+        if record is None or record["layout"] != layout or record["sources"] != sources or record["rle"] != rle:
+            return False
+        if not os.path.isfile(path):
+            return False
+
+        stat = os.stat(path)
+        if stat.st_size != record["size"]:
+            return False
+        if stat.st_mtime == record["mtime"]:
+            return True
+        # touched but maybe not changed (p4 sync, copy back)
+        return file_digest(path) == record["hash"]
+
+    def record_output(self, path, layout, sources, bands, rle=False, digest=None):
+        stat = os.stat(path)
+        self.outputs[path] = {
+            "layout": layout,
+            "sources": sources,
+            "rle": rle,
+            "bands": bands,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "hash": digest or file_digest(path),
+        }
+
+
+class TextureExportCache:
+    def __init__(self, max_documents=MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self.documents = OrderedDict()
+
+    def document(self, key, geometry):
+        entry = self.documents.pop(key, None)
+        if entry is None:
+            entry = DocumentCache()
+        if entry.geometry != geometry:
+            entry.reset(geometry)
+        self.documents[key] = entry
+
+        while len(self.documents) > self.max_documents:
+            self.documents.popitem(last=False)
+        return entry
+
+    def forget(self, key):
+        self.documents.pop(key, None)
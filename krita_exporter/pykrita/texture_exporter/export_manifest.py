@@ -0,0 +1,353 @@
+####################################################################################################
+## Depot-wide manifest of exported files: which .blend export node or .kra document wrote which
+## .fbx/.tga, with which settings, and from which state of the source.
+## Both exporters append one record per output to .export_manifest.jsonl at the root of the Unity
+## project the output is in (the folder holding Assets), or to the file EXPORT_MANIFEST names.
+## Records are single compact JSON lines with paths relative to the manifest, appended in one
+## write, so exporters running side by side can share the file. The latest record of an output
+## wins. compact() rewrites the file with only those. Appending and compacting hold a lock file
+## next to the manifest, so no record is appended to a file compact() is replacing.
+## A Manifest indexes the records by output and by source. refresh() only reads the lines appended
+## since the last call, and hashes are only computed again for files whose size or mtime changed.
+## The same file works without Blender or Krita to list outputs whose source changed:
+##    python export_manifest.py stale <unity project | manifest>
+##    python export_manifest.py outputs <unity project | manifest> <source file>
+##    python export_manifest.py source <unity project | manifest> <output file>
+##    python export_manifest.py compact <unity project | manifest>
+## A source saved again without changes has other bytes, its outputs are listed as stale too.
+## The FBX and the texture exporter are installed separately, each ships its own copy of this file.
+## tests/test_shared_modules.py fails when the copies differ, edit one and copy it over the other.
+####################################################################################################
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+MANIFEST_ENV    = "EXPORT_MANIFEST"
+MANIFEST_FILE   = ".export_manifest.jsonl"
+PROJECT_FOLDER  = "Assets"
+HASH_CHUNK      = 1024 * 1024
+LOCK_TIMEOUT    = 10.0
+LOCK_POLL       = 0.01
+
+
+def file_digest(path):
+    # sha256 runs on the SHA extensions of current CPUs, several times faster than blake2b
+    h = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def find_manifest(output_path):
+    """The manifest an output is recorded in: EXPORT_MANIFEST, else the one of its Unity project."""
+    if os.environ.get(MANIFEST_ENV):
+        return os.path.abspath(os.environ[MANIFEST_ENV])
+    directory = os.path.dirname(os.path.abspath(output_path))
+    folder = directory
+    while True:
+        parent = os.path.dirname(folder)
+        if os.path.basename(folder) == PROJECT_FOLDER:
+            return os.path.join(parent, MANIFEST_FILE)
+        if parent == folder:
+            return os.path.join(directory, MANIFEST_FILE)
+        folder = parent
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.root = os.path.dirname(self.path)
+        self.by_output = {}
+        self.by_source = defaultdict(set)
+        self.pending = []
+        self.offset = 0
+        self.identity = None
+
+    # -------------------- PATHS
+    def relative(self, path):
+        if not path:
+            return None
+        path = os.path.abspath(path)
+        try:
+            path = os.path.relpath(path, self.root)
+        except ValueError:
+            # another drive
+            pass
+        return path.replace(os.sep, "/")
+
+    def absolute(self, relative):
+        return os.path.normpath(os.path.join(self.root, relative))
+
+    # -------------------- READING
+    def refresh(self):
+        """Read the records appended since the last call, everything again after a compaction."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return self
+        identity = (stat.st_dev, stat.st_ino)
+        if identity != self.identity or stat.st_size < self.offset:
+            self.by_output.clear()
+            self.by_source.clear()
+            self.offset = 0
+            self.identity = identity
+        if stat.st_size == self.offset:
+            return self
+
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read()
+        # a line still being written is read next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                self._add(json.loads(line))
+            except ValueError:
+                continue
+        self.offset += end
+        return self
+
+    def _add(self, record):
+        previous = self.by_output.get(record["output"])
+        if previous is not None and previous["source"] != record["source"]:
+            self.by_source[previous["source"]].discard(record["output"])
+        self.by_output[record["output"]] = record
+        self.by_source[record["source"]].add(record["output"])
+
+    def records(self):
+        return [self.by_output[output] for output in sorted(self.by_output)]
+
+    def source_of(self, output):
+        """The latest record of an output file, or None."""
+        return self.by_output.get(self.relative(output))
+
+    def outputs_of(self, source):
+        """The latest records of every output written from a source file."""
+        return [self.by_output[output] for output in sorted(self.by_source.get(self.relative(source), ()))]
+
+    # -------------------- WRITING
+    @contextmanager
+    def _locked(self):
+        lock_path = self.path + ".lock"
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                if time.monotonic() < deadline:
+                    time.sleep(LOCK_POLL)
+                    continue
+                # the lock is only held for one write or compaction, a lock this old was left behind
+                # by an exporter that died
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+                deadline = time.monotonic() + LOCK_TIMEOUT
+        try:
+            yield
+        finally:
+            os.close(lock)
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    def _digest(self, path, stamp, records):
+        # a file with the stamp it had when it was recorded still has the recorded hash
+        for record, key in records:
+            if record is not None and record[key + "_stamp"] == stamp and record[key + "_hash"] is not None:
+                return record[key + "_hash"]
+        return file_digest(path)
+
+    def record(self, output, source, node, tool, settings, unsaved=False, output_hash=None):
+        """Queue a record for an output just written, save() appends the queued ones.
+
+        `output_hash` is the file_digest() of the output when the caller already has it.
+        """
+        output_stamp = file_stamp(output)
+        if output_stamp is None:
+            return None
+        relative_output = self.relative(output)
+        relative_source = self.relative(source)
+        source_stamp = file_stamp(source) if source and not unsaved else None
+
+        if output_hash is None:
+            previous = self.by_output.get(relative_output)
+            known = [(previous, "output")] if previous is not None else []
+            output_hash = self._digest(output, output_stamp, known)
+
+        source_hash = None
+        if source_stamp is not None:
+            siblings = self.by_source.get(relative_source, ())
+            known = [(self.by_output[o], "source") for o in siblings]
+            known += [(r, "source") for r in self.pending if r["source"] == relative_source]
+            source_hash = self._digest(source, source_stamp, known)
+
+        record = {
+            "output": relative_output,
+            "output_hash": output_hash,
+            "output_stamp": output_stamp,
+            "source": relative_source,
+            "source_hash": source_hash,
+            "source_stamp": source_stamp,
+            "node": node,
+            "tool": tool,
+            "settings": settings,
+            "time": int(time.time()),
+        }
+        self.pending.append(record)
+        return record
+
+    def save(self):
+        if not self.pending:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        data = b"".join(json.dumps(record, separators=(",", ":"), sort_keys=True).encode("utf-8") + b"\n"
+                        for record in self.pending)
+        with self._locked(), open(self.path, "ab") as file:
+            file.write(data)
+        self.pending = []
+        self.refresh()
+
+    def compact(self):
+        """Rewrite the file with the latest record of every output, returns the lines dropped."""
+        if not os.path.isfile(self.path):
+            return 0
+        # nothing is appended until the new file is in place
+        with self._locked():
+            self.refresh()
+            with open(self.path, "rb") as file:
+                lines = sum(1 for _ in file)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb") as file:
+                for record in self.records():
+                    file.write(json.dumps(record, separators=(",", ":"), sort_keys=True).encode("utf-8") + b"\n")
+            os.replace(temp_path, self.path)
+        self.identity = None
+        self.refresh()
+        return lines - len(self.by_output)
+
+    # -------------------- STALE OUTPUTS
+    def _changed(self, path, stamp, digest, current=None):
+        """None for a missing file, else whether it differs from the recorded stamp and hash."""
+        if current is None:
+            current = {}
+        if path not in current:
+            current[path] = [file_stamp(path), None]
+        state = current[path]
+        if state[0] is None:
+            return None
+        if state[0] == stamp:
+            return False
+        if state[1] is None:
+            state[1] = file_digest(path)
+        return state[1] != digest
+
+    def stale(self):
+        """(record, reason) of every output that no longer matches its source or its own record."""
+        self.refresh()
+        # sources feed several outputs, each is hashed once
+        sources = {}
+        stale = []
+        for record in self.records():
+            if record["source"] is None or record["source_hash"] is None:
+                stale.append((record, "exported from unsaved changes"))
+                continue
+            source_changed = self._changed(self.absolute(record["source"]), record["source_stamp"], record["source_hash"], sources)
+            output_changed = self._changed(self.absolute(record["output"]), record["output_stamp"], record["output_hash"])
+            if output_changed is None:
+                stale.append((record, "output missing"))
+            elif source_changed is None:
+                stale.append((record, "source missing"))
+            elif source_changed:
+                stale.append((record, "source changed"))
+            elif output_changed:
+                stale.append((record, "output changed"))
+        return stale
+
+
+_manifests = {}
+
+def open_manifest(path):
+    """One Manifest per file and process, brought up to date on every call."""
+    path = os.path.abspath(path)
+    if path not in _manifests:
+        _manifests[path] = Manifest(path)
+    return _manifests[path].refresh()
+
+def manifest_for(output_path):
+    return open_manifest(find_manifest(output_path))
+
+
+# -------------------- CLI
+def _manifest_argument(path):
+    if os.path.isdir(path):
+        return os.path.join(path, MANIFEST_FILE)
+    return path
+
+def format_record(record):
+    return "{:<48} {:<40} {:<24} {}".format(record["output"], record["source"] or "(unsaved)", record["node"],
+                                            time.strftime("%Y-%m-%d %H:%M", time.localtime(record["time"])))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up and check the manifest of exported files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("stale", help="list outputs whose source or file changed since the export")
+    command.add_argument("manifest", help="Unity project folder or manifest file")
+    command = commands.add_parser("outputs", help="list the outputs written from a source file")
+    command.add_argument("manifest", help="Unity project folder or manifest file")
+    command.add_argument("path", help=".blend or .kra file")
+    command = commands.add_parser("source", help="show the record of an output file")
+    command.add_argument("manifest", help="Unity project folder or manifest file")
+    command.add_argument("path", help=".fbx or .tga file")
+    command = commands.add_parser("compact", help="keep only the latest record of every output")
+    command.add_argument("manifest", help="Unity project folder or manifest file")
+    args = parser.parse_args(argv)
+
+    path = _manifest_argument(args.manifest)
+    if not os.path.isfile(path):
+        print("No manifest at " + path)
+        return 1
+    manifest = open_manifest(path)
+
+    if args.command == "stale":
+        stale = manifest.stale()
+        for record, reason in stale:
+            print("{:<32} {}".format(reason, format_record(record)))
+        print("{} of {} outputs stale".format(len(stale), len(manifest.by_output)))
+        return 1 if stale else 0
+    if args.command == "outputs":
+        records = manifest.outputs_of(args.path)
+        for record in records:
+            print(format_record(record))
+        return 0 if records else 1
+    if args.command == "source":
+        record = manifest.source_of(args.path)
+        if record is None:
+            print("{} is not in the manifest".format(args.path))
+            return 1
+        print(json.dumps(record, indent=1, sort_keys=True))
+        return 0
+
+    dropped = manifest.compact()
+    print("{} records dropped, {} kept".format(dropped, len(manifest.by_output)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+####################################################################################################
+## Exports .kra files without Krita, for build machines and watch folders.
+##    cd krita_exporter/pykrita
+##    python -m texture_exporter.kra_export [--sizes=2048,1024,512] [--rle] [--jobs=4] [--force]
+##                                          [--watch] [--interval=2] <export dir> <file.kra | folder> ...
+## Files are read with kra_reader.py and exported with batch_export.export_document(), so the
+## textures are the ones Export All writes. Every file is exported in its own process.
+## The export dir keeps the size and mtime of every file it exported (STATE_FILE); only new and
+## changed files are exported again. With --watch the folders are polled and a changed file is
+## exported once it stayed the same for one interval, so files still being saved are left alone.
+## A file that failed to export is only tried again once it changed.
+####################################################################################################
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from .batch_export import ExportResult, export_document, find_kra_files, format_summary
+from .kra_reader import KraDocument
+from .resolution_chain import parse_sizes
+
+
+STATE_FILE      = ".kra_export.json"
+POLL_INTERVAL   = 2.0
+
+
+def export_kra(path, export_dir, sizes=(), rle=False):
+    try:
+        doc = KraDocument(path)
+    except Exception as e:
+        return [ExportResult(os.path.basename(path), "", "", "failed: could not open: {}".format(e))]
+    try:
+        return export_document(doc, export_dir, sizes=sizes, rle=rle)
+    finally:
+        doc.close()
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# -------------------- STATE
+def load_state(export_dir):
+    try:
+        with open(os.path.join(export_dir, STATE_FILE)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(export_dir, state):
+    path = os.path.join(export_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as file:
+        json.dump(state, file, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+class KraExporter:
+    def __init__(self, export_dir, sizes=(), rle=False, jobs=None, force=False):
+        self.export_dir = export_dir
+        self.sizes = sizes
+        self.rle = rle
+        self.pool = ProcessPoolExecutor(jobs)
+        self.state = {} if force else load_state(export_dir)
+        # stamps of the files that failed, and of every file at the last poll
+        self.failed = {}
+        self.seen = {}
+
+    def changed(self, files):
+        stamps = {}
+        for path in files:
+            try:
+                stamps[os.path.abspath(path)] = file_stamp(path)
+            except OSError:
+                continue
+        return {path: stamp for path, stamp in stamps.items() if self.state.get(path) != stamp}
+
+    def export(self, stamps):
+        """Export files in parallel, the ones that did not fail are remembered with their stamp."""
+        paths = sorted(stamps)
+        futures = [self.pool.submit(export_kra, path, self.export_dir, self.sizes, self.rle) for path in paths]
+        results = []
+        for path, future in zip(paths, futures):
+            try:
+                file_results = future.result()
+            except Exception as e:
+                file_results = [ExportResult(os.path.basename(path), "", "", "failed: " + str(e))]
+            results += file_results
+            if any(r.status.startswith("failed") for r in file_results):
+                self.failed[path] = stamps[path]
+            else:
+                self.failed.pop(path, None)
+                self.state[path] = stamps[path]
+        save_state(self.export_dir, self.state)
+        return results
+
+    def poll(self, paths):
+        """One round of watch(), returns the results of the files it exported."""
+        stamps = self.changed(find_kra_files(paths))
+        # only files that did not change since the last poll, Krita may still be saving the others,
+        # and no file that failed as it is now
+        ready = {path: stamp for path, stamp in stamps.items()
+                 if self.seen.get(path) == stamp and self.failed.get(path) != stamp}
+        self.seen = stamps
+        return self.export(ready) if ready else []
+
+    def watch(self, paths, interval=POLL_INTERVAL):
+        while True:
+            results = self.poll(paths)
+            if results:
+                print(format_summary(results), flush=True)
+            time.sleep(interval)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m texture_exporter.kra_export",
+                                     description="Export the textures of .kra files without Krita.")
+    parser.add_argument("export_dir")
+    parser.add_argument("paths", nargs="+", metavar="file.kra | folder")
+    parser.add_argument("--sizes", type=parse_sizes, default=())
+    parser.add_argument("--rle", action="store_true")
+    parser.add_argument("--jobs", type=int, default=None, help="export processes, one per CPU by default")
+    parser.add_argument("--force", action="store_true", help="export files that did not change too")
+    parser.add_argument("--watch", action="store_true", help="keep exporting files as they change")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between polls")
+    args = parser.parse_args(argv)
+
+    exporter = KraExporter(args.export_dir, args.sizes, args.rle, args.jobs, args.force)
+    try:
+        results = exporter.export(exporter.changed(find_kra_files(args.paths)))
+        print(format_summary(results), flush=True)
+        if args.watch:
+            exporter.watch(args.paths, args.interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        exporter.close()
+    return 1 if any(r.status.startswith("failed") for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
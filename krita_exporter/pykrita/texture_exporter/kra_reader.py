@@ -0,0 +1,427 @@
+####################################################################################################
+## Reads .kra files without Krita, for exports on build machines.
+## A .kra is a zip: maindoc.xml describes the layer tree, every paint layer stores its pixels as
+## 64x64 tiles, LZF compressed with the channels stored one after the other. Groups are not
+## stored, their projection is composited here tile by tile from their children, bottom to top.
+## Supported: 8 bit RGBA and GRAYA layers, paint layers, color fill layers, groups, layer offsets,
+## opacity, visibility, the normal blending mode and transparency masks. Anything else raises a
+## KraError naming the layer, so a build never exports a texture that Krita would draw differently.
+## Tiles that are fully opaque or fully transparent are composited with plain copies, only tiles
+## with partly transparent pixels go through the per-pixel blend (which may differ from Krita by
+## one step of rounding).
+## KraDocument and KraNode answer the same calls as Krita's Document and Node where the exporter
+## uses them, so document_export.py and batch_export.py work on them unchanged.
+####################################################################################################
+
+import re
+import zipfile
+import xml.etree.ElementTree as ElementTree
+
+
+TILE            = 64
+TILE_PIXELS     = TILE * TILE
+TILE_BYTES      = TILE_PIXELS * 4
+
+COMPRESSED_TILE = 1
+
+_OPAQUE         = b"\xff" * TILE_PIXELS
+_CLEAR          = b"\x00" * TILE_PIXELS
+_SCALE          = [bytes((v * o + 127) // 255 for v in range(256)) for o in range(256)]
+
+
+class KraError(Exception):
+    pass
+
+
+# -------------------- TILES
+def lzf_decompress(data, size):
+    out = bytearray(size)
+    ip = op = 0
+    end = len(data)
+    while ip < end:
+        ctrl = data[ip]
+        ip += 1
+        if ctrl < 32:
+            length = ctrl + 1
+            out[op:op + length] = data[ip:ip + length]
+            ip += length
+        else:
+            length = ctrl >> 5
+            if length == 7:
+                length += data[ip]
+                ip += 1
+            ref = op - ((ctrl & 31) << 8) - data[ip] - 1
+            ip += 1
+            length += 2
+            distance = op - ref
+            if distance >= length:
+                out[op:op + length] = out[ref:ref + length]
+            else:
+                # the copy overlaps what it writes, repeat the pattern
+                out[op:op + length] = (bytes(out[ref:op]) * (length // distance + 1))[:length]
+        op += length
+    if op != size:
+        raise KraError("tile decompressed to {} bytes, expected {}".format(op, size))
+    return out
+
+def read_tiles(data):
+    """Tiles of a layer file as {(x, y): interleaved pixels}, and the pixel size."""
+    header = {}
+    pos = 0
+    while "DATA" not in header:
+        end = data.index(b"\n", pos)
+        key, _, value = data[pos:end].decode("ascii").partition(" ")
+        header[key] = int(value)
+        pos = end + 1
+    if header.get("VERSION") != 2 or header.get("TILEWIDTH") != TILE or header.get("TILEHEIGHT") != TILE:
+        raise KraError("unsupported tile format {}".format(header))
+
+    pixel_size = header["PIXELSIZE"]
+    size = TILE_PIXELS * pixel_size
+    tiles = {}
+    for _ in range(header["DATA"]):
+        end = data.index(b"\n", pos)
+        x, y, _, length = data[pos:end].decode("ascii").split(",")
+        pos = end + 1
+        stored = data[pos:pos + int(length)]
+        pos += int(length)
+        # uncompressed tiles keep their channels one after the other too
+        if stored[0] == COMPRESSED_TILE:
+            planar = lzf_decompress(memoryview(stored)[1:], size)
+        else:
+            planar = stored[1:1 + size]
+        pixels = bytearray(size)
+        for channel in range(pixel_size):
+            pixels[channel::pixel_size] = planar[channel * TILE_PIXELS:(channel + 1) * TILE_PIXELS]
+        tiles[(int(x), int(y))] = pixels
+    return tiles, pixel_size
+
+def to_bgra(pixels, color_space):
+    if color_space == "RGBA":
+        return pixels
+    if color_space == "GRAYA":
+        bgra = bytearray(len(pixels) * 2)
+        gray = pixels[0::2]
+        bgra[0::4] = gray
+        bgra[1::4] = gray
+        bgra[2::4] = gray
+        bgra[3::4] = pixels[1::2]
+        return bgra
+    raise KraError("color space {} is not supported".format(color_space))
+
+def offset_tiles(tiles, dx, dy):
+    """Tiles moved by a layer offset, split over the tile grid when the offset is not on it."""
+    if dx % TILE == 0 and dy % TILE == 0:
+        return {(x + dx, y + dy): tile for (x, y), tile in tiles.items()}
+    moved = {}
+    for (x, y), tile in tiles.items():
+        left, top = x + dx, y + dy
+        for ty in range(top - top % TILE, top + TILE, TILE):
+            for tx in range(left - left % TILE, left + TILE, TILE):
+                x0, x1 = max(left, tx), min(left + TILE, tx + TILE)
+                y0, y1 = max(top, ty), min(top + TILE, ty + TILE)
+                if x0 >= x1 or y0 >= y1:
+                    continue
+                target = moved.get((tx, ty))
+                if target is None:
+                    target = moved[(tx, ty)] = bytearray(TILE_BYTES)
+                width = (x1 - x0) * 4
+                for row in range(y0, y1):
+                    src = ((row - top) * TILE + x0 - left) * 4
+                    dst = ((row - ty) * TILE + x0 - tx) * 4
+                    target[dst:dst + width] = tile[src:src + width]
+    return moved
+
+
+# -------------------- COMPOSITING
+def over(dst, src, opacity):
+    """Normal blend of a BGRA tile onto another, None stands for a transparent tile."""
+    alpha = src[3::4]
+    if opacity == 0 or alpha == _CLEAR:
+        return dst
+    if opacity < 255:
+        src = bytearray(src)
+        src[3::4] = alpha.translate(_SCALE[opacity])
+        alpha = src[3::4]
+    if dst is None or alpha == _OPAQUE:
+        return src
+    if dst[3::4] == _CLEAR:
+        return src
+
+    out = bytearray(dst)
+    for i in range(3, TILE_BYTES, 4):
+        sa = src[i]
+        if sa == 0:
+            continue
+        if sa == 255:
+            out[i - 3:i + 1] = src[i - 3:i + 1]
+            continue
+        da = out[i]
+        weight = da * (255 - sa) // 255
+        total = sa + weight
+        for c in range(i - 3, i):
+            out[c] = (src[c] * sa + out[c] * weight + total // 2) // total
+        out[i] = total
+    return out
+
+def apply_mask(tile, mask):
+    """Multiply the alpha of a BGRA tile by a one channel mask tile."""
+    if mask == _OPAQUE:
+        return tile
+    if mask == _CLEAR:
+        return None
+    out = bytearray(tile)
+    alpha = out[3::4]
+    out[3::4] = bytes((a * m + 127) // 255 for a, m in zip(alpha, mask))
+    return out
+
+
+# -------------------- NODES
+class _Uuid:
+    def __init__(self, value):
+        self.value = value
+
+    def toString(self):
+        return self.value
+
+
+class KraNode:
+    def __init__(self, doc, element):
+        self.doc = doc
+        self.element = element
+        self._name = element.get("name", "")
+        self._type = element.get("nodetype", "")
+        self._visible = element.get("visible", "1") != "0"
+        self._opacity = int(element.get("opacity", "255"))
+        self._blending = element.get("compositeop", "normal")
+        self.filename = element.get("filename", "")
+        self.color_space = element.get("colorspacename", "RGBA")
+        self.x = int(element.get("x", "0"))
+        self.y = int(element.get("y", "0"))
+        self.children = [KraNode(doc, child) for child in element.findall("./layers/layer")]
+        self.masks = element.findall("./masks/mask")
+        self.projection = None
+
+    # -------------------- Krita Node API
+    def name(self):
+        return self._name
+
+    def type(self):
+        return self._type
+
+    def childNodes(self):
+        return list(self.children)
+
+    def uniqueId(self):
+        return _Uuid(self.element.get("uuid") or self.filename)
+
+    def blendingMode(self):
+        return self._blending
+
+    def opacity(self):
+        return self._opacity
+
+    def visible(self):
+        return self._visible
+
+    def setVisible(self, visible):
+        self._visible = visible
+        self.doc.refreshProjection()
+
+    def projectionPixelData(self, x, y, w, h):
+        return self.doc.read_rect(self.tiles(), x, y, w, h)
+
+    # -------------------- TILES
+    def tiles(self):
+        if self.projection is None:
+            self.projection = self._render()
+        return self.projection
+
+    def _render(self):
+        if self._type == "grouplayer":
+            tiles = composite(self.children, self.doc.tile_keys())
+        elif self._type == "paintlayer":
+            tiles = self.doc.layer_tiles(self.filename, self.color_space, self.x, self.y)
+        elif self._type == "generatorlayer":
+            tiles = self.doc.fill_tiles(self.filename, self.x, self.y)
+        else:
+            raise KraError("'{}': {} layers are not supported".format(self._name, self._type))
+
+        for mask in self.masks:
+            if mask.get("visible", "1") == "0" or mask.get("nodetype") == "selectionmask":
+                continue
+            if mask.get("nodetype") != "transparencymask":
+                raise KraError("'{}': {} masks are not supported".format(self._name, mask.get("nodetype")))
+            selection = self.doc.selection_tiles(mask.get("filename"), int(mask.get("x", "0")), int(mask.get("y", "0")))
+            tiles = {key: masked for key, masked in
+                     ((key, apply_mask(tile, selection.get(key, _CLEAR))) for key, tile in tiles.items())
+                     if masked is not None}
+        return tiles
+
+def composite(nodes, keys):
+    """Visible nodes, listed top first like in maindoc.xml, blended over each other."""
+    result = {}
+    for node in reversed(nodes):
+        if not node.visible():
+            continue
+        if node.blendingMode() != "normal":
+            raise KraError("'{}': blending mode {} is not supported".format(node.name(), node.blendingMode()))
+        for key, tile in node.tiles().items():
+            if key in keys:
+                blended = over(result.get(key), tile, node.opacity())
+                if blended is not None:
+                    result[key] = blended
+    return result
+
+
+class KraDocument:
+    def __init__(self, path):
+        self.path = path
+        self.archive = zipfile.ZipFile(path)
+        image = ElementTree.fromstring(self.archive.read("maindoc.xml")).find(".//IMAGE")
+        if image is None:
+            raise KraError("{} has no image".format(path))
+        self.image_name = image.get("name", "")
+        self._width = int(image.get("width"))
+        self._height = int(image.get("height"))
+        self.color_space = image.get("colorspacename", "RGBA")
+        self.nodes = [KraNode(self, element) for element in image.findall("./layers/layer")]
+        self.projection = None
+
+    # -------------------- Krita Document API
+    def fileName(self):
+        return self.path
+
+    def modified(self):
+        return False
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def colorModel(self):
+        return {"RGBA": "RGBA", "GRAYA": "GRAYA"}.get(self.color_space, self.color_space)
+
+    def colorDepth(self):
+        # 16 bit and float color spaces carry their depth in the name (RGBA16, RGBAF32...)
+        return "U8" if self.color_space in ("RGBA", "GRAYA") else self.color_space
+
+    def topLevelNodes(self):
+        return list(self.nodes)
+
+    def pixelData(self, x, y, w, h):
+        if self.projection is None:
+            self.projection = composite(self.nodes, self.tile_keys())
+        return self.read_rect(self.projection, x, y, w, h)
+
+    def refreshProjection(self):
+        self.projection = None
+        stack = list(self.nodes)
+        while stack:
+            node = stack.pop()
+            if node.type() == "grouplayer":
+                node.projection = None
+            stack.extend(node.children)
+
+    def waitForDone(self):
+        pass
+
+    def close(self):
+        self.archive.close()
+
+    # -------------------- READING
+    def tile_keys(self):
+        return {(x, y) for y in range(0, self._height, TILE) for x in range(0, self._width, TILE)}
+
+    def layer_tile_keys(self, dx, dy):
+        """The tiles of a layer moved by (dx, dy) that cover the image, on the layer's own tile grid."""
+        return {(x, y) for y in range(-dy // TILE * TILE, self._height - dy, TILE)
+                for x in range(-dx // TILE * TILE, self._width - dx, TILE)}
+
+    def _layer_file(self, filename, suffix=""):
+        name = "{}/layers/{}{}".format(self.image_name, filename, suffix)
+        try:
+            return self.archive.read(name)
+        except KeyError:
+            return None
+
+    def layer_tiles(self, filename, color_space, dx, dy):
+        data = self._layer_file(filename)
+        if data is None:
+            raise KraError("layer data {} is missing".format(filename))
+        tiles, _ = read_tiles(data)
+        tiles = {key: to_bgra(tile, color_space) for key, tile in tiles.items()}
+
+        default = self._layer_file(filename, ".defaultpixel")
+        if default and any(default):
+            # pixels never painted hold the default pixel, e.g. a layer filled as a whole
+            fill = to_bgra(bytearray(default) * TILE_PIXELS, color_space)
+            for key in self.layer_tile_keys(dx, dy):
+                tiles.setdefault(key, fill)
+        return offset_tiles(tiles, dx, dy)
+
+    def selection_tiles(self, filename, dx, dy):
+        data = self._layer_file(filename, ".pixelselection")
+        if data is None:
+            return {key: _OPAQUE for key in self.tile_keys()}
+        tiles, _ = read_tiles(data)
+        default = self._layer_file(filename, ".pixelselection.defaultpixel")
+        if default and default[0]:
+            for key in self.layer_tile_keys(dx, dy):
+                tiles.setdefault(key, bytes(default[:1]) * TILE_PIXELS)
+        if dx % TILE == 0 and dy % TILE == 0:
+            return offset_tiles(tiles, dx, dy)
+        # one channel tiles, moved as the alpha of four channel ones and read back
+        wide = {}
+        for key, tile in tiles.items():
+            wide[key] = bytearray(TILE_BYTES)
+            wide[key][3::4] = tile
+        return {key: bytes(tile[3::4]) for key, tile in offset_tiles(wide, dx, dy).items()}
+
+    def fill_tiles(self, filename, dx, dy):
+        config = self._layer_file(filename, ".filterconfig") or b""
+        color = fill_color(config.decode("utf-8", "replace"))
+        if color is None:
+            raise KraError("fill layer {} is not a color fill".format(filename))
+        tile = bytearray(bytes(color) * TILE_PIXELS)
+        tiles = {key: tile for key in self.tile_keys()}
+        selection = self.selection_tiles(filename, dx, dy)
+        return {key: masked for key, masked in
+                ((key, apply_mask(tile, selection.get(key, _CLEAR))) for key in tiles)
+                if masked is not None}
+
+    def read_rect(self, tiles, x, y, w, h):
+        """BGRA pixels of a rectangle, assembled from whole rows of the tiles it covers."""
+        out = bytearray(w * h * 4)
+        for ty in range(y - y % TILE, y + h, TILE):
+            for tx in range(x - x % TILE, x + w, TILE):
+                tile = tiles.get((tx, ty))
+                if tile is None:
+                    continue
+                x0, x1 = max(x, tx), min(x + w, tx + TILE)
+                width = (x1 - x0) * 4
+                for row in range(max(y, ty), min(y + h, ty + TILE)):
+                    src = ((row - ty) * TILE + x0 - tx) * 4
+                    dst = ((row - y) * w + x0 - x) * 4
+                    out[dst:dst + width] = tile[src:src + width]
+        return out
+
+
+_COLOR_CHANNEL = re.compile(r'\b([rgb])="([0-9.eE+-]+)"')
+_GRAY_CHANNEL = re.compile(r'<Gray[^>]*\bg="([0-9.eE+-]+)"')
+
+def fill_color(config):
+    """BGRA of a color fill layer's filter config, or None for other generators."""
+    if 'name="color"' not in config and "name='color'" not in config:
+        return None
+    gray = _GRAY_CHANNEL.search(config)
+    if gray:
+        value = min(255, max(0, int(round(float(gray.group(1)) * 255))))
+        return (value, value, value, 255)
+    channels = dict(_COLOR_CHANNEL.findall(config[config.find("<RGB"):]))
+    if len(channels) < 3:
+        return None
+    r, g, b = (min(255, max(0, int(round(float(channels[c]) * 255)))) for c in "rgb")
+    return (b, g, r, 255)
@@ -0,0 +1,94 @@
+####################################################################################################
+## Group names that mark the role of a layer group, and the layer dicts built from them.
+## A layer dict maps an output channel ("red", "green", "blue", "alpha") to the group feeding it.
+## Roles are matched on the exact name suffix ("Rock_METALNESS"), over the whole layer tree. A
+## RoleIndex is built in one walk when an export starts and handed to everything that export looks
+## up. It is not kept between exports: Krita does not tell plugins when layers change, and telling
+## that from the tree would take the same walk.
+####################################################################################################
+
+from collections import defaultdict
+
+MASK_RED            = "_METALNESS"
+MASK_GREEN          = "_OCCLUSION"
+MASK_BLUE           = "_EMISSION_MASK"
+MASK_ALPHA          = "_SMOOTHNESS"
+
+LAYER_MASK_RED      = "_ALBEDO"
+LAYER_MASK_GREEN    = "_SMOOTHNESS"
+LAYER_MASK_BLUE     = "_NORMAL_DETAIL_MASK"
+
+LAYER_DIFFUSE       = "_DIFFUSE"
+LAYER_DIFFUSE_ALPHA = "_ALPHA"
+LAYER_BACKGROUND    = "_BACKGROUND"
+
+
+ROLE_NAMES          = {MASK_RED, MASK_GREEN, MASK_BLUE, MASK_ALPHA,
+                       LAYER_MASK_RED, LAYER_MASK_GREEN, LAYER_MASK_BLUE,
+                       LAYER_DIFFUSE, LAYER_DIFFUSE_ALPHA, LAYER_BACKGROUND}
+
+MASK_ROLES          = (("red", MASK_RED), ("green", MASK_GREEN), ("blue", MASK_BLUE), ("alpha", MASK_ALPHA))
+DETAIL_MASK_ROLES   = (("red", LAYER_MASK_RED), ("green", LAYER_MASK_GREEN), ("blue", LAYER_MASK_BLUE))
+DIFFUSE_ROLES       = (("diffuse", LAYER_DIFFUSE), ("alpha", LAYER_DIFFUSE_ALPHA))
+TEXTURE_ROLES       = tuple((role, role) for role in sorted({role for roles in (MASK_ROLES, DETAIL_MASK_ROLES, DIFFUSE_ROLES)
+                                                             for _, role in roles}))
+
+
+def node_role(name):
+    """The role suffix a layer name ends with, the longest one wins."""
+    name = name.strip()
+    for i, ch in enumerate(name):
+        if ch == "_" and name[i:] in ROLE_NAMES:
+            return name[i:]
+    return None
+
+
+class RoleIndex:
+    def __init__(self, doc):
+        self.nodes = defaultdict(list)
+
+        # the content of a role group is not searched for further roles
+        stack = list(doc.topLevelNodes())
+        while stack:
+            node = stack.pop()
+            role = node_role(node.name())
+            if role is not None:
+                self.nodes[role].append(node)
+            else:
+                stack.extend(node.childNodes())
+
+    def has(self, role):
+        return role in self.nodes
+
+    def node(self, role):
+        nodes = self.nodes.get(role, ())
+        return nodes[0] if len(nodes) == 1 else None
+
+    def layer_dict(self, roles):
+        layerDict = {}
+        for key, role in roles:
+            node = self.node(role)
+            if node is not None:
+                layerDict[key] = node
+        return layerDict
+
+    def problems(self, roles, required=()):
+        """Ambiguous roles, and missing roles out of `required`, as readable messages."""
+        messages = []
+        for _, role in roles:
+            nodes = self.nodes.get(role, ())
+            if len(nodes) > 1:
+                messages.append("{} is used by {} layers: {}".format(role, len(nodes), ", ".join(n.name() for n in nodes)))
+            elif not nodes and role in required:
+                messages.append("no layer named *{}".format(role))
+        return messages
+
+
+def create_mask_layer_dict(doc, index=None):
+    return (index or RoleIndex(doc)).layer_dict(MASK_ROLES)
+
+def create_detail_mask_layer_dict(doc, index=None):
+    return (index or RoleIndex(doc)).layer_dict(DETAIL_MASK_ROLES)
+
+def create_diffuse_layer_dict(doc, index=None):
+    return (index or RoleIndex(doc)).layer_dict(DIFFUSE_ROLES)
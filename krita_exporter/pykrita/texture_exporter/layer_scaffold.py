@@ -0,0 +1,66 @@
+####################################################################################################
+## Layer scaffolding for the "Create ... Layers" buttons.
+## Every role group gets a color fill layer as its base and an empty paint layer on top to paint
+## on. Fill layers are generated, so a constant base takes no pixel memory whatever the document
+## size, and the paint layer stays empty (sparse) until it is painted on.
+## Roles the document already has are left alone, pressing a button twice adds nothing. All groups
+## are built before any of them is added to the document, and the projection is refreshed once.
+## When something fails halfway the groups already added are removed again.
+####################################################################################################
+
+from krita import InfoObject, ManagedColor, Selection
+
+from .layer_roles import RoleIndex
+
+
+BASE_COLOR      = (0.0, 0.0, 0.0, 1.0)
+BASE_LAYER      = "base"
+PAINT_LAYER     = "paint"
+
+
+def fill_configuration(rgba):
+    color = ManagedColor("RGBA", "U8", "")
+    # components are stored BGRA
+    color.setComponents([rgba[2], rgba[1], rgba[0], rgba[3]])
+    config = InfoObject()
+    config.setProperty("color", color.toXML())
+    return config
+
+def missing_roles(doc, roles):
+    index = RoleIndex(doc)
+    return [role for role in roles if not index.has(role)]
+
+def build_role_group(doc, role, config, selection):
+    group = doc.createNode(role, "groupLayer")
+    base = doc.createFillLayer(BASE_LAYER, "color", config, selection)
+    paint = doc.createNode(PAINT_LAYER, "paintLayer")
+    # the group is not in the image yet, so setting its children updates nothing
+    group.setChildNodes([base, paint])
+    return group, paint
+
+def scaffold_roles(doc, roles, rgba=BASE_COLOR):
+    """Add a group for every role the document lacks, returns the names of the groups added."""
+    missing = missing_roles(doc, roles)
+    if not missing:
+        return []
+
+    selection = Selection()
+    selection.select(0, 0, doc.width(), doc.height(), 255)
+    config = fill_configuration(rgba)
+
+    built = [build_role_group(doc, role, config, selection) for role in missing]
+    root = doc.rootNode()
+    added = []
+    try:
+        for group, _ in built:
+            root.addChildNode(group, None)
+            added.append(group)
+    except Exception:
+        for group in added:
+            group.remove()
+        raise
+    finally:
+        doc.refreshProjection()
+
+    doc.setActiveNode(built[-1][1])
+    return missing
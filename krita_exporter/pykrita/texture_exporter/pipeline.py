@@ -0,0 +1,122 @@
+####################################################################################################
+## Event driven export pipeline.
+## A pipeline is a list of stages. Each stage runs its action and then waits until its wait
+## condition reports that the work really finished (for Krita documents: no image jobs running),
+## polling with an increasing delay instead of a fixed 100 ms sleep per step.
+## Every stage is timed. A stage that does not finish within the timeout aborts the pipeline,
+## only the stages marked as `always` (closing temp documents, deleting temp files) still run.
+####################################################################################################
+
+import time
+from PyQt5 import QtCore
+
+from . import tracing
+
+
+POLL_START_MS   = 2
+POLL_MAX_MS     = 100
+
+
+def document_idle(doc):
+    """Wait condition: true once the document has no running image jobs (fills, conversions...)."""
+    def idle():
+        if doc.tryBarrierLock():
+            doc.unlock()
+            return True
+        return False
+    return idle
+
+
+class Stage:
+    def __init__(self, name, action, wait=None, always=False):
+        self.name = name
+        self.action = action
+        self.wait = wait
+        self.always = always
+
+
+class Pipeline:
+    def __init__(self, name, stages, timeout=60.0, on_finished=None, schedule=QtCore.QTimer.singleShot):
+        self.name = name
+        self.stages = stages
+        self.timeout = timeout
+        self.on_finished = on_finished
+        self.schedule = schedule
+
+        self.index = 0
+        self.error = None
+        self.timings = []
+        self.stage_start = 0.0
+
+    @property
+    def running(self):
+        return self.index < len(self.stages)
+
+    def run(self):
+        self.index = 0
+        self.error = None
+        self.timings = []
+        self._start_stage()
+
+    def _start_stage(self):
+        # after a failure only the cleanup stages are run
+        while self.running and self.error is not None and not self.stages[self.index].always:
+            self.index += 1
+        if not self.running:
+            self._finish()
+            return
+
+        stage = self.stages[self.index]
+        self.stage_start = time.perf_counter()
+        try:
+            with tracing.span("action", stage=stage.name):
+                stage.action()
+        except Exception as e:
+            self._fail("{} failed: {}".format(stage.name, e))
+            return
+        self._poll(POLL_START_MS)
+
+    def _poll(self, delay):
+        stage = self.stages[self.index]
+        try:
+            done = stage.wait is None or stage.wait()
+        except Exception as e:
+            self._fail("{} failed: {}".format(stage.name, e))
+            return
+
+        if done:
+            self._record(stage)
+            self.index += 1
+            # hand control back to the Qt event loop between stages
+            self.schedule(0, self._start_stage)
+        elif time.perf_counter() - self.stage_start > self.timeout:
+            self._fail("{} timed out after {:.0f} s".format(stage.name, self.timeout))
+        else:
+            self.schedule(delay, lambda: self._poll(min(delay * 2, POLL_MAX_MS)))
+
+    def _fail(self, error):
+        self._record(self.stages[self.index], error)
+        if self.error is None:
+            self.error = error
+        self.index += 1
+        self.schedule(0, self._start_stage)
+
+    def _record(self, stage, error=None):
+        seconds = time.perf_counter() - self.stage_start
+        self.timings.append((stage.name, seconds))
+        # the stage span covers the action and the wait until the document is idle again
+        if error is None:
+            tracing.complete(self.name + ": " + stage.name, self.stage_start, seconds)
+        else:
+            tracing.complete(self.name + ": " + stage.name, self.stage_start, seconds, error=error)
+
+    def _finish(self):
+        if self.on_finished is not None:
+            self.on_finished(self)
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.timings)
+        lines = ["{}: {:.0f} ms{}".format(self.name, total * 1000, "" if self.error is None else " - " + self.error)]
+        for name, seconds in self.timings:
+            lines.append("    {:<24} {:>8.1f} ms".format(name, seconds * 1000))
+        return "\n".join(lines)
@@ -0,0 +1,212 @@
+####################################################################################################
+## Smaller versions of an output (2K, 1K, 512...) written next to it from the same packed rows.
+## Every level halves the one above it with a 2x2 box filter. The filter runs on whole channels at
+## once: the samples are spread into 16 or 32 bit lanes of one big integer, so adding four pixels
+## and dividing by four are a few big integer operations in C instead of a per-pixel Python loop.
+## Mask channels hold linear data and are averaged as they are. Diffuse color is sRGB, it is
+## converted to 16 bit linear light before averaging and back to sRGB afterwards.
+## Bands are downsampled and written on a thread pool while the next band is read from Krita.
+## Level files are uncompressed TGAs written at fixed row offsets, so a band patched in the full
+## size output is patched in every level too. Levels written whole go to a .tmp file first, the
+## caller only moves it over the old level when the bytes differ.
+####################################################################################################
+
+import os
+import sys
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from .channel_packing import OUTPUT_OFFSETS
+from .tga import TGA_HEADER_SIZE, tga_header
+from . import tracing
+
+
+MAX_WORKERS     = 4
+MAX_PENDING     = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, os.cpu_count() or 1), thread_name_prefix="texture_levels")
+        return _executor
+
+
+# -------------------- sRGB
+def _to_linear(value):
+    c = value / 255.0
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+def _to_srgb(linear):
+    c = linear * 12.92 if linear <= 0.0031308 else 1.055 * linear ** (1.0 / 2.4) - 0.055
+    return max(0, min(255, int(round(c * 255.0))))
+
+_LINEAR         = [int(round(_to_linear(v) * 65535)) for v in range(256)]
+_LINEAR_LOW     = bytes(v & 0xFF for v in _LINEAR)
+_LINEAR_HIGH    = bytes(v >> 8 for v in _LINEAR)
+
+@lru_cache(maxsize=1)
+def _srgb_table():
+    # a list, its __getitem__ is the quickest lookup map() can call per sample
+    return [_to_srgb(i / 65535.0) for i in range(65536)]
+
+def srgb_offsets(layout):
+    """Byte offsets, inside a packed pixel, of the channels that hold sRGB color."""
+    return frozenset(OUTPUT_OFFSETS[position] for position, (key, _) in enumerate(layout) if key == "diffuse")
+
+
+# -------------------- BOX FILTER
+@lru_cache(maxsize=32)
+def _lanes(value, lane_bytes, count):
+    return int.from_bytes(value.to_bytes(lane_bytes, "little") * count, "little")
+
+def _average(quads):
+    n = len(quads[0])
+    lanes = bytearray(2 * n)
+    total = 0
+    for samples in quads:
+        lanes[0::2] = samples
+        total += int.from_bytes(lanes, "little")
+    # four 8 bit samples fit a 16 bit lane, the mask drops what the shift moved in from the next lane
+    total = ((total + _lanes(2, 2, n)) >> 2) & _lanes(0xFF, 2, n)
+    return total.to_bytes(2 * n, "little")[0::2]
+
+def _average_srgb(quads):
+    n = len(quads[0])
+    lanes = bytearray(4 * n)
+    total = 0
+    for samples in quads:
+        lanes[0::4] = samples.translate(_LINEAR_LOW)
+        lanes[1::4] = samples.translate(_LINEAR_HIGH)
+        total += int.from_bytes(lanes, "little")
+    total = ((total + _lanes(2, 4, n)) >> 2) & _lanes(0xFFFF, 4, n)
+
+    averaged = total.to_bytes(4 * n, "little")
+    linear = bytearray(2 * n)
+    linear[0::2] = averaged[0::4]
+    linear[1::2] = averaged[1::4]
+    values = array("H")
+    values.frombytes(linear)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return bytes(map(_srgb_table().__getitem__, values))
+
+def downsample(pixels, width, rows, stride, srgb=frozenset()):
+    """Halve a band of packed rows, returns (pixels, width, rows). An odd last row or column is dropped."""
+    half_width = width // 2
+    half_rows = rows // 2
+    row_bytes = width * stride
+    used = half_width * 2 * stride
+    top = b"".join(pixels[r * row_bytes:r * row_bytes + used] for r in range(0, half_rows * 2, 2))
+    bottom = b"".join(pixels[r * row_bytes:r * row_bytes + used] for r in range(1, half_rows * 2, 2))
+
+    halved = bytearray(half_width * half_rows * stride)
+    if halved:
+        pair = 2 * stride
+        for offset in range(stride):
+            quads = (top[offset::pair], top[stride + offset::pair], bottom[offset::pair], bottom[stride + offset::pair])
+            halved[offset::stride] = _average_srgb(quads) if offset in srgb else _average(quads)
+    return bytes(halved), half_width, half_rows
+
+
+# -------------------- LEVELS
+def chain_levels(width, height, sizes):
+    """(shift, width, height, size) of every level, the largest one that fits each requested size."""
+    levels = {}
+    for size in sizes:
+        shift = 0
+        while max(width >> shift, height >> shift) > size:
+            shift += 1
+        if shift > 0 and min(width >> shift, height >> shift) > 0:
+            levels[shift] = (shift, width >> shift, height >> shift, max(width >> shift, height >> shift))
+    return [levels[shift] for shift in sorted(levels)]
+
+def band_rows_multiple(width, height, sizes):
+    # bands have to split evenly down to the smallest level
+    levels = chain_levels(width, height, sizes)
+    return 1 << levels[-1][0] if levels else 1
+
+def parse_sizes(text):
+    """Sizes from text like "2048, 1024, 512", anything that is not a positive number is ignored."""
+    sizes = []
+    for part in text.replace(";", ",").split(","):
+        part = part.strip().lower()
+        if part.endswith("k") and part[:-1].isdigit():
+            part = str(int(part[:-1]) * 1024)
+        if part.isdigit() and int(part) > 0:
+            sizes.append(int(part))
+    return sizes
+
+def level_path(path, size):
+    base, extension = os.path.splitext(path)
+    return "{}_{}{}".format(base, size, extension)
+
+def levels_exist(path, width, height, stride, sizes):
+    for _, w, h, size in chain_levels(width, height, sizes):
+        level = level_path(path, size)
+        if not os.path.isfile(level) or os.path.getsize(level) != TGA_HEADER_SIZE + w * h * stride:
+            return False
+    return True
+
+
+class ResolutionChain:
+    """Writes the levels of one output from the bands of its full size rows."""
+
+    def __init__(self, path, width, height, stride, srgb, sizes, patch=False):
+        self.width = width
+        self.stride = stride
+        self.srgb = srgb
+        self.levels = chain_levels(width, height, sizes)
+        self.paths = [level_path(path, size) for _, _, _, size in self.levels]
+        # the file every level is written to, patched levels are written in place
+        self.written = self.paths if patch else [level + ".tmp" for level in self.paths]
+        self.files = []
+        self.lock = threading.Lock()
+        self.pending = deque()
+
+        for (_, w, h, _), level in zip(self.levels, self.written):
+            if patch:
+                file = open(level, "r+b")
+            else:
+                file = open(level, "wb")
+                file.write(tga_header(w, h, stride == 4))
+                file.truncate(TGA_HEADER_SIZE + w * h * stride)
+            self.files.append(file)
+
+    def submit(self, y, pixels, rows):
+        if not self.levels:
+            return
+        # keep the bands waiting for a worker bounded
+        while len(self.pending) >= MAX_PENDING:
+            self.pending.popleft().result()
+        self.pending.append(executor().submit(self._write_band, y, bytes(pixels), rows))
+
+    def _write_band(self, y, pixels, rows):
+        with tracing.span("write levels", y=y, rows=rows):
+            width = self.width
+            shift = 0
+            for (level_shift, w, _, _), file in zip(self.levels, self.files):
+                while shift < level_shift:
+                    pixels, width, rows = downsample(pixels, width, rows, self.stride, self.srgb)
+                    shift += 1
+                if rows == 0:
+                    return
+                with self.lock:
+                    file.seek(TGA_HEADER_SIZE + (y >> level_shift) * w * self.stride)
+                    file.write(pixels)
+
+    def close(self):
+        """Wait for every band, raises the first error a worker ran into."""
+        try:
+            while self.pending:
+                self.pending.popleft().result()
+        finally:
+            for file in self.files:
+                file.close()
@@ -11,40 +11,56 @@
 ##      B - detail
 ##      A - smoothness
 ## Based on this naming convention, each group is copied to a corresponding RGBA channel.
-## Temporary document is saved, then exported and lastly removed from disk.
+## For 8 bit RGBA documents the channels are packed in memory and written straight to TGA.
+## Otherwise a temporary document is converted to 8 bit RGBA, its flattened image is written to TGA
+## and it is closed again. Every path writes through tga.py, optionally RLE compressed.
+## Packed exports can also write smaller versions of every texture, listed in "Smaller sizes".
 ## Export is skipped if export path is left empty.
+## The Create Layers buttons add the missing role groups, see layer_scaffold.py.
 ####################################################################################################
 ## File name: texture_exporter.py
 ## Created By: inloper@protonmail.com
 ## version: '1.0.1'
 ####################################################################################################
 
-from json.tool import main
 from PyQt5.QtWidgets import *
-from PyQt5 import QtCore
 from krita import *
 import os
 
+from . import layer_roles
+from . import tracing
+from .pipeline import Pipeline, Stage, document_idle
+from .document_export import can_pack_directly, diffuse_output, mask_output, detail_mask_output, export_outputs
+from .document_export import convert_to_8_bit, record_manifest, write_document
+from .batch_export import export_documents, export_files, format_summary
+from .export_cache import TextureExportCache
+from .resolution_chain import parse_sizes
+from .layer_scaffold import scaffold_roles
+
+tracing.start_from_env("texture_export")
+
 class TextureExporterDock(DockWidget):
     DEPOTROOT           = "D:\depots"
     DEPOT               = "juniper_game_dev"
 
-    MASK_RED            = "_METALNESS"
-    MASK_GREEN          = "_OCCLUSION"
-    MASK_BLUE           = "_EMISSION_MASK"
-    MASK_ALPHA          = "_SMOOTHNESS"
+    MASK_RED            = layer_roles.MASK_RED
+    MASK_GREEN          = layer_roles.MASK_GREEN
+    MASK_BLUE           = layer_roles.MASK_BLUE
+    MASK_ALPHA          = layer_roles.MASK_ALPHA
 
-    LAYER_MASK_RED      = "_ALBEDO"
-    LAYER_MASK_GREEN    = "_SMOOTHNESS"
-    LAYER_MASK_BLUE     = "_NORMAL_DETAIL_MASK"
+    LAYER_MASK_RED      = layer_roles.LAYER_MASK_RED
+    LAYER_MASK_GREEN    = layer_roles.LAYER_MASK_GREEN
+    LAYER_MASK_BLUE     = layer_roles.LAYER_MASK_BLUE
 
-    LAYER_DIFFUSE       = "_DIFFUSE"
-    LAYER_DIFFUSE_ALPHA = "_ALPHA"
-    LAYER_BACKGROUND    = "_BACKGROUND"
+    LAYER_DIFFUSE       = layer_roles.LAYER_DIFFUSE
+    LAYER_DIFFUSE_ALPHA = layer_roles.LAYER_DIFFUSE_ALPHA
+    LAYER_BACKGROUND    = layer_roles.LAYER_BACKGROUND
 
     LAYER_DICT_GLOBAL   = {}
     KRITA_INSTANCE      = {}
     exportPathGlobal = ""
+    pipeline = None
+    exportCache = TextureExportCache()
     tempFileToDeleteGlobal = ""
     actviveDocName = ""
 
@@ -63,6 +79,14 @@ class TextureExporterDock(DockWidget):
         self.pathButton = QPushButton('...', mainWidget)
         self.pathButton.clicked.connect(self.choose_path)
 
+        # -------------------- RESOLUTION CHAIN, e.g. "2048, 1024, 512" for the lower platforms
+        self.sizesLabel = QLabel("Smaller sizes:", self)
+        self.sizesBox = QLineEdit(self)
+        self.sizesBox.setPlaceholderText("2048, 1024, 512")
+
+        # -------------------- COMPRESSION, RLE files are smaller but rewritten whole on every export
+        self.rleBox = QCheckBox("RLE compress TGA", self)
+
         # -------------------- EXPORT BUTTONS
         self.exportDiffuse = QPushButton("Export Diffuse")
         self.exportDiffuse.setStyleSheet("background-color : #e1a6f2;"
@@ -95,6 +119,16 @@ class TextureExporterDock(DockWidget):
                                                     "color: black;")
         self.createDetailMaskLayers.clicked.connect(self.create_detail_mask_layers)
 
+        # -------------------- EXPORT ALL BUTTONS
+        self.exportAllOpen = QPushButton("Export All Open")
+        self.exportAllOpen.setStyleSheet("background-color : #e1a6f2;"
+                                         "color: black;")
+        self.exportAllOpen.clicked.connect(self.export_all_open)
+
+        self.exportAllFolder = QPushButton("Export All In Folder...")
+        self.exportAllFolder.setStyleSheet("background-color : #e1a6f2;"
+                                           "color: black;")
+        self.exportAllFolder.clicked.connect(self.export_all_folder)
 
         hbox.addWidget(self.eLabel)
         hbox.addWidget(self.exportPathBox, 0, 0)
@@ -109,6 +143,20 @@ class TextureExporterDock(DockWidget):
         hbox.addWidget(self.exportDetailMask, 3, 0)
         hbox.addWidget(self.createDetailMaskLayers, 3, 1)
 
+        hbox.addWidget(self.exportAllOpen, 4, 0)
+        hbox.addWidget(self.exportAllFolder, 4, 1)
+
+        hbox.addWidget(self.sizesLabel, 5, 0)
+        hbox.addWidget(self.sizesBox, 5, 1)
+
+        hbox.addWidget(self.rleBox, 6, 0)
+
+        # -------------------- TRACE BUTTON, only while EXPORTER_TRACE is set
+        if tracing.enabled:
+            self.writeTrace = QPushButton("Write Export Trace")
+            self.writeTrace.clicked.connect(self.write_trace)
+            hbox.addWidget(self.writeTrace, 6, 1)
+
         mainWidget.setLayout(hbox)
         self.setWindowTitle("Texture Exporter")
 
@@ -119,54 +167,62 @@ class TextureExporterDock(DockWidget):
             self.exportPathBox.setText(exportPathValue)
             self.exportPathGlobal = exportPathValue;
 
-    def stepper_mask(self, i, clonedDoc):
-        if i == 0:
-            newNode = clonedDoc.createNode(str(self.LAYER_BACKGROUND), "paintlayer")
-            newNode.setBlendingMode("normal")
-            clonedDoc.rootNode().addChildNode(newNode, self.LAYER_DICT_GLOBAL["alpha"])
-        if i == 1:
-            self.set_foreground_color(clonedDoc, Application)
-        if i == 2:
-            clonedDoc.setActiveNode(self.LAYER_DICT_GLOBAL["alpha"])
-            Application.action('convert_to_transparency_mask').trigger()
-            clonedDoc.save()
-        if i == 3:
-            self.export_texture(clonedDoc, True)
-        if i == 4:
-            Application.activeDocument().close()
-        if i == 5:
-            if os.path.exists(self.tempFileToDeleteGlobal):
-                os.remove(self.tempFileToDeleteGlobal)
-
-        if i < 6: QtCore.QTimer.singleShot(100, lambda: self.stepper_mask(i+1, clonedDoc) )
-
-    def stepper_detail_mask(self, i, clonedDoc):
-        if i == 0:
-            clonedDoc.save()
-        if i == 1:
-            self.export_texture(clonedDoc, False)
-        if i == 2:
-            Application.activeDocument().close()
-        if i == 3:
-            if os.path.exists(self.tempFileToDeleteGlobal):
-                os.remove(self.tempFileToDeleteGlobal)
-        if i < 4: QtCore.QTimer.singleShot(100, lambda: self.stepper_detail_mask(i+1, clonedDoc) )
-
-    def stepper_diffuse(self, i, clonedDoc, alpha):
-        temp_alpha = alpha
-        if i == 0:
-            if alpha == True:
-                clonedDoc.setActiveNode(self.LAYER_DICT_GLOBAL["alpha"])
-                Application.action('convert_to_transparency_mask').trigger()
-            clonedDoc.save()
-        if i == 1:
-            self.export_texture(clonedDoc, alpha)
-        if i == 2:
-            Application.activeDocument().close()
-        if i == 3:
-            if os.path.exists(self.tempFileToDeleteGlobal):
-                os.remove(self.tempFileToDeleteGlobal)
-        if i < 4: QtCore.QTimer.singleShot(100, lambda: self.stepper_diffuse(i+1, clonedDoc, temp_alpha))
+# -------------------- EXPORT PIPELINES
+    def remove_temp_file(self):
+        if os.path.exists(self.tempFileToDeleteGlobal):
+            os.remove(self.tempFileToDeleteGlobal)
+
+    def add_background_layer(self, clonedDoc):
+        newNode = clonedDoc.createNode(str(self.LAYER_BACKGROUND), "paintlayer")
+        newNode.setBlendingMode("normal")
+        clonedDoc.rootNode().addChildNode(newNode, self.LAYER_DICT_GLOBAL["alpha"])
+
+    def convert_alpha_to_transparency_mask(self, clonedDoc):
+        clonedDoc.setActiveNode(self.LAYER_DICT_GLOBAL["alpha"])
+        Application.action('convert_to_transparency_mask').trigger()
+
+    def stepper_mask(self, clonedDoc):
+        idle = document_idle(clonedDoc)
+        return [
+            Stage("add background", lambda: self.add_background_layer(clonedDoc), idle),
+            Stage("fill background", lambda: self.set_foreground_color(clonedDoc, Application), idle),
+            Stage("alpha to mask", lambda: self.convert_alpha_to_transparency_mask(clonedDoc), idle),
+            Stage("to 8 bit", lambda: convert_to_8_bit(clonedDoc), idle),
+            Stage("export", lambda: self.export_texture(clonedDoc, True)),
+            Stage("close temp", lambda: clonedDoc.close(), always=True),
+            Stage("delete temp", self.remove_temp_file, always=True),
+        ]
+
+    def stepper_detail_mask(self, clonedDoc):
+        idle = document_idle(clonedDoc)
+        return [
+            Stage("to 8 bit", lambda: convert_to_8_bit(clonedDoc), idle),
+            Stage("export", lambda: self.export_texture(clonedDoc, False)),
+            Stage("close temp", lambda: clonedDoc.close(), always=True),
+            Stage("delete temp", self.remove_temp_file, always=True),
+        ]
+
+    def stepper_diffuse(self, clonedDoc, alpha):
+        idle = document_idle(clonedDoc)
+        stages = []
+        if alpha == True:
+            stages.append(Stage("alpha to mask", lambda: self.convert_alpha_to_transparency_mask(clonedDoc), idle))
+        stages += [
+            Stage("to 8 bit", lambda: convert_to_8_bit(clonedDoc), idle),
+            Stage("export", lambda: self.export_texture(clonedDoc, alpha)),
+            Stage("close temp", lambda: clonedDoc.close(), always=True),
+            Stage("delete temp", self.remove_temp_file, always=True),
+        ]
+        return stages
+
+    def run_pipeline(self, name, stages):
+        self.pipeline = Pipeline(name, stages, on_finished=self.pipeline_finished)
+        self.pipeline.run()
+
+    def pipeline_finished(self, pipeline):
+        print(pipeline.report())
+        if pipeline.error is not None:
+            QMessageBox.warning(self, "Texture Exporter", pipeline.name + " export failed: " + pipeline.error)
 
 # -------------------- CREATE NEW LAYERS BASED ON THE TYPE - METHODS
     def create_mask_layers(self):
@@ -186,13 +242,23 @@ class TextureExporterDock(DockWidget):
 
 # -------------------- PREPARE LAYER BEFORE EXPORT - METHODS
     def prepare_diffuse(self):
+        doc = Application.activeDocument()
+        index = self.check_roles(doc, layer_roles.DIFFUSE_ROLES)
+        if index is None:
+            return
+        if can_pack_directly(doc):
+            self.export_packed(doc, diffuse_output(doc, index))
+            return
+
         self.tempFileToDeleteGlobal = ""
 
         Application.setBatchmode(True)
         doc = Application.activeDocument()
-        doc.save()
+        with tracing.span("save", document=str(doc.fileName())):
+            doc.save()
 
-        clonedDoc = doc.clone()
+        with tracing.span("clone", document=str(doc.fileName())):
+            clonedDoc = doc.clone()
         Application.activeWindow().addView(clonedDoc)
         self.actviveDocName = str(doc.fileName())[:-4].strip()
         docTempName = self.actviveDocName + "_temp.kra"
@@ -204,20 +270,30 @@ class TextureExporterDock(DockWidget):
         self.LAYER_DICT_GLOBAL = layerDict
 
         if "alpha" in layerDict and layerDict["alpha"] is not None:
-            self.stepper_diffuse(0, clonedDoc, True)
+            self.run_pipeline("Diffuse", self.stepper_diffuse(clonedDoc, True))
         else:
-            self.stepper_diffuse(0, clonedDoc, False)
+            self.run_pipeline("Diffuse", self.stepper_diffuse(clonedDoc, False))
 
         Application.setBatchmode(False)
 
     def prepare_detail_mask(self):
+        doc = Application.activeDocument()
+        index = self.check_roles(doc, layer_roles.DETAIL_MASK_ROLES)
+        if index is None:
+            return
+        if can_pack_directly(doc):
+            self.export_packed(doc, detail_mask_output(doc, index))
+            return
+
         self.tempFileToDeleteGlobal = ""
 
         Application.setBatchmode(True)
         doc = Application.activeDocument()
-        doc.save()
+        with tracing.span("save", document=str(doc.fileName())):
+            doc.save()
 
-        clonedDoc = doc.clone()
+        with tracing.span("clone", document=str(doc.fileName())):
+            clonedDoc = doc.clone()
         Application.activeWindow().addView(clonedDoc)
         self.actviveDocName = str(doc.fileName())[:-4].strip()
         docTempName = self.actviveDocName + "_temp.kra"
@@ -237,18 +313,28 @@ class TextureExporterDock(DockWidget):
         if "blue" in layerDict and layerDict["blue"] is not None:
             layerDict["blue"].setBlendingMode("copy_blue")
 
-        self.stepper_detail_mask(0, clonedDoc)
+        self.run_pipeline("Detail Mask", self.stepper_detail_mask(clonedDoc))
 
         Application.setBatchmode(False)
 
     def prepare_mask(self):
+        doc = Application.activeDocument()
+        index = self.check_roles(doc, layer_roles.MASK_ROLES, (self.MASK_ALPHA,))
+        if index is None:
+            return
+        if can_pack_directly(doc):
+            self.export_packed(doc, mask_output(doc, index))
+            return
+
         self.tempFileToDeleteGlobal = ""
 
         Application.setBatchmode(True)
         doc = Application.activeDocument()
-        doc.save()
+        with tracing.span("save", document=str(doc.fileName())):
+            doc.save()
 
-        clonedDoc = doc.clone()
+        with tracing.span("clone", document=str(doc.fileName())):
+            clonedDoc = doc.clone()
         Application.activeWindow().addView(clonedDoc)
         self.actviveDocName = str(doc.fileName())[:-4].strip()
         docTempName = self.actviveDocName + "_temp.kra"
@@ -269,52 +355,82 @@ class TextureExporterDock(DockWidget):
             layerDict["blue"].setBlendingMode("copy_blue")
 
         if "alpha" in layerDict and layerDict["alpha"] is not None:
-            self.stepper_mask(0, clonedDoc)
+            self.run_pipeline("Mask", self.stepper_mask(clonedDoc))
 
         Application.setBatchmode(False)
 
+    def check_roles(self, doc, roles, required=()):
+        """The role index of the document, None after telling the user why it cannot be exported."""
+        index = layer_roles.RoleIndex(doc)
+        problems = index.problems(roles, required)
+        if problems:
+            QMessageBox.warning(self, "Texture Exporter", "Cannot export:\n" + "\n".join(problems))
+            return None
+        return index
+
 # -------------------- EXPORT
+    def resolution_sizes(self):
+        return parse_sizes(self.sizesBox.text())
+
+    def rle(self):
+        return self.rleBox.isChecked()
+
+    def export_file_path(self):
+        return self.exportPathGlobal + '/' + self.actviveDocName.split('/')[-1].strip() + '.tga'
+
+    def export_packed(self, doc, output):
+        self.actviveDocName = str(doc.fileName())[:-4].strip()
+        if len(str(self.exportPathGlobal)) == 0:
+            return
+
+        with tracing.span("export " + output.name):
+            statuses = export_outputs(doc, [(output, self.export_file_path())], self.exportCache, self.resolution_sizes(), self.rle())
+        for path, status in statuses.items():
+            print(path + ": " + status)
+
+    def export_all_open(self):
+        if len(str(self.exportPathGlobal)) == 0:
+            return
+        self.show_export_summary(export_documents(Application.documents(), self.exportPathGlobal, self.exportCache, self.resolution_sizes(), self.rle()))
+
+    def export_all_folder(self):
+        if len(str(self.exportPathGlobal)) == 0:
+            return
+        folder = QFileDialog.getExistingDirectory(self, "Folder with .kra files", self.DEPOTROOT + "\\" + self.DEPOT)
+        if folder:
+            self.show_export_summary(export_files([folder], self.exportPathGlobal, self.resolution_sizes(), self.rle()))
+
+    def write_trace(self):
+        QMessageBox.information(self, "Texture Exporter", "Export trace written to " + tracing.write_chrome_trace())
+
+    def show_export_summary(self, results):
+        summary = format_summary(results)
+        print(summary)
+        QMessageBox.information(self, "Texture Exporter", summary)
+
     def export_texture(self, currentDocument, alpha):
         if len(str(self.exportPathGlobal)) != 0:
-            exportParameters = InfoObject()
-            exportParameters.setProperty("alpha", alpha)
-            exportParameters.setProperty("compression", 1)
-            exportParameters.setProperty("forceSRGB", False)
-            exportParameters.setProperty("indexed", False)
-            exportParameters.setProperty("interlaced", False)
-            exportParameters.setProperty("saveSRGBProfile", False)
-            currentDocument.exportImage(self.exportPathGlobal + '/' + self.actviveDocName.split('/')[-1].strip() + '.tga', exportParameters )
+            with tracing.span("write tga", path=self.export_file_path()):
+                digests = {}
+                changed = write_document(currentDocument, self.export_file_path(), alpha, self.rle(), digests)
+            # the source document was saved before it was cloned
+            settings = {"output": self.pipeline.name, "rle": self.rle(), "size": max(currentDocument.width(), currentDocument.height())}
+            record_manifest(self.actviveDocName + ".kra", os.path.basename(self.actviveDocName), [(self.export_file_path(), settings)],
+                            digests=digests)
+            if not changed:
+                print("Texture Exporter: " + self.export_file_path() + " unchanged, the old file was kept")
+            elif tracing.enabled:
+                tracing.count("textures exported")
+                tracing.count("bytes written", os.path.getsize(self.export_file_path()))
 
     def create_mask_layer_dict(self, doc):
-        layerDict = {}
-        for node in doc.topLevelNodes():
-            if self.MASK_RED in node.name():
-                layerDict["red"] = node
-            if self.MASK_GREEN in node.name():
-                layerDict["green"] = node
-            if self.MASK_BLUE in node.name():
-                layerDict["blue"] = node
-            if self.MASK_ALPHA in node.name():
-                layerDict["alpha"] = node
-        return layerDict
+        return layer_roles.create_mask_layer_dict(doc)
 
     def create_detail_mask_layer_dict(self, doc):
-        layerDict = {}
-        for node in doc.topLevelNodes():
-            if self.LAYER_MASK_RED in node.name():
-                layerDict["red"] = node
-            if self.LAYER_MASK_GREEN in node.name():
-                layerDict["green"] = node
-            if self.LAYER_MASK_BLUE in node.name():
-                layerDict["blue"] = node
-        return layerDict
+        return layer_roles.create_detail_mask_layer_dict(doc)
 
     def create_diffuse_layer_dict(self, doc):
-        layerDict = {}
-        for node in doc.topLevelNodes():
-            if self.LAYER_DIFFUSE_ALPHA in node.name():
-                layerDict["alpha"] = node
-        return layerDict
+        return layer_roles.create_diffuse_layer_dict(doc)
 
 
     def set_foreground_color(self, doc, app):
@@ -356,20 +472,12 @@ class TextureExporterDock(DockWidget):
         Application.activeWindow().activeView().setForeGroundColor(bgColor)
 
     def create_layers_based_on_type(self, groupArray):
-        # TODO: add check if any document is opened
-        Application.setBatchmode(True)
         doc = Application.activeDocument()
-        root = doc.rootNode()
-
-        for group in groupArray:
-            group = doc.createNode(group, "groupLayer")
-            root.addChildNode(group, None)
-            new_layer = doc.createNode("empty", "paintLayer")
-            group.addChildNode(new_layer, None)
-            doc.setActiveNode(new_layer)
-            Application.action('fill_selection_foreground_color').trigger()
-
-        doc.refreshProjection()
-
+        if doc is None:
+            return
+        Application.setBatchmode(True)
+        with tracing.span("create layers", document=str(doc.fileName()), groups=len(groupArray)):
+            added = scaffold_roles(doc, groupArray)
+        print("Texture Exporter: added " + (", ".join(added) if added else "no layers, every group exists"))
 
 Application.addDockWidgetFactory(DockWidgetFactory("textureExporter", DockWidgetFactoryBase.DockRight, TextureExporterDock))
\ No newline at end of file
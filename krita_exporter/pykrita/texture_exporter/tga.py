@@ -0,0 +1,179 @@
+####################################################################################################
+## Minimal TGA writer for packed BGR/BGRA pixel data.
+## Images are stored with a top-left origin, so rows can be written in the order Krita returns
+## them, one band at a time. They are uncompressed unless run length encoding is asked for.
+## RLE packets never cross a scanline. Runs are found without a per-pixel Python loop: a band is
+## XORed with itself shifted by one pixel as one big integer, the result is reduced to one
+## changed / unchanged byte per pixel and a regular expression finds the unchanged stretches.
+## TgaWriter encodes and writes on a worker thread while the caller packs the next band, and hashes
+## what it writes on the way, so the file does not have to be read again for its digest().
+####################################################################################################
+
+import re
+import queue
+import hashlib
+import struct
+import threading
+
+
+TGA_TRUECOLOR       = 2
+TGA_RLE_TRUECOLOR   = 10
+TGA_TOP_LEFT        = 0x20
+TGA_HEADER_SIZE     = 18
+
+MAX_PACKET          = 128
+MIN_RUN             = 3
+QUEUED_BANDS        = 2
+
+_NONZERO        = bytes((0,)) + bytes((1,)) * 255
+_RUN            = re.compile(b"\x00{%d,}" % (MIN_RUN - 1))
+_RAW_HEADERS    = [bytes((n,)) for n in range(MAX_PACKET)]
+_RUN_HEADERS    = [bytes((0x80 | n,)) for n in range(MAX_PACKET)]
+
+
+def tga_header(width, height, alpha, rle=False):
+    descriptor = TGA_TOP_LEFT | (8 if alpha else 0)
+    return struct.pack("<BBBHHBHHHHBB",
+        0,                  # id length
+        0,                  # no color map
+        TGA_RLE_TRUECOLOR if rle else TGA_TRUECOLOR,
+        0, 0, 0,            # color map spec
+        0, 0,               # x, y origin
+        width, height,
+        32 if alpha else 24,
+        descriptor,
+    )
+
+
+# -------------------- RLE
+def pixel_changes(pixels, stride):
+    """One byte per pixel, 1 where the pixel differs from the one before it (always for the first)."""
+    count = len(pixels) // stride
+    if count < 2:
+        return bytearray(b"\x01" * count)
+    # lane k of the XOR is pixel k against pixel k + 1, folding its bytes into the lowest one
+    # leaves that byte zero only when the two pixels are equal
+    image = int.from_bytes(pixels, "little")
+    diff = image ^ (image >> (8 * stride))
+    folded = diff
+    for offset in range(1, stride):
+        folded |= diff >> (8 * offset)
+    changed = folded.to_bytes(len(pixels), "little")[0:(count - 1) * stride:stride]
+    return bytearray(b"\x01") + changed.translate(_NONZERO)
+
+def rle_encode(pixels, width, stride):
+    """Run length encode whole scanlines of packed pixels into TGA packets."""
+    pixels = memoryview(pixels)
+    count = len(pixels) // stride
+    flags = pixel_changes(pixels, stride)
+    # a run never continues into the next scanline
+    flags[0::width] = b"\x01" * len(range(0, count, width))
+
+    packets = []
+    position = 0
+    for run in _RUN.finditer(flags):
+        start, end = run.start() - 1, run.end()
+        _raw_packets(packets, pixels, position, start, width, stride)
+        pixel = pixels[start * stride:(start + 1) * stride]
+        while start < end:
+            n = min(MAX_PACKET, end - start)
+            packets.append(_RUN_HEADERS[n - 1])
+            packets.append(pixel)
+            start += n
+        position = end
+    _raw_packets(packets, pixels, position, count, width, stride)
+    return b"".join(packets)
+
+def _raw_packets(packets, pixels, start, end, width, stride):
+    while start < end:
+        n = min(MAX_PACKET, end - start, width - start % width)
+        packets.append(_RAW_HEADERS[n - 1])
+        packets.append(pixels[start * stride:(start + n) * stride])
+        start += n
+
+
+# -------------------- FILES
+def write_tga(path, width, height, pixels, alpha, rle=False):
+    with open(path, "wb") as file:
+        file.write(tga_header(width, height, alpha, rle))
+        file.write(rle_encode(pixels, width, 4 if alpha else 3) if rle else pixels)
+
+class TgaWriter:
+    """Streams bands of packed rows, top to bottom, into a TGA file from a worker thread."""
+
+    def __init__(self, path, width, height, alpha, rle=False):
+        self.path = path
+        self.width = width
+        self.stride = 4 if alpha else 3
+        self.rle = rle
+        self.error = None
+        self.file = open(path, "wb")
+        self.hash = hashlib.sha256()
+        header = tga_header(width, height, alpha, rle)
+        self.file.write(header)
+        self.hash.update(header)
+        self.bands = queue.Queue(QUEUED_BANDS)
+        self.thread = threading.Thread(target=self._run, name="tga_writer", daemon=True)
+        self.thread.start()
+
+    def write(self, rows):
+        """Queue a band, it is written later and must not be changed by the caller afterwards."""
+        if self.error is not None:
+            raise self.error
+        self.bands.put(rows)
+
+    def _run(self):
+        while True:
+            rows = self.bands.get()
+            if rows is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                data = rle_encode(rows, self.width, self.stride) if self.rle else rows
+                self.file.write(data)
+                self.hash.update(data)
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        """Wait for the queued bands, raises the error the worker ran into."""
+        self.bands.put(None)
+        self.thread.join()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+    def digest(self):
+        """Hash of the whole file once closed, the same as export_cache.file_digest()."""
+        return self.hash.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+class TgaPatcher:
+    """Rewrites bands of rows in place in an uncompressed TGA file written by TgaWriter."""
+
+    def __init__(self, path, width, stride):
+        self.file = open(path, "r+b")
+        self.row_bytes = width * stride
+
+    def read(self, y, rows):
+        self.file.seek(TGA_HEADER_SIZE + y * self.row_bytes)
+        return bytearray(self.file.read(rows * self.row_bytes))
+
+    def write(self, y, data):
+        self.file.seek(TGA_HEADER_SIZE + y * self.row_bytes)
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+def write_tga_tiles(path, width, height, tiles, alpha, rle=False):
+    with TgaWriter(path, width, height, alpha, rle) as writer:
+        for tile in tiles:
+            writer.write(tile)
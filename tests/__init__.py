@@ -0,0 +1,16 @@
+"""Unit tests of both exporters, run headless against the fakes in benchmarks/fakes.
+
+    python -m unittest discover -s tests -t .
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, "benchmarks"), os.path.join(ROOT, "krita_exporter", "pykrita")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import fakes
+fakes.install()
@@ -0,0 +1,31 @@
+"""Stand-in for `blender --background ... export_worker()`, speaks the worker pool protocol.
+
+The node name picks what a job does: "fail" raises, "crash" kills the process, "slow" takes a
+minute. Every other job writes a small file to its path.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tests
+from fbx_exporter.worker_pool import run_worker
+
+
+def export_job(node_name, export_path):
+    print("exporting " + node_name)
+    if "fail" in node_name:
+        raise RuntimeError("stub failure")
+    if "crash" in node_name:
+        sys.stdout.flush()
+        os._exit(3)
+    if "slow" in node_name:
+        time.sleep(60)
+    with open(export_path, "w") as file:
+        file.write(node_name)
+    return {"saved": 1}
+
+if __name__ == "__main__":
+    run_worker(export_job)
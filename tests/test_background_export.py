@@ -0,0 +1,185 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import fakes
+from fakes import bpy
+
+import fbx_exporter
+from fbx_exporter.p4_session import P4Session
+from .test_p4_session import CONFIG
+from .test_worker_pool import STUB_WORKER
+
+
+exporter = sys.modules["fbx_exporter.fbx_exporter"]
+
+
+class ExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        os.chdir(self.directory)
+        self.addCleanup(os.chdir, self.cwd)
+        with open(".p4config", "w") as file:
+            file.write(CONFIG)
+        self.environ = os.environ.pop("P4CONFIG", None)
+        fbx_exporter.p4_sessions.sessions.clear()
+
+        fbx_exporter.register()
+        self.scene = bpy.build_scene(40)
+        for node in self.scene.export_nodes:
+            os.makedirs(os.path.dirname(fbx_exporter.get_export_path(node)), exist_ok=True)
+        patch = mock.patch.object(exporter, "worker_command", lambda blend_copy: STUB_WORKER)
+        patch.start()
+        self.addCleanup(patch.stop)
+        fakes.calls.clear()
+
+    def tearDown(self):
+        if self.environ is not None:
+            os.environ["P4CONFIG"] = self.environ
+
+    def rename_nodes(self, tag):
+        for node in self.scene.export_nodes:
+            node.name = node.name.replace(fbx_exporter.EXPORT_NODE_PREFIX, fbx_exporter.EXPORT_NODE_PREFIX + tag)
+        bpy.data.objects = {o.name: o for o in self.scene.objects}
+
+    def write_have_revisions(self):
+        paths = [fbx_exporter.get_export_path(node) for node in self.scene.export_nodes]
+        for path in paths:
+            with open(path, "w") as file:
+                file.write("have revision")
+        return paths
+
+
+class BackgroundExportTests(ExportTestCase):
+    def run_export(self, export, until=None):
+        deadline = time.time() + 30
+        while not export.step():
+            if until is not None and until(export):
+                return export
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        export.close()
+        return export
+
+    def test_export_and_skip_unchanged(self):
+        # the stub worker writes no batching sidecars
+        for node in self.scene.export_nodes:
+            node.fbx_export_isStatic = False
+        export = self.run_export(exporter.BackgroundExport(False, 2))
+        self.assertEqual(sorted(r.status for r in export.results), ["exported"] * bpy.EXPORT_NODES)
+        self.assertFalse(os.path.isdir(export.temp_dir))
+        for node in self.scene.export_nodes:
+            self.assertTrue(os.path.isfile(fbx_exporter.get_export_path(node)))
+
+        export = self.run_export(exporter.BackgroundExport(False, 2))
+        self.assertEqual(sorted(r.status for r in export.results), ["unchanged"] * bpy.EXPORT_NODES)
+        self.assertIsNone(export.pool)
+
+    def test_node_removed_while_planning(self):
+        export = exporter.BackgroundExport(False, 2)
+        with mock.patch.object(exporter, "STEP_SECONDS", 0):
+            export.step()
+        removed = self.scene.export_nodes[-1]
+        del bpy.data.objects[removed.name]
+        self.run_export(export)
+        statuses = {r.node: r.status for r in export.results}
+        self.assertEqual(statuses[removed.name], "skipped: removed while planning")
+
+    def test_cancel_reverts_checkouts(self):
+        self.rename_nodes("slow_")
+        paths = self.write_have_revisions()
+
+        export = self.run_export(exporter.BackgroundExport(True, 2), lambda e: e.status == "Exporting")
+        export.cancel()
+        self.run_export(export)
+        self.assertEqual(sorted(r.status for r in export.results), ["cancelled"] * bpy.EXPORT_NODES)
+        self.assertEqual(fakes.calls["p4 edit"], 1)
+        self.assertEqual(fakes.calls["p4 revert"], 1)
+        for path in paths:
+            with open(path) as file:
+                self.assertEqual(file.read(), "have revision")
+
+    def test_failed_node_is_reverted(self):
+        for node in self.scene.export_nodes:
+            node.fbx_export_isStatic = False
+        failed = self.scene.export_nodes[0]
+        failed.name = failed.name.replace(fbx_exporter.EXPORT_NODE_PREFIX, fbx_exporter.EXPORT_NODE_PREFIX + "fail_")
+        bpy.data.objects = {o.name: o for o in self.scene.objects}
+        self.write_have_revisions()
+        with mock.patch.object(P4Session, "revert", autospec=True) as revert:
+            export = self.run_export(exporter.BackgroundExport(True, 2))
+        statuses = {r.node: r.status for r in export.results}
+        self.assertTrue(statuses.pop(failed.name).startswith("failed"))
+        self.assertEqual(revert.call_args[0][1], [fbx_exporter.get_export_path(failed)])
+
+    def test_error_ends_the_export(self):
+        operator = exporter.ExportAllBackgroundOperator()
+        operator._timer = None
+        context = SimpleNamespace(window_manager=SimpleNamespace(event_timer_remove=lambda timer: None),
+                                  screen=SimpleNamespace(areas=[]))
+        exporter.background_export = export = exporter.BackgroundExport(True, 2)
+        with mock.patch.object(exporter, "check_out_exported_files", side_effect=RuntimeError("P4 down")):
+            with self.assertRaises(RuntimeError):
+                while operator.modal(context, SimpleNamespace(type='TIMER')) == {'PASS_THROUGH'}:
+                    pass
+        self.assertIsNone(exporter.background_export)
+        self.assertFalse(os.path.isdir(export.temp_dir))
+
+
+class ExportAllTests(ExportTestCase):
+    def fail_node(self, failed):
+        write_fbx = exporter.write_fbx
+
+        def write(export_path):
+            if export_path == fbx_exporter.get_export_path(failed):
+                raise RuntimeError("export failed")
+            write_fbx(export_path)
+        patch = mock.patch.object(exporter, "write_fbx", write)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_failed_node_is_reverted(self):
+        failed = self.scene.export_nodes[1]
+        self.fail_node(failed)
+        paths = self.write_have_revisions()
+        with mock.patch.object(P4Session, "revert", autospec=True) as revert:
+            results = exporter.export_all_nodes(True)
+        self.assertEqual(sum(1 for r in results if r.status == "failed: export failed"), 1)
+        self.assertEqual(revert.call_args[0][1], [fbx_exporter.get_export_path(failed)])
+        self.assertEqual(fakes.calls["p4 edit"], 1)
+        self.assertEqual(fakes.calls["p4 add"], 1)
+        with open(paths[1]) as file:
+            self.assertEqual(file.read(), "have revision")
+
+    def test_new_files_are_added_once_written(self):
+        failed = self.scene.export_nodes[1]
+        self.fail_node(failed)
+        with mock.patch.object(exporter, "check_out_exported_files", wraps=exporter.check_out_exported_files) as check_out:
+            exporter.export_all_nodes(True)
+        self.assertEqual(check_out.call_count, 2)
+        added = check_out.call_args[0][0]
+        self.assertNotIn(fbx_exporter.get_export_path(failed), added)
+        self.assertIn(fbx_exporter.get_export_path(self.scene.export_nodes[0]), added)
+        self.assertEqual(fakes.calls["p4 edit"], 0)
+        self.assertEqual(fakes.calls["p4 revert"], 0)
+
+    def test_report_counts_written_nodes_only(self):
+        results = [exporter.ExportResult("a", "", status, 0.0) for status in
+                   ("exported", "exported", "unchanged", "identical, reverted", "skipped: missing name or path")]
+        self.assertEqual(exporter.export_report(results),
+                         ({'WARNING'}, "Exported 2 export nodes, 1 identical and reverted, 1 unchanged, 1 skipped"))
+        results.append(exporter.ExportResult("b", "", "failed: worker exited", 0.0))
+        self.assertEqual(exporter.export_report(results)[1],
+                         "Exported 2 export nodes, 1 identical and reverted, 1 unchanged, 1 skipped, 1 failed, see console")
+        self.assertEqual(exporter.export_report(results[:3]), ({'INFO'}, "Exported 2 export nodes, 1 unchanged"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from texture_exporter.channel_packing import (ALPHA, BLUE, GREEN, RED, DETAIL_MASK_LAYOUT, DIFFUSE_LAYOUT, MASK_LAYOUT,
+                                              pack_channels, pack_tiles, tile_rows)
+
+
+def _bgra(*pixels):
+    """BGRA pixel data from (r, g, b, a) tuples, the order Krita hands out."""
+    return bytes(value for r, g, b, a in pixels for value in (b, g, r, a))
+
+def _channel(packed, stride, offset):
+    return list(packed[offset::stride])
+
+
+class PackChannelsTests(unittest.TestCase):
+    def test_mask_channels_come_from_their_groups(self):
+        sources = {
+            "red":   _bgra((10, 1, 2, 255), (11, 1, 2, 255)),
+            "green": _bgra((3, 20, 4, 255), (3, 21, 4, 255)),
+            "blue":  _bgra((5, 6, 30, 255), (5, 6, 31, 255)),
+            # a greyscale group, its red channel is the value
+            "alpha": _bgra((40, 40, 40, 255), (41, 41, 41, 128)),
+        }
+        packed = pack_channels(2, MASK_LAYOUT, sources)
+        self.assertEqual(len(packed), 8)
+        self.assertEqual(_channel(packed, 4, RED), [10, 11])
+        self.assertEqual(_channel(packed, 4, GREEN), [20, 21])
+        self.assertEqual(_channel(packed, 4, BLUE), [30, 31])
+        self.assertEqual(_channel(packed, 4, ALPHA), [40, 41])
+
+    def test_three_channel_layout_is_bgr(self):
+        sources = {key: _bgra((7, 8, 9, 255)) for key in ("red", "green", "blue")}
+        self.assertEqual(bytes(pack_channels(1, DETAIL_MASK_LAYOUT, sources)), bytes((9, 8, 7)))
+
+    def test_missing_groups(self):
+        packed = pack_channels(3, MASK_LAYOUT, {"green": _bgra(*[(0, 50, 0, 255)] * 3)})
+        self.assertEqual(_channel(packed, 4, RED), [0] * 3)
+        self.assertEqual(_channel(packed, 4, GREEN), [50] * 3)
+        self.assertEqual(_channel(packed, 4, ALPHA), [255] * 3)
+
+    def test_diffuse_with_alpha(self):
+        sources = {"diffuse": _bgra((100, 110, 120, 255)), "alpha": _bgra((60, 60, 60, 255))}
+        self.assertEqual(bytes(pack_channels(1, DIFFUSE_LAYOUT, sources)), bytes((120, 110, 100, 60)))
+
+    def test_repack_only_changed_keys(self):
+        sources = {key: _bgra((1, 1, 1, 255)) for key in ("red", "green", "blue", "alpha")}
+        packed = pack_channels(1, MASK_LAYOUT, sources)
+        sources = {key: _bgra((9, 9, 9, 255)) for key in ("red", "green", "blue", "alpha")}
+        pack_channels(1, MASK_LAYOUT, sources, packed, {"green"})
+        self.assertEqual(bytes(packed), bytes((1, 9, 1, 1)))
+
+    def test_wrong_size(self):
+        with self.assertRaises(ValueError):
+            pack_channels(2, MASK_LAYOUT, {"red": _bgra((1, 2, 3, 4))})
+
+
+class PackTilesTests(unittest.TestCase):
+    def test_tiles_match_whole_image(self):
+        width, height = 5, 7
+        images = {key: bytes((i * 7 + seed) % 256 for i in range(width * height * 4))
+                  for seed, key in enumerate(("red", "green", "blue"))}
+
+        def read_rect(key, x, y, w, h):
+            if key not in images:
+                return None
+            return images[key][y * width * 4:(y + h) * width * 4]
+
+        tiles = list(pack_tiles(width, height, MASK_LAYOUT, read_rect, rows=3))
+        self.assertEqual([len(tile) for tile in tiles], [width * 3 * 4, width * 3 * 4, width * 4])
+        self.assertEqual(b"".join(tiles), bytes(pack_channels(width * height, MASK_LAYOUT, images)))
+
+    def test_tile_rows(self):
+        self.assertEqual(tile_rows(1024, 4 * 1024 * 16), 16)
+        self.assertEqual(tile_rows(1 << 20, 1024), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
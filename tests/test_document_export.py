@@ -0,0 +1,208 @@
+import os
+import shutil
+import tempfile
+import zipfile
+import unittest
+from unittest import mock
+
+from fakes import krita
+
+from texture_exporter import document_export
+from texture_exporter.document_export import diffuse_output, export_outputs, mask_output
+from texture_exporter.kra_reader import KraDocument
+from texture_exporter.export_cache import TextureExportCache
+from texture_exporter.resolution_chain import level_path
+from texture_exporter.tga import TGA_HEADER_SIZE
+
+from .test_kra_reader import layer, solid, tile_file
+
+
+SIZES = (32, 16)
+OLD = 1000000000
+
+
+class DocumentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.doc = krita.build_document(os.path.join(self.directory, "rock.kra"), 64, krita.MASK_ROLES)
+        self.path = os.path.join(self.directory, "rock.tga")
+        self.files = [self.path] + [level_path(self.path, size) for size in SIZES]
+
+    def export(self):
+        output = mask_output(self.doc)
+        return export_outputs(self.doc, [(output, self.path)], None, SIZES)
+
+    def age(self):
+        for path in self.files:
+            os.utime(path, (OLD, OLD))
+
+
+class LevelTests(DocumentTestCase):
+    def test_identical_levels_are_left_alone(self):
+        self.export()
+        self.age()
+        self.assertEqual(self.export(), {self.path: "unchanged"})
+        for path in self.files:
+            self.assertEqual(os.path.getmtime(path), OLD)
+        self.assertEqual([f for f in os.listdir(self.directory) if f.endswith(".tmp")], [])
+
+    def test_changed_levels_are_replaced(self):
+        self.export()
+        self.age()
+        mask_output(self.doc).layerDict["red"].seed += 1
+        self.assertEqual(self.export(), {self.path: "exported"})
+        for path in self.files:
+            self.assertNotEqual(os.path.getmtime(path), OLD)
+        self.assertEqual([f for f in os.listdir(self.directory) if f.endswith(".tmp")], [])
+
+
+class NewOutputTests(DocumentTestCase):
+    def test_failed_export_leaves_no_file(self):
+        output = mask_output(self.doc)
+        output.layerDict["red"].projectionPixelData = lambda x, y, w, h: b"short"
+        with self.assertRaises(ValueError):
+            export_outputs(self.doc, [(output, self.path)], None, SIZES)
+        self.assertEqual(sorted(os.listdir(self.directory)), ["rock.kra"])
+
+    def test_new_output_is_moved_into_place(self):
+        opened = []
+        real_open = open
+
+        def watch(path, *args, **kwargs):
+            opened.append(path)
+            return real_open(path, *args, **kwargs)
+
+        with mock.patch("builtins.open", watch):
+            self.export()
+        self.assertNotIn(self.path, opened)
+        self.assertTrue(os.path.isfile(self.path))
+
+
+class CacheTests(DocumentTestCase):
+    def setUp(self):
+        super().setUp()
+        # several bands in a small document
+        patcher = mock.patch.object(document_export, "tile_rows", lambda width: 8)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = TextureExportCache()
+        self.rle = False
+
+    def export(self, cache=True, path=None):
+        output = mask_output(self.doc)
+        statuses = export_outputs(self.doc, [(output, path or self.path)], self.cache if cache else None, SIZES, self.rle)
+        return statuses[path or self.path]
+
+    def edit_row(self, key, row):
+        node = mask_output(self.doc).layerDict[key]
+        read = node.projectionPixelData
+
+        def pixels(x, y, w, h):
+            data = bytearray(read(x, y, w, h))
+            if y <= row < y + h:
+                start = (row - y) * w * 4
+                data[start:start + w * 4] = bytes(255 - v for v in data[start:start + w * 4])
+            return bytes(data)
+        node.projectionPixelData = pixels
+
+    def assert_same_as_fresh_export(self):
+        fresh = os.path.join(self.directory, "fresh")
+        os.makedirs(fresh)
+        fresh_path = os.path.join(fresh, "rock.tga")
+        self.export(cache=False, path=fresh_path)
+        for path in [self.path] + [level_path(self.path, size) for size in SIZES]:
+            other = os.path.join(fresh, os.path.basename(path))
+            with open(path, "rb") as a, open(other, "rb") as b:
+                self.assertEqual(a.read(), b.read(), os.path.basename(path))
+
+    def test_changed_band_is_patched_in_place(self):
+        self.assertEqual(self.export(), "exported")
+        inode = os.stat(self.path).st_ino
+        self.edit_row("red", 20)
+        self.assertEqual(self.export(), "updated red")
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+        self.assert_same_as_fresh_export()
+
+    def test_changed_band_of_rle_output(self):
+        self.rle = True
+        self.export()
+        self.edit_row("green", 50)
+        self.assertEqual(self.export(), "updated green")
+        self.assert_same_as_fresh_export()
+
+    def test_untouched_output_is_unchanged(self):
+        self.export()
+        self.age()
+        self.assertEqual(self.export(), "unchanged")
+        for path in self.files:
+            self.assertEqual(os.path.getmtime(path), OLD)
+
+    def test_output_changed_outside_is_exported_again(self):
+        self.export()
+        size = os.path.getsize(self.path)
+        with open(self.path, "wb") as file:
+            file.write(bytes(size))
+        self.edit_row("red", 20)
+        self.assertEqual(self.export(), "exported")
+        self.assert_same_as_fresh_export()
+
+    def test_moved_or_deleted_output_is_exported_again(self):
+        self.export()
+        os.replace(self.path, self.path + ".moved")
+        self.assertEqual(self.export(), "exported")
+        os.remove(self.path)
+        self.assertEqual(self.export(), "exported")
+        self.assert_same_as_fresh_export()
+
+    def test_least_recently_used_document_is_evicted(self):
+        cache = TextureExportCache(max_documents=2)
+        a = cache.document("a.kra", (64, 64, 8))
+        cache.document("b.kra", (64, 64, 8))
+        self.assertIs(cache.document("a.kra", (64, 64, 8)), a)
+        cache.document("c.kra", (64, 64, 8))
+        self.assertEqual(list(cache.documents), ["a.kra", "c.kra"])
+        cache.document("d.kra", (64, 64, 8))
+        self.assertEqual(list(cache.documents), ["c.kra", "d.kra"])
+
+    def test_other_geometry_resets_the_document(self):
+        entry = self.cache.document("a.kra", (64, 64, 8))
+        entry.outputs["rock.tga"] = {}
+        self.assertEqual(self.cache.document("a.kra", (64, 64, 16)).outputs, {})
+
+
+class DiffuseTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def test_paint_outside_the_diffuse_group_is_kept(self):
+        # _ALPHA on top, _DIFFUSE paints the left tile, a decal outside both the right one
+        alpha = ('<layer name="Rock_ALPHA" nodetype="grouplayer" uuid="{alpha}"><layers>'
+                 + layer("alpha") + '</layers></layer>')
+        diffuse = ('<layer name="Rock_DIFFUSE" nodetype="grouplayer" uuid="{diffuse}"><layers>'
+                   + layer("paint") + '</layers></layer>')
+        files = {"alpha": tile_file({(0, 0): solid(128, 128, 128, 255), (64, 0): solid(128, 128, 128, 255)}),
+                 "paint": tile_file({(0, 0): solid(0, 0, 255, 255)}),
+                 "decal": tile_file({(64, 0): solid(255, 0, 0, 255)})}
+        kra = os.path.join(self.directory, "rock.kra")
+        with zipfile.ZipFile(kra, "w") as archive:
+            archive.writestr("maindoc.xml", '<DOC><IMAGE name="rock" width="128" height="64" colorspacename="RGBA"><layers>'
+                                            + alpha + diffuse + layer("decal") + '</layers></IMAGE></DOC>')
+            for name, data in files.items():
+                archive.writestr("rock/layers/" + name, data)
+        doc = KraDocument(kra)
+        self.addCleanup(doc.close)
+
+        path = os.path.join(self.directory, "rock.tga")
+        export_outputs(doc, [(diffuse_output(doc), path)])
+        with open(path, "rb") as file:
+            pixels = file.read()[TGA_HEADER_SIZE:]
+        self.assertEqual(tuple(pixels[0:4]), (0, 0, 255, 128))
+        self.assertEqual(tuple(pixels[64 * 4:65 * 4]), (255, 0, 0, 128))
+        # the _ALPHA group is shown again
+        self.assertEqual(tuple(doc.pixelData(0, 0, 1, 1)), (128, 128, 128, 255))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import sys
+import subprocess
+import unittest
+from array import array
+from types import SimpleNamespace
+
+from . import ROOT
+
+from fakes import bpy
+import fbx_exporter
+from fbx_exporter.export_cache import fingerprint_node
+
+
+FINGERPRINT_SCRIPT = """
+import sys
+sys.path[:0] = [{root!r}, {benchmarks!r}]
+import fakes
+fakes.install()
+from fakes import bpy
+from types import SimpleNamespace
+import fbx_exporter
+from fbx_exporter.export_cache import fingerprint_node
+scene = bpy.build_scene(40)
+node = scene.export_nodes[0]
+objects = fbx_exporter.get_subtree(node, fbx_exporter.build_children_index(scene.objects))
+modifier = bpy.Modifier("Mirror")
+modifier.bl_rna = SimpleNamespace(properties=[SimpleNamespace(identifier="use_axis"), SimpleNamespace(identifier="flags")])
+modifier.use_axis = (True, False, False)
+modifier.flags = {{"X", "Y", "Z", "NEGATIVE_X", "NEGATIVE_Y"}}
+objects[1].modifiers.append(modifier)
+print(fingerprint_node(node, objects, fbx_exporter.FBX_EXPORT_OPTIONS, bpy.context.evaluated_depsgraph_get()))
+"""
+
+
+class FingerprintTests(unittest.TestCase):
+    def test_same_across_hash_seeds(self):
+        script = FINGERPRINT_SCRIPT.format(root=ROOT, benchmarks=os.path.join(ROOT, "benchmarks"))
+        fingerprints = set()
+        for seed in ("1", "2", "3"):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+            fingerprints.add(output.stdout.strip())
+        self.assertEqual(len(fingerprints), 1)
+
+
+class Vertices(bpy.MeshData):
+    def __init__(self, co, groups):
+        super().__init__(len(groups), co=co)
+        self.groups = groups
+
+    def __iter__(self):
+        return (SimpleNamespace(groups=groups) for groups in self.groups)
+
+def _weights(*weights):
+    return [[SimpleNamespace(group=0, weight=weight)] for weight in weights]
+
+class Keyframes(bpy.MeshData):
+    def __iter__(self):
+        return (SimpleNamespace(interpolation="BEZIER") for _ in range(self.length))
+
+
+class FingerprintInputTests(unittest.TestCase):
+    """Everything the FBX exporter writes changes the fingerprint."""
+
+    def setUp(self):
+        scene = bpy.build_scene(40)
+        bpy.context.scene.frame_start, bpy.context.scene.frame_end, bpy.context.scene.frame_step = 1, 250, 1
+        bpy.context.scene.render = SimpleNamespace(fps=24, fps_base=1.0)
+        self.node = scene.export_nodes[0]
+        self.objects = fbx_exporter.get_subtree(self.node, fbx_exporter.build_children_index(scene.objects))
+        self.obj = self.objects[1]
+        self.mesh = self.obj.data
+
+    def fingerprint(self):
+        depsgraph = SimpleNamespace(scene=bpy.context.scene)
+        return fingerprint_node(self.node, self.objects, fbx_exporter.FBX_EXPORT_OPTIONS, depsgraph)
+
+    def assertChanges(self, change):
+        before = self.fingerprint()
+        change()
+        self.assertNotEqual(before, self.fingerprint())
+
+    def test_vertex_weights(self):
+        self.obj.vertex_groups = [SimpleNamespace(name="Bone")]
+        self.mesh.vertices = Vertices(self.mesh.vertices.attributes["co"], _weights(*[1.0] * 8))
+        self.assertChanges(lambda: self.mesh.vertices.groups[3][0].__setattr__("weight", 0.5))
+
+    def test_sharp_edges(self):
+        sharp = array("b", [0] * 12)
+        self.mesh.edges = bpy.MeshData(12, vertices=bpy.EDGES.attributes["vertices"], use_edge_sharp=sharp)
+        self.assertChanges(lambda: sharp.__setitem__(4, 1))
+
+    def test_custom_normals(self):
+        normals = array("f", [0.0, 0.0, 1.0] * 24)
+        self.mesh.corner_normals = bpy.MeshData(24, vector=normals)
+        self.mesh.has_custom_normals = True
+        self.assertChanges(lambda: normals.__setitem__(0, 1.0))
+
+    def test_shape_keys(self):
+        basis = SimpleNamespace(name="Basis", value=0.0, slider_min=0.0, slider_max=1.0, mute=False, vertex_group="",
+                                data=bpy.MeshData(8, co=array("f", bpy.CUBE_CO)))
+        basis.relative_key = basis
+        smile = SimpleNamespace(name="Smile", relative_key=basis, value=0.0, slider_min=0.0, slider_max=1.0, mute=False,
+                                vertex_group="", data=bpy.MeshData(8, co=array("f", bpy.CUBE_CO)))
+        self.mesh.shape_keys = SimpleNamespace(key_blocks=[basis, smile], animation_data=None)
+        self.assertChanges(lambda: smile.data.attributes["co"].__setitem__(2, 2.0))
+        self.assertChanges(lambda: setattr(smile, "value", 0.5))
+
+    def test_actions(self):
+        co = array("f", [1.0, 0.0, 20.0, 2.0])
+        points = Keyframes(2, co=co, handle_left=array("f", [0.0] * 4), handle_right=array("f", [0.0] * 4))
+        fcurve = SimpleNamespace(data_path="location", array_index=0, mute=False, modifiers=[], keyframe_points=points)
+        action = SimpleNamespace(name="Walk", frame_range=(1.0, 20.0), fcurves=[fcurve])
+        self.obj.animation_data = SimpleNamespace(action=action, nla_tracks=[])
+        self.assertChanges(lambda: co.__setitem__(3, 3.0))
+        self.assertChanges(lambda: setattr(bpy.context.scene, "frame_end", 120))
+
+
+if __name__ == "__main__":
+    unittest.main()
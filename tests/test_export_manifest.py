@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from fbx_exporter import export_manifest
+from fbx_exporter.export_manifest import Manifest
+
+
+class CompactTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, export_manifest.MANIFEST_FILE)
+        self.source = self.write("rock.blend")
+
+    def write(self, name):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as file:
+            file.write(name)
+        return path
+
+    def append(self, manifest, name):
+        manifest.record(self.write(name), self.source, "node", "blender", {})
+        manifest.save()
+
+    def test_compact_keeps_latest_records(self):
+        manifest = Manifest(self.path)
+        for _ in range(3):
+            self.append(manifest, "a.fbx")
+        self.append(manifest, "b.fbx")
+        self.assertEqual(manifest.compact(), 2)
+        self.assertEqual([r["output"] for r in Manifest(self.path).refresh().records()], ["a.fbx", "b.fbx"])
+        self.assertFalse(os.path.exists(self.path + ".lock"))
+
+    def test_appends_during_compaction_are_kept(self):
+        stop = threading.Event()
+
+        def compact():
+            manifest = Manifest(self.path)
+            while not stop.is_set():
+                manifest.compact()
+
+        def append(writer):
+            manifest = Manifest(self.path)
+            for i in range(40):
+                self.append(manifest, "{}_{}.fbx".format(writer, i))
+
+        self.append(Manifest(self.path), "first.fbx")
+        compactor = threading.Thread(target=compact)
+        compactor.start()
+        writers = [threading.Thread(target=append, args=(w,)) for w in range(4)]
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        stop.set()
+        compactor.join()
+        self.assertEqual(len(Manifest(self.path).refresh().by_output), 4 * 40 + 1)
+
+    def test_lock_left_behind_is_taken_over(self):
+        open(self.path + ".lock", "w").close()
+        with mock.patch.object(export_manifest, "LOCK_TIMEOUT", 0.05):
+            self.append(Manifest(self.path), "a.fbx")
+        self.assertEqual(len(Manifest(self.path).refresh().by_output), 1)
+        self.assertFalse(os.path.exists(self.path + ".lock"))
+
+
+if __name__ == "__main__":
+    unittest.main()
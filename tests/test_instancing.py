@@ -0,0 +1,50 @@
+import unittest
+from array import array
+from types import SimpleNamespace
+
+from fakes import bpy
+from fbx_exporter.instancing import SharedGeometry
+
+
+def _copies(count):
+    return [bpy.Object("prop_{}".format(i), 'MESH', data=bpy.Mesh(0.0)) for i in range(count)]
+
+
+class SharedGeometryTests(unittest.TestCase):
+    def shared(self, objects):
+        with SharedGeometry(objects) as sharing:
+            return sharing.report.shared
+
+    def test_identical_meshes_are_shared(self):
+        self.assertEqual(self.shared(_copies(3)), 2)
+
+    def test_custom_normals_are_not_shared(self):
+        objects = _copies(2)
+        for obj, z in zip(objects, (1.0, -1.0)):
+            obj.data.has_custom_normals = True
+            obj.data.corner_normals = bpy.MeshData(24, vector=array("f", [0.0, 0.0, z] * 24))
+        self.assertEqual(self.shared(objects), 0)
+
+    def test_sharp_edges_are_not_shared(self):
+        objects = _copies(2)
+        objects[1].data.edges = bpy.MeshData(12, vertices=bpy.EDGES.attributes["vertices"],
+                                             use_edge_sharp=array("b", [1] * 12))
+        self.assertEqual(self.shared(objects), 0)
+
+    def test_attributes_are_not_shared(self):
+        objects = _copies(2)
+        for obj, crease in zip(objects, (0.0, 1.0)):
+            obj.data.attributes = [SimpleNamespace(name="crease_edge", domain="EDGE", data_type="FLOAT",
+                                                   data=bpy.MeshData(12, value=array("f", [crease] * 12)))]
+        self.assertEqual(self.shared(objects), 0)
+
+    def test_meshes_are_put_back(self):
+        objects = _copies(2)
+        meshes = [obj.data for obj in objects]
+        with SharedGeometry(objects):
+            self.assertIs(objects[1].data, meshes[0])
+        self.assertEqual([obj.data for obj in objects], meshes)
+
+
+if __name__ == "__main__":
+    unittest.main()
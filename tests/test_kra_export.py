@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from texture_exporter.kra_export import KraExporter
+
+
+class WatchTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.export_dir = os.path.join(self.directory, "maps")
+        os.makedirs(self.export_dir)
+        self.path = os.path.join(self.directory, "broken.kra")
+        self.write(b"not a zip")
+        self.exporter = KraExporter(self.export_dir, jobs=1)
+        self.addCleanup(self.exporter.close)
+
+    def write(self, data, mtime=1000000000):
+        with open(self.path, "wb") as file:
+            file.write(data)
+        os.utime(self.path, (mtime, mtime))
+
+    def poll(self):
+        return [r.status for r in self.exporter.poll([self.directory])]
+
+    def test_failed_file_retried_once_changed(self):
+        # a new file waits one poll, then fails once
+        self.assertEqual(self.poll(), [])
+        statuses = self.poll()
+        self.assertEqual(len(statuses), 1)
+        self.assertTrue(statuses[0].startswith("failed"))
+        self.assertEqual(self.poll(), [])
+        self.assertEqual(self.poll(), [])
+
+        self.write(b"still not a zip", 1000000100)
+        self.assertEqual(self.poll(), [])
+        statuses = self.poll()
+        self.assertEqual(len(statuses), 1)
+        self.assertTrue(statuses[0].startswith("failed"))
+        self.assertEqual(self.poll(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,259 @@
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from texture_exporter.kra_reader import (TILE, TILE_PIXELS, KraDocument, KraError, lzf_decompress,
+                                         read_tiles)
+
+
+FILL_CONFIG = ('<!DOCTYPE params><params version="1"><param name="color" type="string"><![CDATA['
+               '<!DOCTYPE color><color><{}/></color>]]></param></params>')
+
+
+def lzf(data):
+    """LZF stream of `data`: runs of one byte as back references, everything else as literals."""
+    out = bytearray()
+    literal = bytearray()
+
+    def flush():
+        for start in range(0, len(literal), 32):
+            chunk = literal[start:start + 32]
+            out.append(len(chunk) - 1)
+            out.extend(chunk)
+        literal.clear()
+
+    i = 0
+    while i < len(data):
+        run = 1
+        while i + run < len(data) and data[i + run] == data[i]:
+            run += 1
+        literal.append(data[i])
+        if run < 4:
+            literal.extend(data[i + 1:i + run])
+            i += run
+            continue
+        flush()
+        left = run - 1
+        while left >= 3:
+            length = min(left, 264)
+            if length - 2 < 7:
+                out.extend(((length - 2) << 5, 0))
+            else:
+                out.extend((7 << 5, length - 9, 0))
+            left -= length
+        literal.extend(data[i:i + left])
+        i += run
+    flush()
+    return bytes(out)
+
+def tile_file(tiles, pixel_size=4, compressed=True):
+    """A layer file holding {(x, y): interleaved pixels}, channels stored one after the other."""
+    out = "VERSION 2\nTILEWIDTH 64\nTILEHEIGHT 64\nPIXELSIZE {}\nDATA {}\n".format(pixel_size, len(tiles)).encode("ascii")
+    for (x, y), pixels in tiles.items():
+        planar = b"".join(bytes(pixels[channel::pixel_size]) for channel in range(pixel_size))
+        stored = b"\x01" + lzf(planar) if compressed else b"\x00" + planar
+        out += "{},{},LZF,{}\n".format(x, y, len(stored)).encode("ascii") + stored
+    return out
+
+def solid(*pixel):
+    return bytes(pixel) * TILE_PIXELS
+
+def layer(name, **attributes):
+    attributes.setdefault("nodetype", "paintlayer")
+    attributes.setdefault("filename", name)
+    return "<layer name=\"{}\" {}/>".format(name, " ".join('{}="{}"'.format(k, v) for k, v in attributes.items()))
+
+
+class KraTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def document(self, layers, files, width=128, height=128):
+        """A .kra of `width` x `height` with the layer elements `layers`, top first, and the layer files."""
+        path = os.path.join(self.directory, "rock.kra")
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("maindoc.xml", '<DOC><IMAGE name="rock" width="{}" height="{}" colorspacename="RGBA">'
+                                            '<layers>{}</layers></IMAGE></DOC>'.format(width, height, "".join(layers)))
+            for name, data in files.items():
+                archive.writestr("rock/layers/" + name, data)
+        doc = KraDocument(path)
+        self.addCleanup(doc.close)
+        return doc
+
+    def pixel(self, doc, x, y):
+        return tuple(doc.pixelData(x, y, 1, 1))
+
+
+class LzfTests(unittest.TestCase):
+    def test_literal_run(self):
+        self.assertEqual(lzf_decompress(bytes((2, 1, 2, 3)), 3), b"\x01\x02\x03")
+
+    def test_back_reference(self):
+        self.assertEqual(lzf_decompress(bytes((3,)) + b"abcd" + bytes((2 << 5, 3)), 8), b"abcdabcd")
+
+    def test_overlapping_back_reference_repeats_the_pattern(self):
+        self.assertEqual(lzf_decompress(bytes((1,)) + b"ab" + bytes((4 << 5, 1)), 8), b"abababab")
+
+    def test_long_back_reference(self):
+        # a length of 7 is followed by a byte adding to it: 7 + 10 + 2 bytes copied
+        self.assertEqual(lzf_decompress(bytes((0,)) + b"x" + bytes((7 << 5, 10, 0)), 20), b"x" * 20)
+
+    def test_far_back_reference(self):
+        literal = bytes(range(32)) * 10
+        data = b"".join(bytes((31,)) + literal[i:i + 32] for i in range(0, 320, 32))
+        # copy 3 bytes from 300 back, the high bits of the distance are in the control byte
+        data += bytes((1 << 5 | 299 >> 8, 299 & 255))
+        self.assertEqual(lzf_decompress(data, 323), literal + literal[20:23])
+
+    def test_wrong_size_raises(self):
+        with self.assertRaises(KraError):
+            lzf_decompress(bytes((2, 1, 2, 3)), 4)
+
+    def test_round_trip(self):
+        data = bytes(range(256)) + b"\x07" * 1000 + b"abc" + b"\x00" * 5
+        self.assertEqual(lzf_decompress(lzf(data), len(data)), data)
+
+
+class TileTests(unittest.TestCase):
+    def test_tiles_are_interleaved(self):
+        first = bytes((1, 2, 3, 255)) * (TILE_PIXELS // 2) + bytes((4, 5, 6, 0)) * (TILE_PIXELS // 2)
+        second = bytes(range(256)) * (TILE_PIXELS // 64)
+        tiles, pixel_size = read_tiles(tile_file({(0, 0): first, (64, -64): second}))
+        self.assertEqual(pixel_size, 4)
+        self.assertEqual(tiles, {(0, 0): first, (64, -64): second})
+
+    def test_raw_tiles_are_interleaved(self):
+        pixels = bytes(range(256)) * (TILE_PIXELS // 64)
+        tiles, _ = read_tiles(tile_file({(0, 0): pixels}, compressed=False))
+        self.assertEqual(tiles[(0, 0)], pixels)
+
+    def test_one_channel_tiles(self):
+        mask = bytes(range(64)) * TILE
+        tiles, pixel_size = read_tiles(tile_file({(0, 0): mask}, pixel_size=1))
+        self.assertEqual(pixel_size, 1)
+        self.assertEqual(tiles[(0, 0)], mask)
+
+    def test_unsupported_format_raises(self):
+        with self.assertRaises(KraError):
+            read_tiles(b"VERSION 1\nTILEWIDTH 64\nTILEHEIGHT 64\nPIXELSIZE 4\nDATA 0\n")
+        with self.assertRaises(KraError):
+            read_tiles(b"VERSION 2\nTILEWIDTH 32\nTILEHEIGHT 32\nPIXELSIZE 4\nDATA 0\n")
+
+
+class LayerTests(KraTestCase):
+    def test_paint_layer(self):
+        doc = self.document([layer("layer1")], {"layer1": tile_file({(64, 0): solid(10, 20, 30, 255)})})
+        self.assertEqual(self.pixel(doc, 64, 0), (10, 20, 30, 255))
+        self.assertEqual(self.pixel(doc, 127, 63), (10, 20, 30, 255))
+        self.assertEqual(self.pixel(doc, 63, 0), (0, 0, 0, 0))
+        self.assertEqual(self.pixel(doc, 64, 64), (0, 0, 0, 0))
+
+    def test_gray_layer(self):
+        tile = bytes((90, 200)) * TILE_PIXELS
+        doc = self.document([layer("layer1", colorspacename="GRAYA")], {"layer1": tile_file({(0, 0): tile}, pixel_size=2)})
+        self.assertEqual(self.pixel(doc, 0, 0), (90, 90, 90, 200))
+
+    def test_offset_off_the_tile_grid(self):
+        # a pixel per row and column, (x, y) holds x in blue and y in green
+        tile = bytes(v for y in range(TILE) for x in range(TILE) for v in (x, y, 0, 255))
+        doc = self.document([layer("layer1", x=10, y=-5)], {"layer1": tile_file({(0, 0): tile})})
+        self.assertEqual(self.pixel(doc, 10, 0), (0, 5, 0, 255))
+        self.assertEqual(self.pixel(doc, 73, 58), (63, 63, 0, 255))
+        self.assertEqual(self.pixel(doc, 9, 0), (0, 0, 0, 0))
+        self.assertEqual(self.pixel(doc, 74, 0), (0, 0, 0, 0))
+        self.assertEqual(self.pixel(doc, 10, 59), (0, 0, 0, 0))
+
+    def test_default_pixel_fills_around_an_offset_layer(self):
+        files = {"layer1": tile_file({(0, 0): solid(0, 255, 0, 255)}), "layer1.defaultpixel": bytes((0, 0, 255, 255))}
+        doc = self.document([layer("layer1", x=10, y=5)], files)
+        for x, y in ((10, 5), (73, 68), (40, 40)):
+            self.assertEqual(self.pixel(doc, x, y), (0, 255, 0, 255), (x, y))
+        for x, y in ((0, 0), (9, 5), (74, 5), (10, 69), (127, 127)):
+            self.assertEqual(self.pixel(doc, x, y), (0, 0, 255, 255), (x, y))
+
+    def test_color_fill_layer(self):
+        config = FILL_CONFIG.format('RGB r="1" g="0.5" b="0"')
+        doc = self.document([layer("fill", nodetype="generatorlayer")], {"fill.filterconfig": config})
+        self.assertEqual(self.pixel(doc, 0, 0), (0, 128, 255, 255))
+        self.assertEqual(self.pixel(doc, 127, 127), (0, 128, 255, 255))
+
+    def test_gray_fill_layer(self):
+        config = FILL_CONFIG.format('Gray g="0.2"')
+        doc = self.document([layer("fill", nodetype="generatorlayer")], {"fill.filterconfig": config})
+        self.assertEqual(self.pixel(doc, 5, 5), (51, 51, 51, 255))
+
+    def test_fill_layer_selection(self):
+        config = FILL_CONFIG.format('RGB r="1" g="0" b="0"')
+        files = {"fill.filterconfig": config, "fill.pixelselection": tile_file({(0, 0): solid(255)}, pixel_size=1)}
+        doc = self.document([layer("fill", nodetype="generatorlayer")], files)
+        self.assertEqual(self.pixel(doc, 0, 0), (0, 0, 255, 255))
+        self.assertEqual(self.pixel(doc, 64, 0), (0, 0, 0, 0))
+
+    def test_other_generators_raise(self):
+        doc = self.document([layer("fill", nodetype="generatorlayer")], {"fill.filterconfig": "<params/>"})
+        with self.assertRaises(KraError):
+            doc.pixelData(0, 0, 1, 1)
+
+    def test_transparency_mask(self):
+        mask = bytes(255 if x < 32 else 128 for y in range(TILE) for x in range(TILE))
+        element = ('<layer name="layer1" nodetype="paintlayer" filename="layer1"><masks>'
+                   '<mask nodetype="transparencymask" filename="mask1"/></masks></layer>')
+        files = {"layer1": tile_file({(0, 0): solid(10, 20, 30, 200), (64, 0): solid(10, 20, 30, 200)}),
+                 "mask1.pixelselection": tile_file({(0, 0): mask}, pixel_size=1)}
+        doc = self.document([element], files)
+        self.assertEqual(self.pixel(doc, 0, 0), (10, 20, 30, 200))
+        self.assertEqual(self.pixel(doc, 32, 0), (10, 20, 30, (200 * 128 + 127) // 255))
+        # no selection stored is no selection
+        self.assertEqual(self.pixel(doc, 64, 0), (0, 0, 0, 0))
+
+    def test_unsupported_masks_raise(self):
+        element = ('<layer name="layer1" nodetype="paintlayer" filename="layer1"><masks>'
+                   '<mask nodetype="filtermask" filename="mask1"/></masks></layer>')
+        doc = self.document([element], {"layer1": tile_file({(0, 0): solid(1, 2, 3, 255)})})
+        with self.assertRaises(KraError):
+            doc.pixelData(0, 0, 1, 1)
+
+
+class CompositingTests(KraTestCase):
+    def stack(self, top, bottom, **top_attributes):
+        files = {"top": tile_file({(0, 0): solid(*top)}), "bottom": tile_file({(0, 0): solid(*bottom)})}
+        return self.document([layer("top", **top_attributes), layer("bottom")], files)
+
+    def test_opaque_layer_covers(self):
+        self.assertEqual(self.pixel(self.stack((1, 2, 3, 255), (200, 0, 0, 255)), 0, 0), (1, 2, 3, 255))
+
+    def test_transparent_layer_shows_through(self):
+        self.assertEqual(self.pixel(self.stack((1, 2, 3, 0), (200, 0, 0, 255)), 0, 0), (200, 0, 0, 255))
+
+    def test_half_transparent_over_opaque(self):
+        self.assertEqual(self.pixel(self.stack((255, 0, 0, 128), (0, 0, 255, 255)), 0, 0), (128, 0, 127, 255))
+
+    def test_half_transparent_over_half_transparent(self):
+        self.assertEqual(self.pixel(self.stack((255, 0, 0, 128), (0, 0, 255, 128)), 0, 0), (171, 0, 84, 191))
+
+    def test_opacity(self):
+        doc = self.stack((255, 0, 0, 255), (0, 0, 255, 255), opacity=128)
+        self.assertEqual(self.pixel(doc, 0, 0), (128, 0, 127, 255))
+
+    def test_hidden_layer(self):
+        self.assertEqual(self.pixel(self.stack((1, 2, 3, 255), (200, 0, 0, 255), visible=0), 0, 0), (200, 0, 0, 255))
+
+    def test_group(self):
+        group = '<layer name="group" nodetype="grouplayer" opacity="128"><layers>{}</layers></layer>'.format(
+            layer("top", opacity=0) + layer("inner"))
+        files = {"top": tile_file({(0, 0): solid(9, 9, 9, 255)}), "inner": tile_file({(0, 0): solid(255, 0, 0, 255)}),
+                 "bottom": tile_file({(0, 0): solid(0, 0, 255, 255)})}
+        doc = self.document([group, layer("bottom")], files)
+        self.assertEqual(self.pixel(doc, 0, 0), (128, 0, 127, 255))
+        self.assertEqual(tuple(doc.topLevelNodes()[0].projectionPixelData(0, 0, 1, 1)), (255, 0, 0, 255))
+
+    def test_other_blending_modes_raise(self):
+        with self.assertRaises(KraError):
+            self.stack((1, 2, 3, 255), (200, 0, 0, 255), compositeop="multiply").pixelData(0, 0, 1, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import fakes
+from fakes import krita
+
+from texture_exporter.batch_export import export_document
+from texture_exporter.layer_roles import RoleIndex, MASK_ROLES, MASK_RED, MASK_ALPHA, node_role
+
+
+def _document(path=""):
+    # unsaved unless a path is given
+    doc = krita.Document(path, 64, 64)
+    doc.root.children = [krita.Node(doc, "Rock" + role, "grouplayer") for _, role in MASK_ROLES]
+    return doc
+
+
+class RoleIndexTests(unittest.TestCase):
+    def test_roles_are_matched_on_the_name_suffix(self):
+        self.assertEqual(node_role("Rock_METALNESS "), MASK_RED)
+        self.assertIsNone(node_role("Rock_METALNESS copy"))
+        self.assertIsNone(node_role("Rock"))
+
+    def test_layer_dict(self):
+        doc = _document()
+        layerDict = RoleIndex(doc).layer_dict(MASK_ROLES)
+        self.assertEqual(sorted(layerDict), ["alpha", "blue", "green", "red"])
+        self.assertEqual(layerDict["red"].name(), "Rock" + MASK_RED)
+
+    def test_nested_groups_are_found_but_not_searched(self):
+        doc = _document()
+        group = doc.root.children[0]
+        group.children = [krita.Node(doc, "Inner" + MASK_ALPHA, "grouplayer")]
+        doc.root.children = [krita.Node(doc, "Props", "grouplayer", [group])] + doc.root.children[1:]
+        index = RoleIndex(doc)
+        self.assertIs(index.node(MASK_RED), group)
+        self.assertEqual(index.nodes[MASK_ALPHA], [doc.root.children[-1]])
+
+    def test_ambiguous_and_missing_roles(self):
+        doc = _document()
+        doc.root.children.append(krita.Node(doc, "Stone" + MASK_RED, "grouplayer"))
+        doc.root.children = [n for n in doc.root.children if not n.name().endswith(MASK_ALPHA)]
+        index = RoleIndex(doc)
+        self.assertIsNone(index.node(MASK_RED))
+        self.assertNotIn("red", index.layer_dict(MASK_ROLES))
+        problems = index.problems(MASK_ROLES, (MASK_ALPHA,))
+        self.assertEqual(len(problems), 2)
+        self.assertIn("_METALNESS is used by 2 layers", problems[0])
+        self.assertIn("no layer named *_SMOOTHNESS", problems[1])
+
+
+class ExportIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def test_one_walk_per_export(self):
+        doc = krita.build_document(os.path.join(self.directory, "rock.kra"), 64, krita.MASK_ROLES)
+        fakes.calls.clear()
+        export_document(doc, self.directory)
+        self.assertEqual(fakes.calls["Document.topLevelNodes"], 1)
+
+    def test_renamed_layers_are_seen_by_the_next_export(self):
+        doc = krita.build_document(os.path.join(self.directory, "rock.kra"), 64, krita.MASK_ROLES)
+        self.assertEqual([r.output for r in export_document(doc, self.directory)], ["Mask"])
+        for node in doc.root.children:
+            if node.name().endswith(MASK_RED):
+                node._name = "Rock_ALBEDO"
+        self.assertEqual([r.output for r in export_document(doc, self.directory)], ["Mask", "Detail Mask"])
+
+
+if __name__ == "__main__":
+    unittest.main()
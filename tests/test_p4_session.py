@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import fakes
+from fakes import bpy
+
+import fbx_exporter
+from fbx_exporter.p4_session import P4Session
+from P4 import P4
+
+
+CONFIG = "P4PORT=ssl:perforce:1666\nP4USER=builder\nP4CLIENT=builder_ws\n"
+
+
+class CheckOutRoundTrips(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        with open(os.path.join(self.directory, ".p4config"), "w") as file:
+            file.write(CONFIG)
+        self.environ = os.environ.pop("P4CONFIG", None)
+        fbx_exporter.p4_sessions.sessions.clear()
+        fakes.calls.clear()
+
+    def tearDown(self):
+        if self.environ is not None:
+            os.environ["P4CONFIG"] = self.environ
+
+    def paths(self, existing, new):
+        paths = []
+        for i in range(existing + new):
+            path = os.path.join(self.directory, "asset_{}.fbx".format(i))
+            if i < existing:
+                open(path, "w").close()
+            paths.append(path)
+        return paths
+
+    def test_one_edit_and_one_add_per_batch(self):
+        fbx_exporter.check_out_exported_files(self.paths(5, 3))
+        self.assertEqual(fakes.calls["p4 edit"], 1)
+        self.assertEqual(fakes.calls["p4 add"], 1)
+        self.assertEqual(fakes.calls["p4 connect"], 1)
+        self.assertEqual(fakes.calls["p4 change -i"], 1)
+
+    def test_session_and_changelist_are_reused(self):
+        fbx_exporter.check_out_exported_files(self.paths(2, 0))
+        fbx_exporter.check_out_exported_files(self.paths(2, 0))
+        self.assertEqual(fakes.calls["p4 edit"], 2)
+        self.assertEqual(fakes.calls["p4 connect"], 1)
+        self.assertEqual(fakes.calls["p4 change -i"], 1)
+
+    def test_edits_only_send_no_add(self):
+        session = P4Session(P4(), {"P4PORT": "", "P4USER": "", "P4CLIENT": ""})
+        results = session.check_out(self.paths(4, 0))
+        self.assertEqual(fakes.calls["p4 edit"], 1)
+        self.assertEqual(fakes.calls["p4 add"], 0)
+        self.assertEqual(len(results), 4)
+
+    def test_opened_files_are_returned(self):
+        paths = self.paths(2, 1)
+        opened = fbx_exporter.check_out_exported_files(paths)
+        self.assertEqual(opened, {fbx_exporter.fbx_exporter._normalized(p) for p in paths[:2]})
+
+    def test_unregister_disconnects_and_removes_properties(self):
+        fbx_exporter.register()
+        fbx_exporter.check_out_exported_files(self.paths(1, 0))
+        sessions = list(fbx_exporter.p4_sessions.sessions.values())
+        self.assertTrue(sessions[0].p4.connected())
+        fbx_exporter.unregister()
+        self.assertFalse(sessions[0].p4.connected())
+        for owner, name in ((bpy.types.Object, "fbx_export_path"), (bpy.types.Object, "fbx_export_name"),
+                            (bpy.types.Object, "fbx_export_isStatic"), (bpy.types.Scene, "fbx_export_force"),
+                            (bpy.types.Scene, "fbx_export_workers")):
+            self.assertFalse(hasattr(owner, name), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import itertools
+import unittest
+from unittest import mock
+
+import fakes
+from fakes import krita
+
+from texture_exporter import pipeline
+from texture_exporter.pipeline import POLL_MAX_MS, POLL_START_MS, Pipeline, Stage, document_idle
+
+
+class EventLoop:
+    """Runs scheduled callbacks in order instead of QTimer.singleShot, keeping the delays."""
+    def __init__(self):
+        self.pending = []
+        self.delays = []
+
+    def schedule(self, delay, callback):
+        self.delays.append(delay)
+        self.pending.append(callback)
+
+    def run(self):
+        while self.pending:
+            self.pending.pop(0)()
+
+
+class PipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop()
+        self.finished = []
+        self.ran = []
+
+    def pipeline(self, stages, timeout=60.0):
+        return Pipeline("rock", stages, timeout, self.finished.append, self.loop.schedule)
+
+    def stage(self, name, wait=None, always=False, error=None):
+        def action():
+            self.ran.append(name)
+            if error is not None:
+                raise error
+        return Stage(name, action, wait, always)
+
+
+class PollTests(PipelineTestCase):
+    def test_lock_is_polled_with_backoff(self):
+        doc = krita.Document("", 64, 64)
+        doc.busy = 10
+        fakes.calls.clear()
+        p = self.pipeline([self.stage("fill", document_idle(doc))])
+        p.run()
+        self.loop.run()
+
+        self.assertEqual(fakes.calls["Document.tryBarrierLock"], 11)
+        polls = [delay for delay in self.loop.delays if delay]
+        self.assertEqual(polls, [2, 4, 8, 16, 32, 64, 100, 100, 100, 100])
+        self.assertEqual(polls[0], POLL_START_MS)
+        self.assertEqual(max(polls), POLL_MAX_MS)
+        self.assertEqual(self.finished, [p])
+        self.assertIsNone(p.error)
+        self.assertEqual([name for name, _ in p.timings], ["fill"])
+
+    def test_stage_times_out(self):
+        doc = krita.Document("", 64, 64)
+        doc.busy = 1000
+        clock = mock.Mock(perf_counter=itertools.count().__next__)
+        p = self.pipeline([self.stage("fill", document_idle(doc)), self.stage("save")], timeout=5.0)
+        with mock.patch.object(pipeline, "time", clock):
+            p.run()
+            self.loop.run()
+
+        self.assertEqual(p.error, "fill timed out after 5 s")
+        self.assertEqual(self.ran, ["fill"])
+        self.assertGreater(doc.busy, 0)
+        self.assertEqual(self.finished, [p])
+
+    def test_failing_wait_condition(self):
+        def wait():
+            raise RuntimeError("document closed")
+        p = self.pipeline([self.stage("fill", wait), self.stage("save")])
+        p.run()
+        self.loop.run()
+        self.assertEqual(p.error, "fill failed: document closed")
+        self.assertEqual(self.ran, ["fill"])
+
+
+class CleanupTests(PipelineTestCase):
+    def test_cleanup_stages_run_after_a_failure(self):
+        p = self.pipeline([self.stage("create"),
+                           self.stage("convert", error=ValueError("no alpha")),
+                           self.stage("export"),
+                           self.stage("close", always=True),
+                           self.stage("save"),
+                           self.stage("delete", always=True)])
+        p.run()
+        self.loop.run()
+
+        self.assertEqual(self.ran, ["create", "convert", "close", "delete"])
+        self.assertEqual(p.error, "convert failed: no alpha")
+        self.assertEqual([name for name, _ in p.timings], ["create", "convert", "close", "delete"])
+        self.assertIn("convert failed: no alpha", p.report())
+        self.assertEqual(self.finished, [p])
+
+    def test_first_error_is_kept(self):
+        p = self.pipeline([self.stage("convert", error=ValueError("no alpha")),
+                           self.stage("close", always=True, error=OSError("locked"))])
+        p.run()
+        self.loop.run()
+        self.assertEqual(self.ran, ["convert", "close"])
+        self.assertEqual(p.error, "convert failed: no alpha")
+
+    def test_cleanup_stages_run_without_a_failure(self):
+        p = self.pipeline([self.stage("export"), self.stage("close", always=True)])
+        p.run()
+        self.loop.run()
+        self.assertEqual(self.ran, ["export", "close"])
+        self.assertIsNone(p.error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import os
+import unittest
+
+from . import ROOT
+
+
+# modules both exporters ship a copy of, as (FBX exporter, texture exporter)
+SHARED_MODULES = [
+    ("fbx_exporter/tracing.py", "krita_exporter/pykrita/texture_exporter/tracing.py"),
+    ("fbx_exporter/export_manifest.py", "krita_exporter/pykrita/texture_exporter/export_manifest.py"),
+]
+
+
+class SharedModuleTests(unittest.TestCase):
+    def test_copies_are_identical(self):
+        for first, second in SHARED_MODULES:
+            with open(os.path.join(ROOT, first), "rb") as a, open(os.path.join(ROOT, second), "rb") as b:
+                self.assertEqual(a.read(), b.read(), "{} and {} differ, copy the changed one over the other".format(first, second))
+
+
+if __name__ == "__main__":
+    unittest.main()
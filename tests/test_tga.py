@@ -0,0 +1,153 @@
+import os
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+from texture_exporter import tga
+from texture_exporter.tga import (MAX_PACKET, TGA_HEADER_SIZE, TgaWriter, pixel_changes, rle_encode,
+                                  tga_header, write_tga)
+
+
+def rle_decode(data, width, stride):
+    """Pixels and packets (run, length) of TGA RLE data, failing on a packet that crosses a scanline."""
+    pixels = bytearray()
+    packets = []
+    pos = 0
+    while pos < len(data):
+        header = data[pos]
+        pos += 1
+        n = (header & 0x7f) + 1
+        column = len(pixels) // stride % width
+        assert column + n <= width, "packet of {} pixels at column {} crosses the scanline".format(n, column)
+        if header & 0x80:
+            pixels += data[pos:pos + stride] * n
+            pos += stride
+        else:
+            pixels += data[pos:pos + n * stride]
+            pos += n * stride
+        packets.append((bool(header & 0x80), n))
+    return bytes(pixels), packets
+
+def image(width, height, stride, seed=0):
+    """Pixels with runs of every length, from a few colors so runs also happen by chance."""
+    rnd = random.Random(seed)
+    colors = [bytes(rnd.randrange(256) for _ in range(stride)) for _ in range(4)]
+    pixels = bytearray()
+    while len(pixels) < width * height * stride:
+        pixels += rnd.choice(colors) * rnd.choice((1, 1, 2, 3, 5, 40, 200))
+    return bytes(pixels[:width * height * stride])
+
+
+class PixelChangesTests(unittest.TestCase):
+    def test_changes(self):
+        pixels = b"abc" * 3 + b"abd" + b"xyz" * 2
+        self.assertEqual(pixel_changes(pixels, 3), bytearray((1, 0, 0, 1, 1, 0)))
+
+    def test_only_one_byte_differs(self):
+        # a difference in the highest byte of a pixel must not be lost in the fold
+        pixels = bytes((1, 2, 3, 4, 1, 2, 3, 5, 1, 2, 3, 5))
+        self.assertEqual(pixel_changes(pixels, 4), bytearray((1, 1, 0)))
+
+    def test_single_pixel(self):
+        self.assertEqual(pixel_changes(b"abcd", 4), bytearray((1,)))
+        self.assertEqual(pixel_changes(b"", 4), bytearray())
+
+
+class RleTests(unittest.TestCase):
+    def check(self, pixels, width, stride):
+        decoded, packets = rle_decode(rle_encode(pixels, width, stride), width, stride)
+        self.assertEqual(decoded, pixels)
+        return packets
+
+    def test_round_trip_rgba(self):
+        for seed in range(5):
+            self.check(image(97, 13, 4, seed), 97, 4)
+
+    def test_round_trip_rgb(self):
+        for seed in range(5):
+            self.check(image(97, 13, 3, seed), 97, 3)
+
+    def test_runs_longer_than_a_packet(self):
+        packets = self.check(b"\x10\x20\x30\x40" * 300, 300, 4)
+        self.assertEqual(packets, [(True, MAX_PACKET), (True, MAX_PACKET), (True, 300 - 2 * MAX_PACKET)])
+
+    def test_raw_stretches_longer_than_a_packet(self):
+        pixels = b"".join(bytes((i % 256, i // 256, 0)) for i in range(300))
+        packets = self.check(pixels, 300, 3)
+        self.assertEqual(packets, [(False, MAX_PACKET), (False, MAX_PACKET), (False, 300 - 2 * MAX_PACKET)])
+
+    def test_runs_stop_at_the_scanline(self):
+        # one color over both rows, every row is its own run
+        packets = self.check(b"\x01\x02\x03\x04" * 20, 10, 4)
+        self.assertEqual(packets, [(True, 10), (True, 10)])
+
+    def test_raw_packets_stop_at_the_scanline(self):
+        pixels = b"".join(bytes((i, 0, 0)) for i in range(20))
+        packets = self.check(pixels, 10, 3)
+        self.assertEqual(packets, [(False, 10), (False, 10)])
+
+    def test_run_at_the_end_of_a_scanline(self):
+        row = b"".join(bytes((i, 0, 0, 255)) for i in range(5)) + b"\xff\xff\xff\xff" * 5
+        packets = self.check(row * 3, 10, 4)
+        self.assertEqual(packets, [(False, 5), (True, 5)] * 3)
+
+    def test_short_repeats_stay_raw(self):
+        packets = self.check(b"aaaabbbbaaaa" + b"cccc" * 3, 6, 4)
+        self.assertEqual(packets, [(False, 3), (True, 3)])
+
+
+class WriterTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, "rock.tga")
+
+    def read(self):
+        with open(self.path, "rb") as file:
+            return file.read()
+
+    def test_bands_are_written_in_order(self):
+        width, stride = 50, 4
+        bands = [image(width, 7, stride, seed) for seed in range(4)]
+        with TgaWriter(self.path, width, 28, True, rle=True) as writer:
+            for band in bands:
+                writer.write(band)
+        data = self.read()
+        self.assertEqual(data[:TGA_HEADER_SIZE], tga_header(width, 28, True, True))
+        self.assertEqual(rle_decode(data[TGA_HEADER_SIZE:], width, stride)[0], b"".join(bands))
+        self.assertEqual(writer.digest(), hashlib.sha256(data).hexdigest())
+
+    def test_uncompressed(self):
+        pixels = image(20, 10, 3)
+        write_tga(self.path, 20, 10, pixels, False)
+        self.assertEqual(self.read(), tga_header(20, 10, False) + pixels)
+
+    def test_worker_error_is_raised_on_close(self):
+        writer = TgaWriter(self.path, 4, 2, True, rle=True)
+        with mock.patch.object(tga, "rle_encode", side_effect=ValueError("bad band")):
+            writer.write(b"\x00" * 16)
+            writer.write(b"\x00" * 16)
+            with self.assertRaisesRegex(ValueError, "bad band"):
+                writer.close()
+        self.assertTrue(writer.file.closed)
+
+    def test_worker_error_is_raised_on_the_next_write(self):
+        writer = TgaWriter(self.path, 4, 2, True, rle=True)
+        with mock.patch.object(tga, "rle_encode", side_effect=ValueError("bad band")):
+            writer.write(b"\x00" * 16)
+            for _ in range(1000):
+                if writer.error is not None:
+                    break
+                time.sleep(0.001)
+            with self.assertRaises(ValueError):
+                writer.write(b"\x00" * 16)
+            with self.assertRaises(ValueError):
+                writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
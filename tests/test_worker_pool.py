@@ -0,0 +1,73 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from fbx_exporter.worker_pool import ExportWorkerPool
+
+
+STUB_WORKER = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_worker.py")]
+
+
+class WorkerPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def run_pool(self, names, workers=2, cancel=False):
+        jobs = [{"node": name, "path": os.path.join(self.directory, name + ".fbx")} for name in names]
+        pool = ExportWorkerPool(STUB_WORKER, jobs, workers)
+        self.addCleanup(pool.cancel)
+        pool.start()
+        if cancel:
+            pool.cancel()
+        results = pool.wait(30)
+        self.assertTrue(pool.finished)
+        self.assertEqual(pool.done, pool.total)
+        self.assertEqual(sorted(r["node"] for r in results), sorted(names))
+        return pool, {r["node"]: r for r in results}
+
+    def test_every_job_exported(self):
+        names = ["node_{}".format(i) for i in range(5)]
+        pool, results = self.run_pool(names)
+        for name in names:
+            self.assertEqual(results[name]["status"], "exported")
+            self.assertEqual(results[name]["saved"], 1)
+            self.assertTrue(os.path.isfile(results[name]["path"]))
+        self.assertEqual(sorted(line for log in pool.logs for line in log), ["exporting " + name for name in names])
+
+    def test_failed_job(self):
+        pool, results = self.run_pool(["node_a", "fail_b", "node_c"])
+        self.assertEqual(results["fail_b"]["status"], "failed: stub failure")
+        self.assertEqual(results["node_a"]["status"], "exported")
+        self.assertEqual(results["node_c"]["status"], "exported")
+
+    def test_crashed_worker(self):
+        # the other worker takes over the jobs left
+        pool, results = self.run_pool(["crash_a", "node_b", "node_c", "node_d"])
+        self.assertEqual(results["crash_a"]["status"], "failed: worker exited")
+        for name in ("node_b", "node_c", "node_d"):
+            self.assertEqual(results[name]["status"], "exported")
+
+    def test_every_worker_crashed(self):
+        pool, results = self.run_pool(["crash_a", "node_b", "node_c"], workers=1)
+        for name in ("crash_a", "node_b", "node_c"):
+            self.assertEqual(results[name]["status"], "failed: worker exited")
+
+    def test_cancel(self):
+        names = ["slow_{}".format(i) for i in range(4)]
+        pool, results = self.run_pool(names, cancel=True)
+        for name in names:
+            self.assertEqual(results[name]["status"], "cancelled")
+            self.assertFalse(os.path.isfile(results[name]["path"]))
+
+    def test_no_jobs(self):
+        pool = ExportWorkerPool(STUB_WORKER, [], 2)
+        pool.start()
+        self.assertTrue(pool.finished)
+        self.assertEqual(pool.wait(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()